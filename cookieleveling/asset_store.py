@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+import discord
+from PIL import Image, ImageOps
+
+from . import metrics
+from .config import Config
+from .db import (
+    fetch_asset_digest,
+    prune_asset_index,
+    store_asset_digest,
+    submit_db,
+    touch_asset_digest,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_MEMORY_MAX_ITEMS = 512
+_DISK_RETENTION_SECONDS = 30 * 86400
+_CDN_SIZES = tuple(2**exponent for exponent in range(4, 13))
+
+_root: str | None = None
+_memory: OrderedDict[tuple[str, int | None, str], Image.Image] = OrderedDict()
+_inflight: dict[tuple[str, int | None, str], asyncio.Future] = {}
+
+
+def init_asset_store(config: Config) -> None:
+    global _root
+    _root = os.path.join(config.data_dir, "assets")
+    os.makedirs(_root, exist_ok=True)
+
+
+def asset_key(url: str) -> str:
+    parts = urlsplit(url)
+    size = parse_qs(parts.query).get("size")
+    if size:
+        return f"{parts.netloc}{parts.path}?size={size[0]}"
+    return f"{parts.netloc}{parts.path}"
+
+
+def avatar_url(asset: discord.Asset, size: int) -> str:
+    cdn_size = next((value for value in _CDN_SIZES if value >= size), _CDN_SIZES[-1])
+    return str(asset.replace(size=cdn_size, format="png"))
+
+
+async def fetch_image(
+    url: str,
+    session: aiohttp.ClientSession,
+    *,
+    size: int | None = None,
+    mode: str = "RGB",
+) -> Image.Image | None:
+    key = (asset_key(url), size, mode)
+    cached = _memory.get(key)
+    if cached is not None:
+        _memory.move_to_end(key)
+        metrics.increment("assets.memory_hit")
+        return cached.copy()
+    inflight = _inflight.get(key)
+    if inflight is None:
+        inflight = asyncio.ensure_future(_load(url, key, session))
+        _inflight[key] = inflight
+        inflight.add_done_callback(lambda _: _inflight.pop(key, None))
+    image = await asyncio.shield(inflight)
+    return image.copy() if image is not None else None
+
+
+def prune_disk_cache(now: float | None = None) -> int:
+    if _root is None:
+        return 0
+    now = time.time() if now is None else now
+    removed = 0
+    for digest in prune_asset_index(int(now - _DISK_RETENTION_SECONDS)):
+        try:
+            os.remove(_object_path(digest))
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        _LOGGER.info("asset cache pruned: removed=%s", removed)
+    return removed
+
+
+async def _load(
+    url: str, key: tuple[str, int | None, str], session: aiohttp.ClientSession
+) -> Image.Image | None:
+    data = await _read_disk(key[0])
+    if data is not None:
+        metrics.increment("assets.disk_hit")
+        await submit_db(touch_asset_digest, key[0], int(time.time()))
+    else:
+        data = await _download(url, session)
+        if data is None:
+            return None
+        await _write_disk(key[0], data)
+    try:
+        image = await asyncio.to_thread(_decode, data, key[1], key[2])
+    except Exception:
+        _LOGGER.exception("asset decode failed: url=%s", url)
+        return None
+    _memory[key] = image
+    while len(_memory) > _MEMORY_MAX_ITEMS:
+        _memory.popitem(last=False)
+    return image
+
+
+async def _download(url: str, session: aiohttp.ClientSession) -> bytes | None:
+    try:
+        with metrics.timed("assets.download"):
+            async with session.get(url) as response:
+                if response.status != 200:
+                    _LOGGER.warning(
+                        "asset download failed: url=%s status=%s", url, response.status
+                    )
+                    metrics.increment("assets.download_failed")
+                    return None
+                return await response.read()
+    except Exception:
+        _LOGGER.exception("asset download failed: url=%s", url)
+        metrics.increment("assets.download_failed")
+        return None
+
+
+async def _read_disk(key: str) -> bytes | None:
+    if _root is None:
+        return None
+    digest = await submit_db(fetch_asset_digest, key)
+    if digest is None:
+        return None
+    try:
+        return await asyncio.to_thread(_read_file, _object_path(digest))
+    except OSError:
+        return None
+
+
+async def _write_disk(key: str, data: bytes) -> None:
+    if _root is None:
+        return
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        await asyncio.to_thread(_write_file, _object_path(digest), data)
+    except OSError:
+        _LOGGER.exception("asset cache write failed: key=%s", key)
+        return
+    await submit_db(store_asset_digest, key, digest, int(time.time()))
+
+
+def _decode(data: bytes, size: int | None, mode: str) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    image.seek(0)
+    if size is not None:
+        image.draft("RGB", (size, size))
+    image = image.convert(mode)
+    if size is not None:
+        factor = min(image.size) // size
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.size != (size, size):
+            image = ImageOps.fit(image, (size, size), method=Image.LANCZOS)
+    return image
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(_root, digest[:2], f"{digest}.bin")
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(temp_path, path)
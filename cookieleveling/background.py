@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from . import metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+_LOAD_WINDOW_SECONDS = 60.0
+_IDLE_VOICE_EVENTS_PER_MINUTE = 6
+_IDLE_INTERACTIONS_PER_MINUTE = 2
+_IDLE_TICK_SECONDS = 2.0
+_IDLE_POLL_SECONDS = 5.0
+
+
+class LoadMonitor:
+    def __init__(self) -> None:
+        self._voice_events: deque[float] = deque()
+        self._interactions: deque[float] = deque()
+        self._last_tick_seconds = 0.0
+
+    def record_voice_event(self) -> None:
+        self._voice_events.append(time.monotonic())
+
+    def record_interaction(self) -> None:
+        self._interactions.append(time.monotonic())
+
+    def record_tick(self, seconds: float) -> None:
+        self._last_tick_seconds = seconds
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        voice_rate = _rate(self._voice_events, now)
+        interaction_rate = _rate(self._interactions, now)
+        metrics.set_gauge("load.voice_events_per_minute", voice_rate)
+        metrics.set_gauge("load.interactions_per_minute", interaction_rate)
+        return (
+            voice_rate <= _IDLE_VOICE_EVENTS_PER_MINUTE
+            and interaction_rate <= _IDLE_INTERACTIONS_PER_MINUTE
+            and self._last_tick_seconds <= _IDLE_TICK_SECONDS
+        )
+
+
+class IdleGate:
+    def __init__(self, executor: "BackgroundExecutor", job_name: str) -> None:
+        self._executor = executor
+        self._job_name = job_name
+
+    async def checkpoint(self) -> None:
+        await self._executor.wait_idle(self._job_name)
+
+
+BackgroundJob = Callable[[IdleGate], Awaitable[None]]
+
+
+@dataclass(order=True)
+class _QueuedJob:
+    priority: int
+    seq: int
+    name: str = field(compare=False)
+    job: BackgroundJob = field(compare=False)
+
+
+class BackgroundExecutor:
+    def __init__(self, monitor: LoadMonitor) -> None:
+        self._monitor = monitor
+        self._queue: list[_QueuedJob] = []
+        self._queued_names: set[str] = set()
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def submit(self, name: str, job: BackgroundJob, *, priority: int = 10) -> bool:
+        if name in self._queued_names:
+            return False
+        heapq.heappush(self._queue, _QueuedJob(priority, next(self._seq), name, job))
+        self._queued_names.add(name)
+        metrics.set_gauge("background.queue_depth", len(self._queue))
+        self._wake.set()
+        return True
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def wait_idle(self, job_name: str) -> None:
+        if self._monitor.is_idle():
+            return
+        paused_at = time.monotonic()
+        _LOGGER.info("background job %s paused: bot is busy", job_name)
+        while not self._monitor.is_idle():
+            await asyncio.sleep(_IDLE_POLL_SECONDS)
+        paused = time.monotonic() - paused_at
+        metrics.observe("background.paused", paused)
+        _LOGGER.info("background job %s resumed after %.1fs", job_name, paused)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            await self.wait_idle("queue")
+            queued = heapq.heappop(self._queue)
+            self._queued_names.discard(queued.name)
+            metrics.set_gauge("background.queue_depth", len(self._queue))
+            started = time.perf_counter()
+            try:
+                await queued.job(IdleGate(self, queued.name))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                metrics.increment("background.failed")
+                _LOGGER.exception("background job failed: %s", queued.name)
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe(f"background.{queued.name}.runtime", elapsed)
+                _LOGGER.info("background job %s finished (%.2fs)", queued.name, elapsed)
+
+
+def _rate(events: deque[float], now: float) -> float:
+    while events and now - events[0] > _LOAD_WINDOW_SECONDS:
+        events.popleft()
+    return len(events) * 60.0 / _LOAD_WINDOW_SECONDS
+
+
+load_monitor = LoadMonitor()
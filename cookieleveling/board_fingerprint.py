@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import hashlib
+
+import discord
+
+from .xp_engine import progress_for_xp
+
+_FINGERPRINT_VERSION = b"2"
+
+
+def fingerprint_board(guild: discord.Guild, rows: list[dict], xp_field: str) -> str:
+    digest = hashlib.blake2b(_FINGERPRINT_VERSION, digest_size=16)
+    for row in rows:
+        user_id = row["user_id"]
+        xp = row[xp_field]
+        level = progress_for_xp(xp)[0]
+        member = guild.get_member(user_id)
+        name = member.display_name if member is not None else ""
+        avatar = member.display_avatar.key if member is not None else ""
+        movement = row.get("movement")
+        digest.update(
+            f"{user_id}\x1f{xp}\x1f{level}\x1f{name}\x1f{avatar}\x1f{movement}\x1e".encode()
+        )
+    return digest.hexdigest()
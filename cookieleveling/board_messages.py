@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable
+
+import discord
+
+from . import metrics
+from .config import Config
+from .db import submit_db, update_board_fingerprints
+from .write_scheduler import PRIORITY_BOARD, outbound_writes
+
+_LOGGER = logging.getLogger(__name__)
+
+BOARD_PUBLISH_BOT = "bot"
+BOARD_PUBLISH_WEBHOOK = "webhook"
+BOARD_LAYOUT_COMBINED = "combined"
+
+_WEBHOOK_NAME = "CookieLeveling"
+_INVALID_WEBHOOK_TOKEN_STATUS = 401
+_UNKNOWN_WEBHOOK_CODE = 10015
+
+
+@dataclass(frozen=True)
+class BoardWebhook:
+    webhook_id: int
+    token: str
+
+
+class BoardWebhookLost(Exception):
+    pass
+
+
+def board_webhook(settings, prefix: str) -> BoardWebhook | None:
+    if settings is None:
+        return None
+    webhook_id = settings[f"{prefix}_webhook_id"]
+    token = settings[f"{prefix}_webhook_token"]
+    if not webhook_id or not token:
+        return None
+    return BoardWebhook(webhook_id, token)
+
+
+async def create_board_webhook(
+    config: Config, channel: discord.TextChannel
+) -> BoardWebhook | None:
+    if config.board_publish_mode != BOARD_PUBLISH_WEBHOOK:
+        return None
+    try:
+        webhook = await channel.create_webhook(name=_WEBHOOK_NAME)
+    except discord.HTTPException as exc:
+        _LOGGER.warning(
+            "board webhook create failed, using bot messages: channel_id=%s (%s)",
+            channel.id,
+            exc.status,
+        )
+        return None
+    return BoardWebhook(webhook.id, webhook.token)
+
+
+async def retire_board_webhook(bot: discord.Client, webhook: BoardWebhook | None) -> None:
+    if webhook is None:
+        return
+    try:
+        await bot.webhooks.delete_webhook(webhook.webhook_id, webhook.token)
+    except discord.HTTPException:
+        _LOGGER.warning("board webhook delete failed: webhook_id=%s", webhook.webhook_id)
+
+
+async def send_board_message(
+    bot: discord.Client,
+    channel: discord.TextChannel,
+    files: list[discord.File],
+    webhook: BoardWebhook | None,
+) -> int:
+    if webhook is not None:
+        return await bot.webhooks.execute(webhook.webhook_id, webhook.token, files=files)
+    message = await channel.send(content="", files=files)
+    return message.id
+
+
+async def delete_board_message(
+    bot: discord.Client,
+    channel: discord.TextChannel,
+    message_id: int,
+    webhook: BoardWebhook | None,
+) -> None:
+    if webhook is not None:
+        await bot.webhooks.delete_message(webhook.webhook_id, webhook.token, message_id)
+        return
+    await channel.get_partial_message(message_id).delete()
+
+
+async def resend_board(
+    bot: discord.Client,
+    config: Config,
+    channel: discord.TextChannel,
+    settings,
+    *,
+    prefix: str,
+    columns: tuple[str, str],
+    send: Callable[[BoardWebhook | None], Awaitable[tuple[int, int]]],
+    store: Callable[..., None],
+    webhook: BoardWebhook | None,
+    fingerprints: dict[str, str] | None,
+) -> bool:
+    old_webhook = board_webhook(settings, prefix)
+    if webhook is None:
+        _LOGGER.warning(
+            "%s webhook lost, re-sending as bot messages: webhook_id=%s",
+            prefix,
+            old_webhook.webhook_id if old_webhook else None,
+        )
+    else:
+        _LOGGER.warning(
+            "%s message not found, re-sending through webhook: webhook_id=%s",
+            prefix,
+            webhook.webhook_id,
+        )
+    try:
+        message_ids = await send(webhook)
+    except Exception:
+        _LOGGER.exception("%s re-send failed: channel_id=%s", prefix, channel.id)
+        return False
+    old_messages = {
+        settings[f"{column}_message_id"]: settings[f"{column}_channel_id"]
+        for column in columns
+    }
+    for message_id, channel_id in old_messages.items():
+        old_channel = bot.get_channel(channel_id)
+        if not isinstance(old_channel, discord.TextChannel):
+            continue
+        try:
+            await delete_board_message(bot, old_channel, message_id, webhook)
+        except discord.HTTPException:
+            pass
+    if webhook is None:
+        await retire_board_webhook(bot, old_webhook)
+    fields = {
+        f"{prefix}_webhook_id": webhook.webhook_id if webhook else None,
+        f"{prefix}_webhook_token": webhook.token if webhook else None,
+    }
+    for column, message_id in zip(columns, message_ids):
+        fields[f"{column}_channel_id"] = channel.id
+        fields[f"{column}_message_id"] = message_id
+    await submit_db(partial(store, config.guild_id, **fields))
+    if fingerprints is not None:
+        await submit_db(update_board_fingerprints, config.guild_id, fingerprints)
+    _LOGGER.info("%s re-sent", prefix)
+    return True
+
+
+async def edit_board_message(
+    bot: discord.Client,
+    channel: discord.TextChannel,
+    message_id: int,
+    *,
+    webhook: BoardWebhook | None = None,
+    route: str = "board.edit",
+    attachments: list[discord.File] | None = None,
+    **fields,
+) -> None:
+    attachments = attachments or []
+
+    async def _edit() -> None:
+        try:
+            await channel.get_partial_message(message_id).edit(
+                attachments=attachments, **fields
+            )
+        except discord.NotFound:
+            metrics.increment("boards.message_refetch")
+            message = await channel.fetch_message(message_id)
+            await message.edit(
+                attachments=[_reopen(file) for file in attachments], **fields
+            )
+
+    async def _edit_webhook() -> None:
+        try:
+            await bot.webhooks.edit_message(
+                webhook.webhook_id,
+                webhook.token,
+                message_id,
+                attachments=attachments,
+                **fields,
+            )
+        except discord.HTTPException as exc:
+            if (
+                exc.status != _INVALID_WEBHOOK_TOKEN_STATUS
+                and exc.code != _UNKNOWN_WEBHOOK_CODE
+            ):
+                raise
+            metrics.increment("boards.webhook_lost")
+            raise BoardWebhookLost(webhook.webhook_id) from exc
+
+    if webhook is not None:
+        route = route.replace("board.", "webhook.", 1)
+    await outbound_writes.submit(
+        route,
+        _edit if webhook is None else _edit_webhook,
+        priority=PRIORITY_BOARD,
+        key=("message", message_id),
+    )
+
+
+def _reopen(file: discord.File) -> discord.File:
+    if not file.fp.closed:
+        return file
+    return discord.File(
+        file.fp.name,
+        filename=file.filename,
+        spoiler=file.spoiler,
+        description=file.description,
+    )
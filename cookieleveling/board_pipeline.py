@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+import discord
+
+from . import metrics, refresh_policy
+from .board_resolver import ResolvedUser, resolve_board_users
+from .config import Config
+from .db import fetch_guild_settings
+from .host_rankboard_publisher import (
+    HostboardData,
+    load_hostboard_data,
+    update_hostboard,
+)
+from .rankboard_publisher import RankboardData, load_rankboard_data, update_rankboard
+from .refresh_policy import BOARD_GROUPS, HOSTBOARD, RANKBOARD
+
+_LOGGER = logging.getLogger(__name__)
+_PREFETCH_MAX_AGE_SECONDS = 900
+
+_prefetched: "PrefetchedAssets | None" = None
+_pipeline_lock = asyncio.Lock()
+
+
+@dataclass
+class PrefetchedAssets:
+    prepared_at: float
+    resolved: dict[int, ResolvedUser]
+
+
+@dataclass
+class BoardPipelineReport:
+    users: int = 0
+    rankboard_ok: bool = False
+    hostboard_ok: bool = False
+    prefetched: int = 0
+    skipped: list[str] = field(default_factory=list)
+    publish_latency: float | None = None
+    stages: dict[str, float] = field(default_factory=dict)
+
+    def format(self) -> str:
+        stages = " ".join(f"{name}={value:.3f}s" for name, value in self.stages.items())
+        latency = (
+            f" latency={self.publish_latency:.3f}s"
+            if self.publish_latency is not None
+            else ""
+        )
+        skipped = f" skipped={','.join(self.skipped)}" if self.skipped else ""
+        return (
+            f"users={self.users} prefetched={self.prefetched} "
+            f"rankboard={self.rankboard_ok} hostboard={self.hostboard_ok}"
+            f"{skipped}{latency} {stages}"
+        )
+
+
+async def prefetch_board_assets(bot: discord.Client, config: Config) -> int:
+    global _prefetched
+    guild = bot.get_guild(config.guild_id)
+    if guild is None:
+        return 0
+    started = time.perf_counter()
+    user_ids = list(
+        dict.fromkeys(
+            load_rankboard_data(guild.id).user_ids()
+            + load_hostboard_data(guild.id).user_ids()
+        )
+    )
+    resolved = await resolve_board_users(
+        guild,
+        user_ids,
+        bot.asset_session,
+        concurrency=config.board_resolve_concurrency,
+        timeout=config.board_lookup_timeout_seconds,
+    )
+    _prefetched = PrefetchedAssets(prepared_at=time.time(), resolved=resolved)
+    elapsed = time.perf_counter() - started
+    metrics.observe("boards.stage.prefetch", elapsed)
+    _LOGGER.info("board assets prefetched: users=%s (%.3fs)", len(resolved), elapsed)
+    return len(resolved)
+
+
+def _take_prefetched(user_ids: list[int]) -> dict[int, ResolvedUser]:
+    global _prefetched
+    prefetched, _prefetched = _prefetched, None
+    if prefetched is None:
+        return {}
+    if time.time() - prefetched.prepared_at > _PREFETCH_MAX_AGE_SECONDS:
+        return {}
+    wanted = set(user_ids)
+    return {
+        user_id: user
+        for user_id, user in prefetched.resolved.items()
+        if user_id in wanted
+    }
+
+
+async def run_board_pipeline(
+    bot: discord.Client,
+    config: Config,
+    boundary: float | None = None,
+    *,
+    groups: tuple[str, ...] = BOARD_GROUPS,
+    adaptive: bool = False,
+) -> BoardPipelineReport:
+    async with _pipeline_lock:
+        return await _run_board_pipeline(bot, config, boundary, groups, adaptive)
+
+
+async def _run_board_pipeline(
+    bot: discord.Client,
+    config: Config,
+    boundary: float | None,
+    groups: tuple[str, ...],
+    adaptive: bool,
+) -> BoardPipelineReport:
+    report = BoardPipelineReport()
+    guild = bot.get_guild(config.guild_id)
+    if guild is None:
+        _LOGGER.warning("board pipeline skipped: guild not found: %s", config.guild_id)
+        return report
+    started = time.perf_counter()
+
+    stage_started = time.perf_counter()
+    data: dict[str, RankboardData | HostboardData] = {}
+    if RANKBOARD in groups:
+        data[RANKBOARD] = load_rankboard_data(guild.id)
+    if HOSTBOARD in groups:
+        data[HOSTBOARD] = load_hostboard_data(guild.id)
+    settings = fetch_guild_settings(guild.id)
+    fingerprints: dict[str, dict[str, str]] = {}
+    for group, group_data in list(data.items()):
+        composition = group_data.composition()
+        if adaptive and not refresh_policy.is_meaningful(group, composition, config):
+            report.skipped.append(group)
+            metrics.increment(f"boards.{group}.unchanged")
+            del data[group]
+            continue
+        group_fingerprints = group_data.fingerprints(guild)
+        if _fingerprints_match(settings, group_fingerprints):
+            report.skipped.append(group)
+            metrics.increment(f"boards.{group}.skipped")
+            refresh_policy.mark_published(
+                group, composition, group_data.user_ids(), config
+            )
+            del data[group]
+            continue
+        fingerprints[group] = group_fingerprints
+    user_ids = list(
+        dict.fromkeys(
+            user_id for group_data in data.values() for user_id in group_data.user_ids()
+        )
+    )
+    report.users = len(user_ids)
+    _record_stage(report, "rank", stage_started)
+    if not data:
+        _LOGGER.info("board pipeline: nothing changed (%s)", ", ".join(report.skipped))
+        return report
+
+    stage_started = time.perf_counter()
+    known = _take_prefetched(user_ids)
+    report.prefetched = len(known)
+    resolved = await resolve_board_users(
+        guild,
+        user_ids,
+        bot.asset_session,
+        concurrency=config.board_resolve_concurrency,
+        timeout=config.board_lookup_timeout_seconds,
+        known=known,
+        timings=report.stages,
+    )
+    _record_stage(report, "resolve", stage_started)
+
+    stage_started = time.perf_counter()
+    timings: dict[str, float] = {}
+    publishers = {
+        RANKBOARD: update_rankboard,
+        HOSTBOARD: update_hostboard,
+    }
+    published = dict(
+        zip(
+            data,
+            await asyncio.gather(
+                *(
+                    publishers[group](
+                        bot, config, group_data, resolved, timings, fingerprints[group]
+                    )
+                    for group, group_data in data.items()
+                )
+            ),
+        )
+    )
+    for group, ok in published.items():
+        if ok:
+            metrics.increment(f"boards.{group}.published")
+            group_data = data[group]
+            refresh_policy.mark_published(
+                group,
+                group_data.composition(),
+                group_data.user_ids(),
+                config,
+                adaptive=adaptive,
+            )
+    report.rankboard_ok = published.get(RANKBOARD, False)
+    report.hostboard_ok = published.get(HOSTBOARD, False)
+    for name, value in timings.items():
+        report.stages[name] = value
+        metrics.observe(f"boards.stage.{name}", value)
+    _record_stage(report, "publish", stage_started)
+    if boundary is not None:
+        report.publish_latency = time.time() - boundary
+        metrics.observe("boards.publish_latency", report.publish_latency)
+
+    _record_stage(report, "total", started)
+    _LOGGER.info("board pipeline: %s", report.format())
+    return report
+
+
+def _fingerprints_match(settings, fingerprints: dict[str, str]) -> bool:
+    if settings is None:
+        return False
+    return all(settings[column] == value for column, value in fingerprints.items())
+
+
+def _record_stage(report: BoardPipelineReport, name: str, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    report.stages[name] = elapsed
+    metrics.observe(f"boards.stage.{name}", elapsed)
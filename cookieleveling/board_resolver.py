@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Iterable, TypeVar
+
+import aiohttp
+import discord
+from PIL import Image
+
+from . import metrics
+from .asset_store import avatar_url, fetch_image
+from .display_name_tokens import NameToken, tokenize_display_name, truncate_tokens
+from .emoji_assets import emoji_url
+from .image_renderer import AVATAR_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+_LOOKUP_TIMEOUT_SECONDS = 5.0
+
+T = TypeVar("T")
+
+
+@dataclass
+class ResolvedUser:
+    user_id: int
+    member: discord.Member | None
+    name_tokens: list[NameToken]
+    avatar: Image.Image | None
+
+    @property
+    def display_name(self) -> str | None:
+        return self.member.display_name if self.member else None
+
+
+async def resolve_board_users(
+    guild: discord.Guild,
+    user_ids: Iterable[int],
+    session: aiohttp.ClientSession,
+    *,
+    concurrency: int,
+    timeout: float = _LOOKUP_TIMEOUT_SECONDS,
+    known: dict[int, ResolvedUser] | None = None,
+    timings: dict[str, float] | None = None,
+) -> dict[int, ResolvedUser]:
+    resolved: dict[int, ResolvedUser] = dict(known or {})
+    pending = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in resolved]
+    if not pending:
+        return resolved
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    spent: list[float] = []
+
+    async def _lookup(label: str, awaitable: Awaitable[T]) -> T | None:
+        async with semaphore:
+            lookup_started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(awaitable, timeout)
+            except asyncio.TimeoutError:
+                metrics.increment("boards.resolve.timeout")
+                _LOGGER.warning("board lookup timed out: %s", label)
+                return None
+            except Exception:
+                _LOGGER.exception("board lookup failed: %s", label)
+                return None
+            finally:
+                spent.append(time.perf_counter() - lookup_started)
+
+    members = {user_id: guild.get_member(user_id) for user_id in pending}
+    uncached = [user_id for user_id, member in members.items() if member is None]
+    fetched = await asyncio.gather(
+        *(
+            _lookup(f"member {user_id}", guild.fetch_member(user_id))
+            for user_id in uncached
+        )
+    )
+    members.update(zip(uncached, fetched))
+
+    tokens = {user_id: _name_tokens(members[user_id], user_id) for user_id in pending}
+    avatars: dict[int, Image.Image | None] = {}
+
+    async def _avatar(user_id: int, member: discord.Member) -> None:
+        avatars[user_id] = await _lookup(
+            f"avatar {user_id}",
+            fetch_image(
+                avatar_url(member.display_avatar, AVATAR_SIZE),
+                session,
+                size=AVATAR_SIZE,
+            ),
+        )
+
+    async def _emoji(token: NameToken, url: str) -> None:
+        token.image = await _lookup(
+            f"emoji {url}", fetch_image(url, session, mode="RGBA")
+        )
+
+    await asyncio.gather(
+        *(
+            _avatar(user_id, member)
+            for user_id, member in members.items()
+            if member is not None
+        ),
+        *(
+            _emoji(token, url)
+            for user_tokens in tokens.values()
+            for token in user_tokens
+            if (url := emoji_url(token)) is not None
+        ),
+    )
+    for user_id in pending:
+        resolved[user_id] = ResolvedUser(
+            user_id=user_id,
+            member=members[user_id],
+            name_tokens=tokens[user_id],
+            avatar=avatars.get(user_id),
+        )
+
+    wall = time.perf_counter() - started
+    sequential = sum(spent)
+    metrics.observe("boards.resolve.wall", wall)
+    metrics.observe("boards.resolve.sequential", sequential)
+    if timings is not None:
+        timings["resolve_wall"] = wall
+        timings["resolve_sequential"] = sequential
+    _LOGGER.debug(
+        "board users resolved: users=%s lookups=%s wall=%.3fs sequential=%.3fs",
+        len(pending),
+        len(spent),
+        wall,
+        sequential,
+    )
+    return resolved
+
+
+def _name_tokens(member: discord.Member | None, user_id: int) -> list[NameToken]:
+    name = member.display_name if member else str(user_id)
+    return truncate_tokens(tokenize_display_name(name), max_chars=16)
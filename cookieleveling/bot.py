@@ -1,24 +1,31 @@
 import logging
 
+import aiohttp
 import discord
 from discord import app_commands
 
 from .commands import setup_commands
 from .config import Config
+from .asset_store import init_asset_store
 from .db import init_db
-from .rankboard_publisher import update_rankboard
-from .scheduler import start_hourly_scheduler, start_minute_scheduler
-from .host_rankboard_publisher import update_hostboard
+from .http_client import create_http_session
+from .rank_index import load_rank_indexes
+from .background import BackgroundExecutor, IdleGate, load_monitor
+from .board_pipeline import run_board_pipeline
+from .scheduler import start_scheduler
 from .host_tracker import (
     handle_channel_create,
     handle_channel_delete,
     handle_shaberea_message,
     handle_voice_state_update as handle_host_voice_state_update,
     load_host_targets,
-    snapshot_host_sessions,
+    restore_host_sessions,
 )
 from .role_assigner import sync_lifetime_roles
+from .role_queue import RoleEditQueue
+from .webhook_client import WebhookClient
 from .voice_tracker import handle_voice_state_update, restore_voice_state
+from .write_scheduler import outbound_writes
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,12 +39,13 @@ class CookieLevelingBot(discord.Client):
         self.config = config
         self.tree = discord.app_commands.CommandTree(self)
         self._vc_restored = False
-        self._rankboard_warmed = False
-        self._hostboard_warmed = False
+        self._boards_warmed = False
         self._roles_warmed = False
-        self._hourly_handle = None
-        self._hourly_tick_task = None
-        self._hourly_scheduler_task = None
+        self.scheduler = None
+        self.background = BackgroundExecutor(load_monitor)
+        self.role_queue = RoleEditQueue(config.guild_id)
+        self.asset_session: aiohttp.ClientSession | None = None
+        self.webhooks: WebhookClient | None = None
         self._register_tree_error_handler()
 
     def _register_tree_error_handler(self) -> None:
@@ -60,9 +68,25 @@ class CookieLevelingBot(discord.Client):
 
     async def setup_hook(self) -> None:
         init_db(self.config)
+        init_asset_store(self.config)
+        self.asset_session = create_http_session()
+        self.webhooks = WebhookClient(self.asset_session, self.config.discord_api_base_url)
+        load_rank_indexes(self.config.guild_id, self.config.host_xp_mode)
         setup_commands(self, self.config)
-        self._minute_task = start_minute_scheduler(self, self.config)
-        self._hourly_scheduler_task = start_hourly_scheduler(self, self.config)
+        self.background.start(self.loop)
+        outbound_writes.start(self.loop)
+        self.role_queue.start(self)
+        self.scheduler = start_scheduler(self, self.config)
+
+    async def close(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.background.stop()
+        self.role_queue.stop()
+        outbound_writes.stop()
+        if self.asset_session is not None:
+            await self.asset_session.close()
+        await super().close()
 
     async def on_ready(self) -> None:
         guild_obj = discord.Object(id=self.config.guild_id)
@@ -75,38 +99,32 @@ class CookieLevelingBot(discord.Client):
         if not self._vc_restored:
             guild = self.get_guild(self.config.guild_id)
             if guild is not None:
-                restore_voice_state(guild)
+                await restore_voice_state(guild)
                 load_host_targets(guild)
-                snapshot_host_sessions(guild)
+                restore_host_sessions(guild)
                 self._vc_restored = True
-        if not self._rankboard_warmed:
+        if not self._boards_warmed:
             try:
-                updated = await update_rankboard(self, self.config)
-                if updated:
+                report = await run_board_pipeline(self, self.config)
+                if report.rankboard_ok:
                     _LOGGER.info("initial rankboard update completed")
-            except Exception:
-                _LOGGER.exception("initial rankboard update failed")
-            self._rankboard_warmed = True
-        if not self._hostboard_warmed:
-            try:
-                updated = await update_hostboard(self, self.config)
-                if updated:
+                if report.hostboard_ok:
                     _LOGGER.info("initial hostboard update completed")
             except Exception:
-                _LOGGER.exception("initial hostboard update failed")
-            self._hostboard_warmed = True
+                _LOGGER.exception("initial board update failed")
+            self._boards_warmed = True
         if not self._roles_warmed:
             guild = self.get_guild(self.config.guild_id)
             if guild is not None:
-                async def _sync_roles() -> None:
-                    try:
-                        updated = await sync_lifetime_roles(guild)
-                        if updated:
-                            _LOGGER.info("initial lifetime role sync updated %s users", updated)
-                    except Exception:
-                        _LOGGER.exception("initial lifetime role sync failed")
-
-                self.loop.create_task(_sync_roles())
+                async def _sync_roles(gate: IdleGate) -> None:
+                    await sync_lifetime_roles(
+                        guild,
+                        self.role_queue.enqueue,
+                        dry_run=self.config.role_sync_dry_run,
+                        checkpoint=gate.checkpoint,
+                    )
+
+                self.background.submit("lifetime_role_sync", _sync_roles, priority=5)
             self._roles_warmed = True
         _LOGGER.info("ready: %s", self.user)
 
@@ -118,8 +136,12 @@ class CookieLevelingBot(discord.Client):
     ) -> None:
         if member.guild.id != self.config.guild_id:
             return
-        handle_voice_state_update(member.guild.id, member, before, after)
+        load_monitor.record_voice_event()
         handle_host_voice_state_update(member, before, after)
+        await handle_voice_state_update(member.guild.id, member, before, after)
+
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        load_monitor.record_interaction()
 
     async def on_message(self, message: discord.Message) -> None:
         if message.guild is None:
@@ -137,7 +159,7 @@ class CookieLevelingBot(discord.Client):
         if channel.guild.id != self.config.guild_id:
             return
         try:
-            handle_channel_create(channel)
+            await handle_channel_create(channel)
         except Exception:
             _LOGGER.exception("host channel create handling failed")
 
@@ -147,6 +169,6 @@ class CookieLevelingBot(discord.Client):
         if channel.guild.id != self.config.guild_id:
             return
         try:
-            handle_channel_delete(channel)
+            await handle_channel_delete(channel)
         except Exception:
             _LOGGER.exception("host channel delete handling failed")
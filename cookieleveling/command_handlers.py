@@ -1,38 +1,57 @@
 from __future__ import annotations
 
+import asyncio
 import io
 import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
 
 import discord
 import aiohttp
-from PIL import Image
 
+from . import metrics
+from .asset_store import avatar_url, fetch_image
+from .board_resolver import ResolvedUser, resolve_board_users
 from .config import Config
 from .db import (
     ensure_user,
     fetch_user,
     set_optout,
+    submit_db,
 )
+from .leaderboard_pages import LeaderboardView, page_count, page_file, render_page
+from .rank_index import apply_user_row
+from .ranker import lifetime_position, season_position
 from .rankboard_publisher import set_rankboard
+from .season_archive import load_archive_files
 from .host_rankboard_publisher import set_hostboard
 from .xp_engine import progress_for_xp
 from .display_name_tokens import tokenize_display_name, truncate_tokens
 from .emoji_assets import resolve_emoji_tokens
-from .level_renderer import render_level_card
+from .level_renderer import AVATAR_SIZE, render_level_card
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def handle_optout(config: Config, user_id: int) -> str:
-    set_optout(config.guild_id, user_id, True)
+async def handle_optout(config: Config, user_id: int) -> str:
+    await submit_db(_apply_optout, config.guild_id, user_id, True)
     return "オプトアウトしました。"
 
 
-def handle_optin(config: Config, user_id: int) -> str:
-    set_optout(config.guild_id, user_id, False)
+async def handle_optin(config: Config, user_id: int) -> str:
+    await submit_db(_apply_optout, config.guild_id, user_id, False)
     return "オプトインしました。"
 
 
+def _apply_optout(guild_id: int, user_id: int, optout: bool) -> None:
+    set_optout(guild_id, user_id, optout)
+    row = fetch_user(guild_id, user_id)
+    if row is not None:
+        apply_user_row(guild_id, row)
+
+
 async def handle_rankboard_set(
     bot: discord.Client,
     config: Config,
@@ -60,12 +79,16 @@ async def handle_hostboard_set(
 
 
 async def handle_level(
-    config: Config, user: discord.User
+    config: Config, user: discord.User, session: aiohttp.ClientSession
 ) -> tuple[discord.File | None, str | None]:
-    ensure_user(config.guild_id, user.id)
-    row = fetch_user(config.guild_id, user.id)
+    started = time.perf_counter()
+    with metrics.timed("level.rank_lookup"):
+        row, season_rank, lifetime_rank = await submit_db(
+            _load_level, config.guild_id, user.id
+        )
     if row is None:
         return None, "ユーザーデータが見つかりません。"
+    guild = user.guild if isinstance(user, discord.Member) else None
 
     if isinstance(user, discord.Member):
         display_name = user.display_name
@@ -75,10 +98,13 @@ async def handle_level(
     tokens = tokenize_display_name(display_name)
     tokens = truncate_tokens(tokens, max_chars=16)
 
-    timeout = aiohttp.ClientTimeout(total=10)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        await resolve_emoji_tokens(tokens, session)
-        avatar = await _fetch_avatar_image(user, session)
+    _, avatar, neighbors = await asyncio.gather(
+        resolve_emoji_tokens(tokens, session),
+        fetch_image(
+            avatar_url(user.display_avatar, AVATAR_SIZE), session, size=AVATAR_SIZE
+        ),
+        _resolve_neighbors(config, guild, session, (season_rank, lifetime_rank)),
+    )
 
     season_level, season_curr, season_next, season_progress = progress_for_xp(
         row["season_xp"]
@@ -97,6 +123,7 @@ async def handle_level(
                 "curr": season_curr,
                 "next": season_next,
                 "progress": season_progress,
+                "position": _describe_position(neighbors, season_rank),
             },
             lifetime_stats={
                 "level": lifetime_level,
@@ -104,6 +131,7 @@ async def handle_level(
                 "curr": lifetime_curr,
                 "next": lifetime_next,
                 "progress": lifetime_progress,
+                "position": _describe_position(neighbors, lifetime_rank),
             },
             optout=bool(row["optout"]),
         )
@@ -111,28 +139,86 @@ async def handle_level(
         _LOGGER.exception("level render failed: user_id=%s", user.id)
         return None, "画像生成に失敗しました。"
 
+    metrics.observe("level.total", time.perf_counter() - started)
     return discord.File(io.BytesIO(png_bytes), filename="level.png"), None
 
 
-async def _fetch_avatar_image(
-    user: discord.User, session: aiohttp.ClientSession
-) -> Image.Image | None:
-    url = str(user.display_avatar.url)
+async def handle_leaderboard(
+    bot: discord.Client, config: Config, board: str, page: int
+) -> tuple[discord.File | None, LeaderboardView | None, str | None]:
+    page = max(1, min(page, page_count(config.guild_id, board)))
     try:
-        async with session.get(url) as response:
-            if response.status != 200:
-                _LOGGER.warning(
-                    "avatar download failed: user_id=%s status=%s",
-                    user.id,
-                    response.status,
-                )
-                return None
-            data = await response.read()
+        png = await render_page(bot, config, board, page)
     except Exception:
-        _LOGGER.exception("avatar download failed: user_id=%s", user.id)
-        return None
+        _LOGGER.exception("leaderboard render failed: board=%s page=%s", board, page)
+        return None, None, "画像生成に失敗しました。"
+    return page_file(board, page, png), LeaderboardView(bot, config, board, page), None
+
+
+def handle_rankboard_archive(
+    config: Config, month: str
+) -> tuple[list[discord.File], str | None]:
     try:
-        return Image.open(io.BytesIO(data)).convert("RGB")
-    except Exception:
-        _LOGGER.exception("avatar decode failed: user_id=%s", user.id)
+        season = datetime.strptime(month.strip(), "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        return [], "月は YYYY-MM の形式で指定してください。"
+    paths, pending = load_archive_files(config, season)
+    if not paths:
+        if pending:
+            return [], "アーカイブ画像を準備中です。"
+        return [], "アーカイブが見つかりません。"
+    return [
+        discord.File(path, filename=f"{season}_{os.path.basename(path)}")
+        for path in paths
+    ], None
+
+
+def _load_level(
+    guild_id: int, user_id: int
+) -> tuple[sqlite3.Row | None, dict | None, dict | None]:
+    ensure_user(guild_id, user_id)
+    row = fetch_user(guild_id, user_id)
+    if row is None:
+        return None, None, None
+    return row, season_position(guild_id, user_id), lifetime_position(guild_id, user_id)
+
+
+async def _resolve_neighbors(
+    config: Config,
+    guild: discord.Guild | None,
+    session: aiohttp.ClientSession,
+    positions: tuple[dict | None, ...],
+) -> dict[int, ResolvedUser]:
+    user_ids = [
+        neighbor["user_id"]
+        for position in positions
+        if position is not None
+        for neighbor in (position["above"], position["below"])
+        if neighbor is not None
+    ]
+    if guild is None or not user_ids:
+        return {}
+    return await resolve_board_users(
+        guild,
+        user_ids,
+        session,
+        concurrency=config.board_resolve_concurrency,
+        timeout=config.board_lookup_timeout_seconds,
+    )
+
+
+def _describe_position(
+    neighbors: dict[int, ResolvedUser], position: dict | None
+) -> dict | None:
+    if position is None:
         return None
+    described = dict(position)
+    for side in ("above", "below"):
+        neighbor = position[side]
+        if neighbor is not None:
+            resolved = neighbors.get(neighbor["user_id"])
+            described[side] = {
+                **neighbor,
+                "name": resolved.display_name if resolved is not None else None,
+            }
+    return described
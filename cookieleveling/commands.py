@@ -8,10 +8,15 @@ from .command_handlers import (
     handle_optin,
     handle_optout,
     handle_level,
+    handle_leaderboard,
     handle_rankboard_set,
+    handle_rankboard_archive,
     handle_hostboard_set,
 )
 from .config import Config
+from .leaderboard_pages import MAX_PLACES, PAGE_SIZE
+from .rank_index import LIFETIME, SEASON
+from .write_scheduler import PRIORITY_INTERACTION, outbound_writes
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -38,14 +43,17 @@ def setup_commands(bot: discord.Client, config: Config) -> None:
             return
         await _defer_ephemeral(interaction)
         try:
-            rendered, error = await handle_level(config, interaction.user)
+            rendered, error = await handle_level(
+                config, interaction.user, bot.asset_session
+            )
             if error:
                 await _send_ephemeral(interaction, error)
                 return
             if rendered is None:
                 await _send_ephemeral(interaction, "画像生成に失敗しました。")
                 return
-            await interaction.followup.send(
+            await _followup(
+                interaction,
                 content="",
                 embeds=[],
                 file=rendered,
@@ -55,6 +63,39 @@ def setup_commands(bot: discord.Client, config: Config) -> None:
             _LOGGER.exception("level command failed")
             await _send_ephemeral(interaction, "エラーが発生しました。")
 
+    @tree.command(name="leaderboard", description="Show the leaderboard")
+    @app_commands.describe(page="Page number", board="Season or lifetime")
+    @app_commands.choices(
+        board=[
+            app_commands.Choice(name="月間", value=SEASON),
+            app_commands.Choice(name="累計", value=LIFETIME),
+        ]
+    )
+    async def leaderboard(
+        interaction: discord.Interaction,
+        page: app_commands.Range[int, 1, MAX_PLACES // PAGE_SIZE] = 1,
+        board: str = SEASON,
+    ) -> None:
+        if not _is_allowed_guild(interaction, config):
+            await _reject_outside_guild(interaction)
+            return
+        await _defer_ephemeral(interaction)
+        try:
+            rendered, view, error = await handle_leaderboard(bot, config, board, page)
+            if error:
+                await _send_ephemeral(interaction, error)
+                return
+            await _followup(
+                interaction,
+                content="",
+                file=rendered,
+                view=view,
+                ephemeral=True,
+            )
+        except Exception:
+            _LOGGER.exception("leaderboard command failed")
+            await _send_ephemeral(interaction, "エラーが発生しました。")
+
     rankboard_group = app_commands.Group(
         name="rankboard", description="Rankboard commands"
     )
@@ -72,6 +113,28 @@ def setup_commands(bot: discord.Client, config: Config) -> None:
             interaction, config, lambda: handle_rankboard_set(bot, config, interaction.channel)
         )
 
+    @rankboard_group.command(name="archive", description="Show archived season rankings")
+    @app_commands.describe(month="Month (YYYY-MM)")
+    async def rankboard_archive(interaction: discord.Interaction, month: str) -> None:
+        if not _is_allowed_guild(interaction, config):
+            await _reject_outside_guild(interaction)
+            return
+        await _defer_ephemeral(interaction)
+        try:
+            files, error = handle_rankboard_archive(config, month)
+            if error:
+                await _send_ephemeral(interaction, error)
+                return
+            await _followup(
+                interaction,
+                content="",
+                files=files,
+                ephemeral=True,
+            )
+        except Exception:
+            _LOGGER.exception("rankboard archive command failed")
+            await _send_ephemeral(interaction, "エラーが発生しました。")
+
     tree.add_command(rankboard_group)
 
     hostboard_group = app_commands.Group(
@@ -119,7 +182,15 @@ async def _defer_ephemeral(interaction: discord.Interaction) -> None:
 async def _send_ephemeral(
     interaction: discord.Interaction, message: str
 ) -> None:
-    await interaction.followup.send(message, ephemeral=True)
+    await _followup(interaction, message, ephemeral=True)
+
+
+async def _followup(interaction: discord.Interaction, *args, **kwargs) -> None:
+    await outbound_writes.submit(
+        "interaction.followup",
+        lambda: interaction.followup.send(*args, **kwargs),
+        priority=PRIORITY_INTERACTION,
+    )
 
 
 def _is_allowed_guild(interaction: discord.Interaction, config: Config) -> bool:
@@ -1,6 +1,10 @@
 import os
 from dataclasses import dataclass
 
+_HOST_XP_MODES = ("counters", "history")
+_BOARD_PUBLISH_MODES = ("bot", "webhook")
+_BOARD_LAYOUTS = ("separate", "combined")
+
 
 @dataclass(frozen=True)
 class Config:
@@ -10,6 +14,17 @@ class Config:
     tz: str
     data_dir: str
     db_path: str
+    board_resolve_concurrency: int = 8
+    board_lookup_timeout_seconds: int = 5
+    board_prefetch_lead_seconds: int = 180
+    board_min_refresh_seconds: int = 600
+    board_refresh_xp_threshold: int = 60
+    board_refresh_budget_per_hour: int = 6
+    host_xp_mode: str = "counters"
+    role_sync_dry_run: bool = False
+    board_publish_mode: str = "bot"
+    board_layout: str = "separate"
+    discord_api_base_url: str = "https://discord.com/api/v10"
 
 
 def _get_required_env(name: str) -> str:
@@ -19,6 +34,30 @@ def _get_required_env(name: str) -> str:
     return value
 
 
+def _get_int_env(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise RuntimeError(f"Invalid integer env var: {name}={value}") from exc
+
+
+def _get_bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_choice_env(name: str, default: str, choices: tuple[str, ...]) -> str:
+    value = os.getenv(name) or default
+    if value not in choices:
+        raise RuntimeError(f"Invalid env var: {name}={value} (choices: {', '.join(choices)})")
+    return value
+
+
 def load_config() -> Config:
     discord_token = _get_required_env("DISCORD_TOKEN")
     discord_client_id = _get_required_env("DISCORD_CLIENT_ID")
@@ -26,6 +65,17 @@ def load_config() -> Config:
     tz = os.getenv("TZ", "Asia/Tokyo")
     data_dir = os.getenv("DATA_DIR", "/opt/CookieLeveling/data")
     db_path = os.getenv("DB_PATH", "/opt/CookieLeveling/data/cookieleveling.sqlite")
+    board_resolve_concurrency = _get_int_env("BOARD_RESOLVE_CONCURRENCY", 8)
+    board_lookup_timeout_seconds = _get_int_env("BOARD_LOOKUP_TIMEOUT_SECONDS", 5)
+    board_prefetch_lead_seconds = _get_int_env("BOARD_PREFETCH_LEAD_SECONDS", 180)
+    board_min_refresh_seconds = _get_int_env("BOARD_MIN_REFRESH_SECONDS", 600)
+    board_refresh_xp_threshold = _get_int_env("BOARD_REFRESH_XP_THRESHOLD", 60)
+    board_refresh_budget_per_hour = _get_int_env("BOARD_REFRESH_BUDGET_PER_HOUR", 6)
+    host_xp_mode = _get_choice_env("HOST_XP_MODE", "counters", _HOST_XP_MODES)
+    role_sync_dry_run = _get_bool_env("ROLE_SYNC_DRY_RUN", False)
+    board_publish_mode = _get_choice_env("BOARD_PUBLISH_MODE", "bot", _BOARD_PUBLISH_MODES)
+    board_layout = _get_choice_env("BOARD_LAYOUT", "separate", _BOARD_LAYOUTS)
+    discord_api_base_url = os.getenv("DISCORD_API_BASE_URL", "https://discord.com/api/v10")
     return Config(
         discord_token=discord_token,
         discord_client_id=discord_client_id,
@@ -33,4 +83,15 @@ def load_config() -> Config:
         tz=tz,
         data_dir=data_dir,
         db_path=db_path,
+        board_resolve_concurrency=board_resolve_concurrency,
+        board_lookup_timeout_seconds=board_lookup_timeout_seconds,
+        board_prefetch_lead_seconds=board_prefetch_lead_seconds,
+        board_min_refresh_seconds=board_min_refresh_seconds,
+        board_refresh_xp_threshold=board_refresh_xp_threshold,
+        board_refresh_budget_per_hour=board_refresh_budget_per_hour,
+        host_xp_mode=host_xp_mode,
+        role_sync_dry_run=role_sync_dry_run,
+        board_publish_mode=board_publish_mode,
+        board_layout=board_layout,
+        discord_api_base_url=discord_api_base_url,
     )
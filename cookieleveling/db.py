@@ -1,28 +1,69 @@
+import asyncio
 import os
 import sqlite3
-from typing import Iterable, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 from .config import Config
 
-_SCHEMA_VERSION = 4
-_connection: Optional[sqlite3.Connection] = None
+_SCHEMA_VERSION = 8
+_BUSY_TIMEOUT_SECONDS = 5.0
+_HOST_SESSION_STAT_COLUMNS = (
+    "peak_audience",
+    "audience_total",
+    "audience_samples",
+    "xp",
+)
+_db_path: Optional[str] = None
+_local = threading.local()
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cookieleveling-db")
+
+BOARD_FINGERPRINT_COLUMNS = (
+    "season_fingerprint",
+    "lifetime_fingerprint",
+    "host_monthly_fingerprint",
+    "host_total_fingerprint",
+)
+_BOARD_WEBHOOK_COLUMNS = (
+    ("rankboard_webhook_id", "INTEGER"),
+    ("rankboard_webhook_token", "TEXT"),
+    ("hostboard_webhook_id", "INTEGER"),
+    ("hostboard_webhook_token", "TEXT"),
+)
 
 
 def get_connection() -> sqlite3.Connection:
-    if _connection is None:
+    conn = getattr(_local, "connection", None)
+    if conn is not None:
+        return conn
+    if _db_path is None:
         raise RuntimeError("Database not initialized")
-    return _connection
+    conn = _open_connection(_db_path)
+    _local.connection = conn
+    return conn
+
+
+def submit_db(func: Callable[..., Any], *args: Any) -> asyncio.Future:
+    return asyncio.get_running_loop().run_in_executor(_DB_EXECUTOR, func, *args)
 
 
 def init_db(config: Config) -> None:
-    global _connection
+    global _db_path
     os.makedirs(config.data_dir, exist_ok=True)
 
-    conn = sqlite3.connect(config.db_path)
-    conn.row_factory = sqlite3.Row
+    conn = _open_connection(config.db_path)
     conn.execute("PRAGMA journal_mode=WAL;")
     _create_schema(conn)
-    _connection = conn
+    _db_path = config.db_path
+    _local.connection = conn
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=_BUSY_TIMEOUT_SECONDS)
+    conn.row_factory = sqlite3.Row
+    return conn
 
 
 def _create_schema(conn: sqlite3.Connection) -> None:
@@ -46,6 +87,14 @@ def _create_schema(conn: sqlite3.Connection) -> None:
             host_monthly_message_id INTEGER,
             host_total_channel_id INTEGER,
             host_total_message_id INTEGER,
+            season_fingerprint TEXT,
+            lifetime_fingerprint TEXT,
+            host_monthly_fingerprint TEXT,
+            host_total_fingerprint TEXT,
+            rankboard_webhook_id INTEGER,
+            rankboard_webhook_token TEXT,
+            hostboard_webhook_id INTEGER,
+            hostboard_webhook_token TEXT,
             updated_at TEXT NOT NULL
         )
         """
@@ -89,10 +138,35 @@ def _create_schema(conn: sqlite3.Connection) -> None:
             last_seen_at TEXT,
             host_confirmed INTEGER NOT NULL DEFAULT 0,
             host_timed_out INTEGER NOT NULL DEFAULT 0,
+            peak_audience INTEGER NOT NULL DEFAULT 0,
+            audience_total INTEGER NOT NULL DEFAULT 0,
+            audience_samples INTEGER NOT NULL DEFAULT 0,
+            xp INTEGER NOT NULL DEFAULT 0,
             PRIMARY KEY (guild_id, channel_id)
         )
         """
     )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS host_session_history (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            host_user_id INTEGER,
+            started_at INTEGER NOT NULL,
+            ended_at INTEGER NOT NULL,
+            peak_audience INTEGER NOT NULL,
+            avg_audience REAL NOT NULL,
+            xp INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS host_session_history_by_host
+        ON host_session_history (guild_id, host_user_id, ended_at)
+        """
+    )
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS host_stats (
@@ -107,6 +181,53 @@ def _create_schema(conn: sqlite3.Connection) -> None:
         )
         """
     )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rank_snapshots (
+            guild_id INTEGER NOT NULL,
+            board TEXT NOT NULL,
+            captured_at INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (guild_id, board, captured_at)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS season_archives (
+            guild_id INTEGER NOT NULL,
+            season TEXT NOT NULL,
+            board TEXT NOT NULL,
+            archived_at TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            image_path TEXT,
+            PRIMARY KEY (guild_id, season, board)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS asset_index (
+            asset_key TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL,
+            last_used_at INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS role_edit_queue (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            level INTEGER NOT NULL,
+            enqueued_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        )
+        """
+    )
     _ensure_meta(conn)
     _migrate_schema(conn)
     conn.commit()
@@ -147,6 +268,18 @@ def _migrate_schema(conn: sqlite3.Connection) -> None:
     if version < 4:
         _migrate_to_v4(conn)
         _set_schema_version(conn, 4)
+    if version < 5:
+        _migrate_to_v5(conn)
+        _set_schema_version(conn, 5)
+    if version < 6:
+        _migrate_to_v6(conn)
+        _set_schema_version(conn, 6)
+    if version < 7:
+        _migrate_to_v7(conn)
+        _set_schema_version(conn, 7)
+    if version < 8:
+        _migrate_to_v8(conn)
+        _set_schema_version(conn, 8)
 
 
 def _column_names(conn: sqlite3.Connection, table: str) -> set[str]:
@@ -204,6 +337,71 @@ def _migrate_to_v4(conn: sqlite3.Connection) -> None:
     )
 
 
+def _migrate_to_v5(conn: sqlite3.Connection) -> None:
+    columns = _column_names(conn, "guild_settings")
+    for column in BOARD_FINGERPRINT_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE guild_settings ADD COLUMN {column} TEXT")
+
+
+def _migrate_to_v6(conn: sqlite3.Connection) -> None:
+    columns = _column_names(conn, "vc_host_state")
+    for column in _HOST_SESSION_STAT_COLUMNS:
+        if column not in columns:
+            conn.execute(
+                f"ALTER TABLE vc_host_state ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+    conn.execute(
+        """
+        INSERT INTO host_session_history (
+            guild_id, channel_id, host_user_id, started_at, ended_at,
+            peak_audience, avg_audience, xp
+        )
+        SELECT guild_id, 0, user_id, 0, 0, 0, 0, total_xp - monthly_xp
+        FROM host_stats
+        WHERE total_xp > monthly_xp
+        UNION ALL
+        SELECT guild_id, 0, user_id, CAST(strftime('%s', 'now') AS INTEGER),
+               CAST(strftime('%s', 'now') AS INTEGER), 0, 0, monthly_xp
+        FROM host_stats
+        WHERE monthly_xp > 0
+        """
+    )
+
+
+def _migrate_to_v7(conn: sqlite3.Connection) -> None:
+    columns = _column_names(conn, "guild_settings")
+    for column, column_type in _BOARD_WEBHOOK_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE guild_settings ADD COLUMN {column} {column_type}")
+
+
+def _migrate_to_v8(conn: sqlite3.Connection) -> None:
+    if "last_used_at" not in _column_names(conn, "asset_index"):
+        conn.execute(
+            "ALTER TABLE asset_index ADD COLUMN last_used_at INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute("UPDATE asset_index SET last_used_at = fetched_at")
+
+
+@contextmanager
+def immediate_transaction() -> Iterator[sqlite3.Connection]:
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def optimize_database() -> None:
+    conn = get_connection()
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
 def reset_voice_states(guild_id: int) -> None:
     conn = get_connection()
     conn.execute(
@@ -229,7 +427,7 @@ def upsert_voice_state(
     conn.commit()
 
 
-def ensure_user(guild_id: int, user_id: int) -> None:
+def ensure_user(guild_id: int, user_id: int, *, commit: bool = True) -> None:
     conn = get_connection()
     conn.execute(
         """
@@ -238,7 +436,8 @@ def ensure_user(guild_id: int, user_id: int) -> None:
         """,
         (guild_id, user_id),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def set_optout(guild_id: int, user_id: int, optout: bool) -> None:
@@ -264,11 +463,23 @@ def fetch_user(guild_id: int, user_id: int) -> Optional[sqlite3.Row]:
     ).fetchone()
 
 
+def fetch_season_voice_ties(guild_id: int, season_xp: int) -> list[sqlite3.Row]:
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT user_id, season_xp, is_in_vc, joined_at, last_earned_at
+        FROM users
+        WHERE guild_id = ? AND season_xp = ? AND is_in_vc = 1 AND optout = 0
+        """,
+        (guild_id, season_xp),
+    ).fetchall()
+
+
 def fetch_active_voice_users(guild_id: int) -> Iterable[sqlite3.Row]:
     conn = get_connection()
     return conn.execute(
         """
-        SELECT user_id, joined_at, lifetime_xp
+        SELECT user_id, joined_at, season_xp, lifetime_xp
         FROM users
         WHERE guild_id = ? AND is_in_vc = 1 AND optout = 0
         """,
@@ -291,8 +502,9 @@ def update_user_xp(
     season_inc: int,
     lifetime_inc: int,
     last_earned_at: str,
+    commit: bool = True,
 ) -> None:
-    ensure_user(guild_id, user_id)
+    ensure_user(guild_id, user_id, commit=False)
     conn = get_connection()
     conn.execute(
         """
@@ -304,7 +516,8 @@ def update_user_xp(
         """,
         (season_inc, lifetime_inc, last_earned_at, guild_id, user_id),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def grant_xp(
@@ -367,10 +580,11 @@ def set_voice_state(
     conn.commit()
 
 
-def reset_season_xp(guild_id: int) -> None:
+def reset_season_xp(guild_id: int, *, commit: bool = True) -> None:
     conn = get_connection()
     conn.execute("UPDATE users SET season_xp = 0 WHERE guild_id = ?", (guild_id,))
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def fetch_rank_candidates(guild_id: int) -> Iterable[sqlite3.Row]:
@@ -490,6 +704,12 @@ def fetch_guild_settings(guild_id: int) -> Optional[sqlite3.Row]:
                host_monthly_message_id,
                host_total_channel_id,
                host_total_message_id,
+               season_fingerprint,
+               lifetime_fingerprint,
+               host_monthly_fingerprint,
+               host_total_fingerprint,
+               rankboard_webhook_id,
+               rankboard_webhook_token,
                updated_at
         FROM guild_settings
         WHERE guild_id = ?
@@ -505,6 +725,8 @@ def upsert_guild_settings(
     season_message_id: int,
     lifetime_channel_id: int,
     lifetime_message_id: int,
+    rankboard_webhook_id: int | None = None,
+    rankboard_webhook_token: str | None = None,
 ) -> None:
     conn = get_connection()
     conn.execute(
@@ -515,14 +737,20 @@ def upsert_guild_settings(
             season_message_id,
             lifetime_channel_id,
             lifetime_message_id,
+            rankboard_webhook_id,
+            rankboard_webhook_token,
             updated_at
-        ) VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
         ON CONFLICT(guild_id)
         DO UPDATE SET
             season_channel_id = excluded.season_channel_id,
             season_message_id = excluded.season_message_id,
             lifetime_channel_id = excluded.lifetime_channel_id,
             lifetime_message_id = excluded.lifetime_message_id,
+            rankboard_webhook_id = excluded.rankboard_webhook_id,
+            rankboard_webhook_token = excluded.rankboard_webhook_token,
+            season_fingerprint = NULL,
+            lifetime_fingerprint = NULL,
             updated_at = datetime('now')
         """,
         (
@@ -531,6 +759,8 @@ def upsert_guild_settings(
             season_message_id,
             lifetime_channel_id,
             lifetime_message_id,
+            rankboard_webhook_id,
+            rankboard_webhook_token,
         ),
     )
     conn.commit()
@@ -545,6 +775,10 @@ def fetch_hostboard_settings(guild_id: int) -> Optional[sqlite3.Row]:
                host_monthly_message_id,
                host_total_channel_id,
                host_total_message_id,
+               host_monthly_fingerprint,
+               host_total_fingerprint,
+               hostboard_webhook_id,
+               hostboard_webhook_token,
                updated_at
         FROM guild_settings
         WHERE guild_id = ?
@@ -560,6 +794,8 @@ def upsert_hostboard_settings(
     host_monthly_message_id: int,
     host_total_channel_id: int,
     host_total_message_id: int,
+    hostboard_webhook_id: int | None = None,
+    hostboard_webhook_token: str | None = None,
 ) -> None:
     conn = get_connection()
     conn.execute(
@@ -570,14 +806,20 @@ def upsert_hostboard_settings(
             host_monthly_message_id,
             host_total_channel_id,
             host_total_message_id,
+            hostboard_webhook_id,
+            hostboard_webhook_token,
             updated_at
-        ) VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
         ON CONFLICT(guild_id)
         DO UPDATE SET
             host_monthly_channel_id = excluded.host_monthly_channel_id,
             host_monthly_message_id = excluded.host_monthly_message_id,
             host_total_channel_id = excluded.host_total_channel_id,
             host_total_message_id = excluded.host_total_message_id,
+            hostboard_webhook_id = excluded.hostboard_webhook_id,
+            hostboard_webhook_token = excluded.hostboard_webhook_token,
+            host_monthly_fingerprint = NULL,
+            host_total_fingerprint = NULL,
             updated_at = datetime('now')
         """,
         (
@@ -586,11 +828,28 @@ def upsert_hostboard_settings(
             host_monthly_message_id,
             host_total_channel_id,
             host_total_message_id,
+            hostboard_webhook_id,
+            hostboard_webhook_token,
         ),
     )
     conn.commit()
 
 
+def update_board_fingerprints(guild_id: int, fingerprints: dict[str, str]) -> None:
+    if not fingerprints:
+        return
+    for column in fingerprints:
+        if column not in BOARD_FINGERPRINT_COLUMNS:
+            raise ValueError(f"unknown board fingerprint column: {column}")
+    assignments = ", ".join(f"{column} = ?" for column in fingerprints)
+    conn = get_connection()
+    conn.execute(
+        f"UPDATE guild_settings SET {assignments} WHERE guild_id = ?",
+        (*fingerprints.values(), guild_id),
+    )
+    conn.commit()
+
+
 def add_host_target_channel(guild_id: int, channel_id: int, created_at: str) -> None:
     conn = get_connection()
     conn.execute(
@@ -635,15 +894,15 @@ def is_host_target_channel(guild_id: int, channel_id: int) -> bool:
     return row is not None
 
 
-def upsert_host_session(
+def save_host_sessions(
     guild_id: int,
-    channel_id: int,
-    session_started_at: str,
-    deadline_at: str,
-    last_seen_at: str,
+    rows: list[tuple],
+    ended_channel_ids: list[int],
+    *,
+    commit: bool = True,
 ) -> None:
     conn = get_connection()
-    conn.execute(
+    conn.executemany(
         """
         INSERT INTO vc_host_state (
             guild_id,
@@ -655,89 +914,35 @@ def upsert_host_session(
             locked,
             last_seen_at,
             host_confirmed,
-            host_timed_out
-        ) VALUES (?, ?, ?, ?, ?, NULL, 0, ?, 0, 0)
+            host_timed_out,
+            peak_audience,
+            audience_total,
+            audience_samples,
+            xp
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(guild_id, channel_id)
         DO UPDATE SET
             session_started_at = excluded.session_started_at,
             started_at = excluded.started_at,
             deadline_at = excluded.deadline_at,
-            host_user_id = NULL,
-            locked = 0,
+            host_user_id = excluded.host_user_id,
+            locked = excluded.locked,
             last_seen_at = excluded.last_seen_at,
-            host_confirmed = 0,
-            host_timed_out = 0
+            host_confirmed = excluded.host_confirmed,
+            host_timed_out = excluded.host_timed_out,
+            peak_audience = excluded.peak_audience,
+            audience_total = excluded.audience_total,
+            audience_samples = excluded.audience_samples,
+            xp = excluded.xp
         """,
-        (
-            guild_id,
-            channel_id,
-            session_started_at,
-            session_started_at,
-            deadline_at,
-            last_seen_at,
-        ),
+        [(guild_id, *row) for row in rows],
     )
-    conn.commit()
-
-
-def clear_host_session(guild_id: int, channel_id: int) -> None:
-    conn = get_connection()
-    conn.execute(
+    conn.executemany(
         "DELETE FROM vc_host_state WHERE guild_id = ? AND channel_id = ?",
-        (guild_id, channel_id),
-    )
-    conn.commit()
-
-
-def mark_host_timeout(guild_id: int, channel_id: int) -> None:
-    conn = get_connection()
-    conn.execute(
-        """
-        UPDATE vc_host_state
-        SET host_timed_out = 1, locked = 0
-        WHERE guild_id = ? AND channel_id = ?
-        """,
-        (guild_id, channel_id),
+        [(guild_id, channel_id) for channel_id in ended_channel_ids],
     )
-    conn.commit()
-
-
-def confirm_host(
-    guild_id: int,
-    channel_id: int,
-    host_user_id: int,
-) -> None:
-    conn = get_connection()
-    conn.execute(
-        """
-        UPDATE vc_host_state
-        SET host_user_id = ?, locked = 1, host_confirmed = 1, host_timed_out = 0
-        WHERE guild_id = ? AND channel_id = ?
-        """,
-        (host_user_id, guild_id, channel_id),
-    )
-    conn.commit()
-
-
-def fetch_host_session(guild_id: int, channel_id: int) -> Optional[sqlite3.Row]:
-    conn = get_connection()
-    return conn.execute(
-        """
-        SELECT guild_id,
-               channel_id,
-               session_started_at,
-               started_at,
-               deadline_at,
-               host_user_id,
-               locked,
-               last_seen_at,
-               host_confirmed,
-               host_timed_out
-        FROM vc_host_state
-        WHERE guild_id = ? AND channel_id = ?
-        """,
-        (guild_id, channel_id),
-    ).fetchone()
+    if commit:
+        conn.commit()
 
 
 def fetch_host_sessions(guild_id: int) -> Iterable[sqlite3.Row]:
@@ -753,7 +958,11 @@ def fetch_host_sessions(guild_id: int) -> Iterable[sqlite3.Row]:
                locked,
                last_seen_at,
                host_confirmed,
-               host_timed_out
+               host_timed_out,
+               peak_audience,
+               audience_total,
+               audience_samples,
+               xp
         FROM vc_host_state
         WHERE guild_id = ?
         """,
@@ -761,24 +970,80 @@ def fetch_host_sessions(guild_id: int) -> Iterable[sqlite3.Row]:
     ).fetchall()
 
 
-def update_host_last_seen(
-    guild_id: int,
-    channel_id: int,
-    last_seen_at: str,
+def insert_host_session_history(
+    guild_id: int, rows: list[tuple], *, commit: bool = True
 ) -> None:
     conn = get_connection()
-    conn.execute(
+    conn.executemany(
         """
-        UPDATE vc_host_state
-        SET last_seen_at = ?
-        WHERE guild_id = ? AND channel_id = ?
+        INSERT INTO host_session_history (
+            guild_id,
+            channel_id,
+            host_user_id,
+            started_at,
+            ended_at,
+            peak_audience,
+            avg_audience,
+            xp
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (last_seen_at, guild_id, channel_id),
+        [(guild_id, *row) for row in rows],
     )
-    conn.commit()
+    if commit:
+        conn.commit()
+
+
+def fetch_host_history_totals(
+    guild_id: int,
+    since: int,
+    until: Optional[int] = None,
+    user_ids: Optional[Iterable[int]] = None,
+) -> list[sqlite3.Row]:
+    user_filter = ""
+    user_params: list[int] = []
+    if user_ids is not None:
+        user_params = list(user_ids)
+        if not user_params:
+            return []
+        user_filter = f"AND host_user_id IN ({','.join('?' for _ in user_params)})"
+    until = until if until is not None else 2**62
+    conn = get_connection()
+    return conn.execute(
+        f"""
+        WITH sessions AS (
+            SELECT host_user_id, ended_at, xp
+            FROM host_session_history
+            WHERE guild_id = ? AND host_user_id IS NOT NULL AND ended_at < ?
+            {user_filter}
+            UNION ALL
+            SELECT host_user_id, CAST(strftime('%s', last_seen_at) AS INTEGER), xp
+            FROM vc_host_state
+            WHERE guild_id = ? AND host_user_id IS NOT NULL AND xp > 0
+            {user_filter}
+        )
+        SELECT host_user_id AS user_id,
+               SUM(CASE WHEN ended_at >= ? THEN xp ELSE 0 END) AS monthly_xp,
+               SUM(xp) AS total_xp,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', MAX(ended_at), 'unixepoch')
+                   AS last_earned_at
+        FROM sessions
+        WHERE ended_at < ?
+        GROUP BY host_user_id
+        HAVING SUM(xp) > 0
+        """,
+        (
+            guild_id,
+            until,
+            *user_params,
+            guild_id,
+            *user_params,
+            since,
+            until,
+        ),
+    ).fetchall()
 
 
-def ensure_host_user(guild_id: int, user_id: int) -> None:
+def ensure_host_user(guild_id: int, user_id: int, *, commit: bool = True) -> None:
     conn = get_connection()
     conn.execute(
         """
@@ -787,7 +1052,8 @@ def ensure_host_user(guild_id: int, user_id: int) -> None:
         """,
         (guild_id, user_id),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def add_host_xp(
@@ -797,8 +1063,9 @@ def add_host_xp(
     monthly_inc: int,
     total_inc: int,
     last_earned_at: str,
+    commit: bool = True,
 ) -> None:
-    ensure_host_user(guild_id, user_id)
+    ensure_host_user(guild_id, user_id, commit=False)
     conn = get_connection()
     conn.execute(
         """
@@ -810,11 +1077,27 @@ def add_host_xp(
         """,
         (monthly_inc, total_inc, last_earned_at, guild_id, user_id),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
-def increment_host_session_counts(guild_id: int, user_id: int) -> None:
-    ensure_host_user(guild_id, user_id)
+def fetch_host_stats(guild_id: int, user_id: int) -> Optional[sqlite3.Row]:
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT user_id, monthly_xp, total_xp, monthly_sessions,
+               total_sessions, last_earned_at
+        FROM host_stats
+        WHERE guild_id = ? AND user_id = ?
+        """,
+        (guild_id, user_id),
+    ).fetchone()
+
+
+def increment_host_session_counts(
+    guild_id: int, user_id: int, *, commit: bool = True
+) -> None:
+    ensure_host_user(guild_id, user_id, commit=False)
     conn = get_connection()
     conn.execute(
         """
@@ -825,7 +1108,8 @@ def increment_host_session_counts(guild_id: int, user_id: int) -> None:
         """,
         (guild_id, user_id),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def fetch_host_top20_monthly(guild_id: int) -> Iterable[sqlite3.Row]:
@@ -854,7 +1138,7 @@ def fetch_host_top20_total(guild_id: int) -> Iterable[sqlite3.Row]:
     ).fetchall()
 
 
-def reset_host_monthly(guild_id: int) -> None:
+def reset_host_monthly(guild_id: int, *, commit: bool = True) -> None:
     conn = get_connection()
     conn.execute(
         """
@@ -865,4 +1149,273 @@ def reset_host_monthly(guild_id: int) -> None:
         """,
         (guild_id,),
     )
+    if commit:
+        conn.commit()
+
+
+def insert_rank_snapshot(
+    guild_id: int, board: str, captured_at: int, payload: bytes
+) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO rank_snapshots (guild_id, board, captured_at, payload)
+        VALUES (?, ?, ?, ?)
+        """,
+        (guild_id, board, captured_at, payload),
+    )
+    conn.commit()
+
+
+def fetch_latest_rank_snapshots(
+    guild_id: int, boards: Iterable[str], at_or_before: int
+) -> list[sqlite3.Row]:
+    boards = list(boards)
+    if not boards:
+        return []
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in boards)
+    return conn.execute(
+        f"""
+        SELECT board, MAX(captured_at) AS captured_at, payload
+        FROM rank_snapshots
+        WHERE guild_id = ? AND board IN ({placeholders}) AND captured_at <= ?
+        GROUP BY board
+        """,
+        (guild_id, *boards, at_or_before),
+    ).fetchall()
+
+
+def compact_rank_snapshots(
+    guild_id: int, hourly_before: int, expire_before: int, day_offset: int
+) -> int:
+    conn = get_connection()
+    expired = conn.execute(
+        "DELETE FROM rank_snapshots WHERE guild_id = ? AND captured_at < ?",
+        (guild_id, expire_before),
+    ).rowcount
+    compacted = conn.execute(
+        """
+        DELETE FROM rank_snapshots
+        WHERE guild_id = ?
+          AND captured_at < ?
+          AND rowid NOT IN (
+              SELECT rowid
+              FROM (
+                  SELECT rowid, MAX(captured_at)
+                  FROM rank_snapshots
+                  WHERE guild_id = ? AND captured_at < ?
+                  GROUP BY board, (captured_at + ?) / 86400
+              )
+          )
+        """,
+        (guild_id, hourly_before, guild_id, hourly_before, day_offset),
+    ).rowcount
+    conn.commit()
+    return expired + compacted
+
+
+def season_archive_exists(guild_id: int, season: str, board: str) -> bool:
+    conn = get_connection()
+    row = conn.execute(
+        """
+        SELECT 1 FROM season_archives
+        WHERE guild_id = ? AND season = ? AND board = ?
+        """,
+        (guild_id, season, board),
+    ).fetchone()
+    return row is not None
+
+
+def insert_season_archive(
+    guild_id: int,
+    season: str,
+    board: str,
+    archived_at: str,
+    payload: bytes,
+    *,
+    commit: bool = True,
+) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO season_archives (
+            guild_id, season, board, archived_at, payload, image_path
+        ) VALUES (?, ?, ?, ?, ?, NULL)
+        """,
+        (guild_id, season, board, archived_at, payload),
+    )
+    if commit:
+        conn.commit()
+
+
+def fetch_season_archives(guild_id: int, season: str) -> list[sqlite3.Row]:
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT season, board, archived_at, payload, image_path
+        FROM season_archives
+        WHERE guild_id = ? AND season = ?
+        """,
+        (guild_id, season),
+    ).fetchall()
+
+
+def fetch_unrendered_season_archives(guild_id: int) -> list[sqlite3.Row]:
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT season, board, archived_at, payload, image_path
+        FROM season_archives
+        WHERE guild_id = ? AND image_path IS NULL
+        """,
+        (guild_id,),
+    ).fetchall()
+
+
+def set_season_archive_image(
+    guild_id: int, season: str, board: str, image_path: str
+) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        UPDATE season_archives
+        SET image_path = ?
+        WHERE guild_id = ? AND season = ? AND board = ?
+        """,
+        (image_path, guild_id, season, board),
+    )
+    conn.commit()
+
+
+def enqueue_role_edits(
+    guild_id: int, levels: dict[int, int], now: float, *, commit: bool = True
+) -> None:
+    conn = get_connection()
+    conn.executemany(
+        """
+        INSERT INTO role_edit_queue (
+            guild_id, user_id, level, enqueued_at, attempts, next_attempt_at
+        ) VALUES (?, ?, ?, ?, 0, ?)
+        ON CONFLICT(guild_id, user_id)
+        DO UPDATE SET
+            level = excluded.level,
+            attempts = 0,
+            next_attempt_at = MIN(next_attempt_at, excluded.next_attempt_at)
+        """,
+        [(guild_id, user_id, level, now, now) for user_id, level in levels.items()],
+    )
+    if commit:
+        conn.commit()
+
+
+def fetch_due_role_edits(guild_id: int, now: float, limit: int) -> list[sqlite3.Row]:
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT user_id, level, enqueued_at, attempts
+        FROM role_edit_queue
+        WHERE guild_id = ? AND next_attempt_at <= ?
+        ORDER BY next_attempt_at
+        LIMIT ?
+        """,
+        (guild_id, now, limit),
+    ).fetchall()
+
+
+def fetch_role_queue_state(guild_id: int) -> tuple[int, Optional[float]]:
+    conn = get_connection()
+    row = conn.execute(
+        """
+        SELECT COUNT(*) AS depth, MIN(next_attempt_at) AS next_attempt_at
+        FROM role_edit_queue
+        WHERE guild_id = ?
+        """,
+        (guild_id,),
+    ).fetchone()
+    return row["depth"], row["next_attempt_at"]
+
+
+def complete_role_edit(guild_id: int, user_id: int, level: int) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        DELETE FROM role_edit_queue
+        WHERE guild_id = ? AND user_id = ? AND level = ?
+        """,
+        (guild_id, user_id, level),
+    )
+    conn.commit()
+
+
+def defer_role_edit(
+    guild_id: int, user_id: int, level: int, attempts: int, next_attempt_at: float
+) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        UPDATE role_edit_queue
+        SET attempts = ?, next_attempt_at = ?
+        WHERE guild_id = ? AND user_id = ? AND level = ?
+        """,
+        (attempts, next_attempt_at, guild_id, user_id, level),
+    )
+    conn.commit()
+
+
+def fetch_asset_digest(asset_key: str) -> Optional[str]:
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT digest FROM asset_index WHERE asset_key = ?",
+        (asset_key,),
+    ).fetchone()
+    return row["digest"] if row is not None else None
+
+
+def store_asset_digest(asset_key: str, digest: str, fetched_at: int) -> None:
+    conn = get_connection()
+    conn.execute(
+        """
+        INSERT INTO asset_index (asset_key, digest, fetched_at, last_used_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(asset_key)
+        DO UPDATE SET digest = excluded.digest,
+                      fetched_at = excluded.fetched_at,
+                      last_used_at = excluded.last_used_at
+        """,
+        (asset_key, digest, fetched_at, fetched_at),
+    )
+    conn.commit()
+
+
+def touch_asset_digest(asset_key: str, used_at: int) -> None:
+    conn = get_connection()
+    conn.execute(
+        "UPDATE asset_index SET last_used_at = ? WHERE asset_key = ?",
+        (used_at, asset_key),
+    )
     conn.commit()
+
+
+def prune_asset_index(used_before: int) -> list[str]:
+    conn = get_connection()
+    stale = [
+        row["digest"]
+        for row in conn.execute(
+            "SELECT DISTINCT digest FROM asset_index WHERE last_used_at < ?",
+            (used_before,),
+        ).fetchall()
+    ]
+    conn.execute("DELETE FROM asset_index WHERE last_used_at < ?", (used_before,))
+    conn.commit()
+    if not stale:
+        return []
+    placeholders = ",".join("?" for _ in stale)
+    referenced = {
+        row["digest"]
+        for row in conn.execute(
+            f"SELECT DISTINCT digest FROM asset_index WHERE digest IN ({placeholders})",
+            stale,
+        ).fetchall()
+    }
+    return [digest for digest in stale if digest not in referenced]
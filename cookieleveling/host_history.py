@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from .db import fetch_host_history_totals, fetch_host_top20_monthly, fetch_host_top20_total
+
+HOST_XP_COUNTERS = "counters"
+HOST_XP_HISTORY = "history"
+
+_JST = ZoneInfo("Asia/Tokyo")
+
+
+def month_start(now: datetime | None = None) -> int:
+    now = datetime.now(_JST) if now is None else now.astimezone(_JST)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return int(start.timestamp())
+
+
+def previous_month_start(now: datetime | None = None) -> int:
+    start = datetime.fromtimestamp(month_start(now), _JST)
+    if start.month == 1:
+        return int(start.replace(year=start.year - 1, month=12).timestamp())
+    return int(start.replace(month=start.month - 1).timestamp())
+
+
+def host_board_rows(guild_id: int, mode: str) -> tuple[list, list]:
+    if mode == HOST_XP_HISTORY:
+        return _split_rows(fetch_host_history_totals(guild_id, month_start()))
+    return list(fetch_host_top20_monthly(guild_id)), list(fetch_host_top20_total(guild_id))
+
+
+def closed_month_rows(guild_id: int, mode: str) -> tuple[list, list]:
+    if mode == HOST_XP_HISTORY:
+        return _split_rows(
+            fetch_host_history_totals(
+                guild_id, previous_month_start(), until=month_start()
+            )
+        )
+    return host_board_rows(guild_id, mode)
+
+
+def host_totals(guild_id: int, user_ids: Iterable[int]) -> list:
+    return fetch_host_history_totals(guild_id, month_start(), user_ids=user_ids)
+
+
+def _split_rows(rows: list) -> tuple[list, list]:
+    return [row for row in rows if row["monthly_xp"] > 0], rows
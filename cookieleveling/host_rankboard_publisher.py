@@ -1,28 +1,82 @@
 from __future__ import annotations
 
-import io
 import logging
 import time
+from functools import partial
+from dataclasses import dataclass
 
-import aiohttp
 import discord
-from PIL import Image
 
+from .board_fingerprint import fingerprint_board
+from .board_messages import (
+    BOARD_LAYOUT_COMBINED,
+    BoardWebhook,
+    BoardWebhookLost,
+    board_webhook,
+    create_board_webhook,
+    delete_board_message,
+    edit_board_message,
+    resend_board,
+    retire_board_webhook,
+    send_board_message,
+)
+from .board_resolver import ResolvedUser, resolve_board_users
 from .config import Config
-from .db import fetch_hostboard_settings, upsert_hostboard_settings
-from .display_name_tokens import tokenize_display_name, truncate_tokens
-from .emoji_assets import resolve_emoji_tokens
+from .rank_index import HOST_MONTHLY, HOST_TOTAL
+from .rank_snapshots import annotate_movement, previous_ranks
+from .db import (
+    fetch_hostboard_settings,
+    submit_db,
+    update_board_fingerprints,
+    upsert_hostboard_settings,
+)
 from .host_rankboard_renderer import RenderedHostRankboard, render_host_rankboard
 from .host_ranker import compute_host_top20_monthly, compute_host_top20_total
 from .xp_engine import progress_for_xp
 
 _LOGGER = logging.getLogger(__name__)
-_AVATAR_CACHE_TTL_SECONDS = 3600
-_AVATAR_CACHE_MAX_SIZE = 256
-_AVATAR_CACHE: dict[str, tuple[float, Image.Image]] = {}
 
 
-async def update_hostboard(bot: discord.Client, config: Config) -> bool:
+@dataclass(frozen=True)
+class HostboardData:
+    monthly_rows: list[dict]
+    total_rows: list[dict]
+
+    def user_ids(self) -> list[int]:
+        return [row["user_id"] for row in self.monthly_rows + self.total_rows]
+
+    def composition(self) -> tuple:
+        return (
+            tuple(row["user_id"] for row in self.monthly_rows),
+            tuple(row["user_id"] for row in self.total_rows),
+        )
+
+    def fingerprints(self, guild: discord.Guild) -> dict[str, str]:
+        return {
+            "host_monthly_fingerprint": fingerprint_board(guild, self.monthly_rows, "monthly_xp"),
+            "host_total_fingerprint": fingerprint_board(guild, self.total_rows, "total_xp"),
+        }
+
+
+def load_hostboard_data(guild_id: int) -> HostboardData:
+    data = HostboardData(
+        monthly_rows=compute_host_top20_monthly(guild_id),
+        total_rows=compute_host_top20_total(guild_id),
+    )
+    previous = previous_ranks(guild_id, (HOST_MONTHLY, HOST_TOTAL))
+    annotate_movement(data.monthly_rows, previous.get(HOST_MONTHLY))
+    annotate_movement(data.total_rows, previous.get(HOST_TOTAL))
+    return data
+
+
+async def update_hostboard(
+    bot: discord.Client,
+    config: Config,
+    data: HostboardData | None = None,
+    resolved: dict[int, ResolvedUser] | None = None,
+    timings: dict[str, float] | None = None,
+    fingerprints: dict[str, str] | None = None,
+) -> bool:
     settings = fetch_hostboard_settings(config.guild_id)
     if settings is None:
         _LOGGER.warning("hostboard not configured")
@@ -51,79 +105,157 @@ async def update_hostboard(bot: discord.Client, config: Config) -> bool:
         _LOGGER.warning("hostboard channel not found: %s", total_channel_id)
         return False
 
-    try:
-        monthly_message = await monthly_channel.fetch_message(monthly_message_id)
-    except discord.NotFound:
-        _LOGGER.warning("hostboard message not found: %s", monthly_message_id)
-        return False
+    webhook = board_webhook(settings, "hostboard")
+    publish_monthly = _needs_publish(settings, fingerprints, "host_monthly_fingerprint")
+    publish_total = _needs_publish(settings, fingerprints, "host_total_fingerprint")
+    combined = monthly_message_id == total_message_id
+    if combined:
+        publish_monthly = publish_total = publish_monthly or publish_total
+    if not publish_monthly and not publish_total:
+        return True
 
+    render_started = time.perf_counter()
     try:
-        total_message = await total_channel.fetch_message(total_message_id)
-    except discord.NotFound:
-        _LOGGER.warning("hostboard message not found: %s", total_message_id)
-        return False
-
-    try:
-        files = await _render_files(bot, config)
+        files = await _render_files(bot, config, data, resolved)
     except Exception:
         _LOGGER.exception("hostboard render failed")
         return False
-
-    monthly_ok = False
-    total_ok = False
+    upload_started = time.perf_counter()
+    if timings is not None:
+        timings["hostboard.render"] = upload_started - render_started
+
+    monthly_ok = not publish_monthly
+    total_ok = not publish_total
+    published: dict[str, str] = {}
+    webhook_lost = False
+    message_lost = False
     try:
-        try:
-            await monthly_message.edit(
-                content="",
-                embeds=[],
-                attachments=[files.monthly_file],
-            )
-            monthly_ok = True
-            _LOGGER.info("hostboard monthly updated")
-        except Exception:
-            _LOGGER.exception("hostboard monthly update failed")
-
-        try:
-            await total_message.edit(
-                content="",
-                embeds=[],
-                attachments=[files.total_file],
-            )
-            total_ok = True
-            _LOGGER.info("hostboard total updated")
-        except Exception:
-            _LOGGER.exception("hostboard total update failed")
+        if combined:
+            try:
+                await edit_board_message(
+                    bot,
+                    monthly_channel,
+                    monthly_message_id,
+                    webhook=webhook,
+                    content="",
+                    embeds=[],
+                    attachments=[files.total_file, files.monthly_file],
+                )
+                monthly_ok = total_ok = True
+                if fingerprints is not None:
+                    published["host_monthly_fingerprint"] = fingerprints["host_monthly_fingerprint"]
+                    published["host_total_fingerprint"] = fingerprints["host_total_fingerprint"]
+                _LOGGER.info("hostboard updated")
+            except BoardWebhookLost:
+                webhook_lost = True
+            except discord.NotFound:
+                _LOGGER.warning("hostboard message not found: %s", monthly_message_id)
+                message_lost = webhook is not None
+            except Exception:
+                _LOGGER.exception("hostboard update failed")
+        else:
+            if publish_monthly:
+                try:
+                    await edit_board_message(
+                        bot,
+                        monthly_channel,
+                        monthly_message_id,
+                        webhook=webhook,
+                        content="",
+                        embeds=[],
+                        attachments=[files.monthly_file],
+                    )
+                    monthly_ok = True
+                    if fingerprints is not None:
+                        published["host_monthly_fingerprint"] = fingerprints["host_monthly_fingerprint"]
+                    _LOGGER.info("hostboard monthly updated")
+                except BoardWebhookLost:
+                    webhook_lost = True
+                except discord.NotFound:
+                    _LOGGER.warning("hostboard message not found: %s", monthly_message_id)
+                    message_lost = webhook is not None
+                except Exception:
+                    _LOGGER.exception("hostboard monthly update failed")
+
+            if publish_total:
+                try:
+                    await edit_board_message(
+                        bot,
+                        total_channel,
+                        total_message_id,
+                        webhook=webhook,
+                        content="",
+                        embeds=[],
+                        attachments=[files.total_file],
+                    )
+                    total_ok = True
+                    if fingerprints is not None:
+                        published["host_total_fingerprint"] = fingerprints["host_total_fingerprint"]
+                    _LOGGER.info("hostboard total updated")
+                except BoardWebhookLost:
+                    webhook_lost = True
+                except discord.NotFound:
+                    _LOGGER.warning("hostboard message not found: %s", total_message_id)
+                    message_lost = webhook is not None
+                except Exception:
+                    _LOGGER.exception("hostboard total update failed")
     finally:
         files.cleanup()
+        if timings is not None:
+            timings["hostboard.upload"] = time.perf_counter() - upload_started
+    await submit_db(update_board_fingerprints, config.guild_id, published)
+    if webhook_lost or message_lost:
+        return await resend_board(
+            bot,
+            config,
+            monthly_channel,
+            settings,
+            prefix="hostboard",
+            columns=("host_monthly", "host_total"),
+            send=lambda hook: send_hostboard_messages(bot, config, monthly_channel, hook),
+            store=upsert_hostboard_settings,
+            webhook=None if webhook_lost else webhook,
+            fingerprints=fingerprints,
+        )
 
     return monthly_ok and total_ok
 
 
 async def send_hostboard_messages(
-    bot: discord.Client, config: Config, channel: discord.TextChannel
-) -> tuple[discord.Message, discord.Message]:
-    total_message: discord.Message | None = None
-    monthly_message: discord.Message | None = None
+    bot: discord.Client,
+    config: Config,
+    channel: discord.TextChannel,
+    webhook: BoardWebhook | None = None,
+) -> tuple[int, int]:
+    total_message_id: int | None = None
+    monthly_message_id: int | None = None
     try:
         files = await _render_files(bot, config)
         try:
-            total_message = await channel.send(content="", files=[files.total_file])
-            monthly_message = await channel.send(
-                content="", files=[files.monthly_file]
+            if config.board_layout == BOARD_LAYOUT_COMBINED:
+                monthly_message_id = await send_board_message(
+                    bot, channel, [files.total_file, files.monthly_file], webhook
+                )
+                return monthly_message_id, monthly_message_id
+            total_message_id = await send_board_message(
+                bot, channel, [files.total_file], webhook
             )
-            return monthly_message, total_message
+            monthly_message_id = await send_board_message(
+                bot, channel, [files.monthly_file], webhook
+            )
+            return monthly_message_id, total_message_id
         finally:
             files.cleanup()
     except Exception:
         _LOGGER.exception("hostboard send failed: channel_id=%s", channel.id)
-        if monthly_message is not None:
+        if monthly_message_id is not None:
             try:
-                await monthly_message.delete()
+                await delete_board_message(bot, channel, monthly_message_id, webhook)
             except Exception:
                 _LOGGER.warning("failed to delete hostboard monthly message")
-        if total_message is not None:
+        if total_message_id is not None:
             try:
-                await total_message.delete()
+                await delete_board_message(bot, channel, total_message_id, webhook)
             except Exception:
                 _LOGGER.warning("failed to delete hostboard total message")
         raise
@@ -137,6 +269,7 @@ async def set_hostboard(
         return False, "このチャンネルでは設置できません。"
 
     settings = fetch_hostboard_settings(config.guild_id)
+    old_webhook = board_webhook(settings, "hostboard")
     if settings:
         if settings["host_monthly_channel_id"] and settings["host_monthly_message_id"]:
             await _mark_moved(
@@ -144,46 +277,80 @@ async def set_hostboard(
                 settings["host_monthly_channel_id"],
                 settings["host_monthly_message_id"],
                 target_channel.id,
+                old_webhook,
             )
-        if settings["host_total_channel_id"] and settings["host_total_message_id"]:
+        if (
+            settings["host_total_channel_id"]
+            and settings["host_total_message_id"]
+            and settings["host_total_message_id"] != settings["host_monthly_message_id"]
+        ):
             await _mark_moved(
                 bot,
                 settings["host_total_channel_id"],
                 settings["host_total_message_id"],
                 target_channel.id,
+                old_webhook,
             )
 
+    webhook = await create_board_webhook(config, target_channel)
     try:
-        monthly_message, total_message = await send_hostboard_messages(
-            bot, config, target_channel
+        monthly_message_id, total_message_id = await send_hostboard_messages(
+            bot, config, target_channel, webhook
         )
     except Exception:
+        await retire_board_webhook(bot, webhook)
         return False, "設置に失敗しました。"
-
-    upsert_hostboard_settings(
-        config.guild_id,
-        host_monthly_channel_id=target_channel.id,
-        host_monthly_message_id=monthly_message.id,
-        host_total_channel_id=target_channel.id,
-        host_total_message_id=total_message.id,
+    await retire_board_webhook(bot, old_webhook)
+
+    await submit_db(
+        partial(
+            upsert_hostboard_settings,
+            config.guild_id,
+            host_monthly_channel_id=target_channel.id,
+            host_monthly_message_id=monthly_message_id,
+            host_total_channel_id=target_channel.id,
+            host_total_message_id=total_message_id,
+            hostboard_webhook_id=webhook.webhook_id if webhook else None,
+            hostboard_webhook_token=webhook.token if webhook else None,
+        )
     )
     return True, f"<#{target_channel.id}> に設置しました。"
 
 
 async def _render_files(
-    bot: discord.Client, config: Config
+    bot: discord.Client,
+    config: Config,
+    data: HostboardData | None = None,
+    resolved: dict[int, ResolvedUser] | None = None,
 ) -> RenderedHostRankboard:
     guild = bot.get_guild(config.guild_id)
     if guild is None:
         raise RuntimeError("hostboardの描画に必要なGuildが見つかりません。")
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=10)
-    ) as session:
-        monthly_entries = await _prepare_monthly_entries(guild, session)
-        total_entries = await _prepare_total_entries(guild, session)
+    if data is None:
+        data = load_hostboard_data(guild.id)
+    missing = [user_id for user_id in data.user_ids() if user_id not in (resolved or {})]
+    if missing:
+        resolved = await resolve_board_users(
+            guild,
+            missing,
+            bot.asset_session,
+            concurrency=config.board_resolve_concurrency,
+            timeout=config.board_lookup_timeout_seconds,
+            known=resolved,
+        )
+    monthly_entries = build_monthly_entries(data.monthly_rows, resolved or {})
+    total_entries = build_total_entries(data.total_rows, resolved or {})
     return await render_host_rankboard(monthly_entries, total_entries)
 
 
+def _needs_publish(
+    settings, fingerprints: dict[str, str] | None, column: str
+) -> bool:
+    if fingerprints is None:
+        return True
+    return settings[column] != fingerprints[column]
+
+
 def _normalize_channel(
     channel: discord.abc.GuildChannel,
 ) -> discord.TextChannel | None:
@@ -195,150 +362,69 @@ def _normalize_channel(
 
 
 async def _mark_moved(
-    bot: discord.Client, channel_id: int, message_id: int, new_channel_id: int
+    bot: discord.Client,
+    channel_id: int,
+    message_id: int,
+    new_channel_id: int,
+    webhook: BoardWebhook | None,
 ) -> None:
     channel = bot.get_channel(channel_id)
     if channel is None or not isinstance(channel, discord.TextChannel):
         return
     try:
-        message = await channel.fetch_message(message_id)
-    except discord.NotFound:
+        await edit_board_message(
+            bot,
+            channel,
+            message_id,
+            webhook=webhook,
+            route="board.notice",
+            content=f"移動しました: <#{new_channel_id}>",
+            embeds=[],
+            attachments=[],
+        )
+    except (discord.NotFound, BoardWebhookLost):
         return
-    await message.edit(
-        content=f"移動しました: <#{new_channel_id}>",
-        embeds=[],
-        attachments=[],
-    )
 
 
-async def _prepare_monthly_entries(
-    guild: discord.Guild, session: aiohttp.ClientSession
+def build_monthly_entries(
+    rows: list[dict], resolved: dict[int, ResolvedUser]
 ) -> list[dict]:
     entries: list[dict] = []
-    for row in compute_host_top20_monthly(guild.id):
-        user_id = row["user_id"]
-        member = await _resolve_member(guild, user_id)
-        name_tokens = await _prepare_name_tokens(member, user_id, session)
+    for row in rows:
+        user = resolved[row["user_id"]]
         level, _, _, progress = progress_for_xp(row["monthly_xp"])
         entries.append(
             {
-                "user_id": user_id,
-                "name": member.display_name if member else None,
-                "name_tokens": name_tokens,
+                "user_id": user.user_id,
+                "name": user.display_name,
+                "name_tokens": user.name_tokens,
                 "level": level,
                 "monthly_xp": row["monthly_xp"],
                 "xp_progress": progress,
-                "avatar": await _fetch_avatar(member, session),
+                "avatar": user.avatar,
+                "movement": row.get("movement"),
             }
         )
     return entries
 
 
-async def _prepare_total_entries(
-    guild: discord.Guild, session: aiohttp.ClientSession
+def build_total_entries(
+    rows: list[dict], resolved: dict[int, ResolvedUser]
 ) -> list[dict]:
     entries: list[dict] = []
-    for row in compute_host_top20_total(guild.id):
-        user_id = row["user_id"]
-        member = await _resolve_member(guild, user_id)
-        name_tokens = await _prepare_name_tokens(member, user_id, session)
+    for row in rows:
+        user = resolved[row["user_id"]]
         level, _, _, progress = progress_for_xp(row["total_xp"])
         entries.append(
             {
-                "user_id": user_id,
-                "name": member.display_name if member else None,
-                "name_tokens": name_tokens,
+                "user_id": user.user_id,
+                "name": user.display_name,
+                "name_tokens": user.name_tokens,
                 "level": level,
                 "total_xp": row["total_xp"],
                 "xp_progress": progress,
-                "avatar": await _fetch_avatar(member, session),
+                "avatar": user.avatar,
+                "movement": row.get("movement"),
             }
         )
     return entries
-
-
-async def _resolve_member(
-    guild: discord.Guild, user_id: int
-) -> discord.Member | None:
-    member = guild.get_member(user_id)
-    if member is not None:
-        return member
-    try:
-        return await guild.fetch_member(user_id)
-    except Exception:
-        _LOGGER.exception("member fetch failed: user_id=%s", user_id)
-        return None
-
-
-async def _prepare_name_tokens(
-    member: discord.Member | None,
-    user_id: int,
-    session: aiohttp.ClientSession,
-) -> list:
-    name = member.display_name if member else str(user_id)
-    tokens = tokenize_display_name(name)
-    tokens = truncate_tokens(tokens, max_chars=16)
-    await resolve_emoji_tokens(tokens, session)
-    return tokens
-
-
-async def _fetch_avatar(
-    member: discord.Member | None, session: aiohttp.ClientSession
-) -> Image.Image | None:
-    if member is None:
-        return None
-    url = str(member.display_avatar.url)
-    cached = _get_cached_avatar(url)
-    if cached is not None:
-        return cached
-    try:
-        async with session.get(url) as response:
-            if response.status != 200:
-                _LOGGER.warning(
-                    "avatar download failed: user_id=%s status=%s",
-                    member.id,
-                    response.status,
-                )
-                return None
-            data = await response.read()
-    except Exception:
-        _LOGGER.exception("avatar download failed: user_id=%s", member.id)
-        return None
-    try:
-        image = Image.open(io.BytesIO(data)).convert("RGB")
-    except Exception:
-        _LOGGER.exception("avatar decode failed: user_id=%s", member.id)
-        return None
-    _store_cached_avatar(url, image)
-    return image.copy()
-
-
-def _get_cached_avatar(url: str) -> Image.Image | None:
-    now = time.monotonic()
-    cached = _AVATAR_CACHE.get(url)
-    if cached is None:
-        return None
-    cached_at, image = cached
-    if now - cached_at > _AVATAR_CACHE_TTL_SECONDS:
-        _AVATAR_CACHE.pop(url, None)
-        return None
-    return image.copy()
-
-
-def _store_cached_avatar(url: str, image: Image.Image) -> None:
-    now = time.monotonic()
-    _prune_avatar_cache(now)
-    if len(_AVATAR_CACHE) >= _AVATAR_CACHE_MAX_SIZE:
-        oldest_url = min(_AVATAR_CACHE.items(), key=lambda item: item[1][0])[0]
-        _AVATAR_CACHE.pop(oldest_url, None)
-    _AVATAR_CACHE[url] = (now, image)
-
-
-def _prune_avatar_cache(now: float) -> None:
-    expired = [
-        url
-        for url, (cached_at, _) in _AVATAR_CACHE.items()
-        if now - cached_at > _AVATAR_CACHE_TTL_SECONDS
-    ]
-    for url in expired:
-        _AVATAR_CACHE.pop(url, None)
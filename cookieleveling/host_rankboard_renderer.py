@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import os
 import tempfile
 from dataclasses import dataclass
@@ -37,21 +39,25 @@ async def render_host_rankboard(
     monthly_path = _make_temp_path("host_monthly_board")
     total_path = _make_temp_path("host_total_board")
 
-    render_rankboard_image(
-        monthly_entries,
-        monthly_path,
-        title="月間 部屋主ランキングTOP20",
-        background=_MONTHLY_BACKGROUND,
-        header_fill=_MONTHLY_HEADER,
-        xp_bar_fill=_MONTHLY_XP_BAR_FILL,
-    )
-    render_rankboard_image(
-        total_entries,
-        total_path,
-        title="累計 部屋主ランキングTOP20",
-        background=_TOTAL_BACKGROUND,
-        header_fill=_TOTAL_HEADER,
-        xp_bar_fill=_TOTAL_XP_BAR_FILL,
+    await asyncio.gather(
+        asyncio.to_thread(
+            render_rankboard_image,
+            monthly_entries,
+            monthly_path,
+            title="月間 部屋主ランキングTOP20",
+            background=_MONTHLY_BACKGROUND,
+            header_fill=_MONTHLY_HEADER,
+            xp_bar_fill=_MONTHLY_XP_BAR_FILL,
+        ),
+        asyncio.to_thread(
+            render_rankboard_image,
+            total_entries,
+            total_path,
+            title="累計 部屋主ランキングTOP20",
+            background=_TOTAL_BACKGROUND,
+            header_fill=_TOTAL_HEADER,
+            xp_bar_fill=_TOTAL_XP_BAR_FILL,
+        ),
     )
 
     return RenderedHostRankboard(
@@ -61,5 +67,22 @@ async def render_host_rankboard(
     )
 
 
+def render_host_board_png(entries: list[dict], *, title: str, total: bool = False) -> bytes:
+    output = io.BytesIO()
+    if total:
+        style = (_TOTAL_BACKGROUND, _TOTAL_HEADER, _TOTAL_XP_BAR_FILL)
+    else:
+        style = (_MONTHLY_BACKGROUND, _MONTHLY_HEADER, _MONTHLY_XP_BAR_FILL)
+    render_rankboard_image(
+        entries,
+        output,
+        title=title,
+        background=style[0],
+        header_fill=style[1],
+        xp_bar_fill=style[2],
+    )
+    return output.getvalue()
+
+
 def _make_temp_path(prefix: str) -> str:
     return os.path.join(tempfile.gettempdir(), f"cookieleveling_{prefix}.png")
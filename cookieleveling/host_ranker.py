@@ -1,51 +1,22 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-
-from .db import fetch_host_top20_monthly, fetch_host_top20_total
+from .rank_index import HOST_MONTHLY, HOST_TOTAL, get_index, key_last_earned, key_xp
 
 
 def compute_host_top20_monthly(guild_id: int) -> list[dict]:
-    candidates = [_monthly_entry(row) for row in fetch_host_top20_monthly(guild_id)]
-    candidates.sort(key=_monthly_sort_key)
-    return candidates[:20]
+    return compute_host_top(guild_id, HOST_MONTHLY, "monthly_xp", 20)
 
 
 def compute_host_top20_total(guild_id: int) -> list[dict]:
-    candidates = [_total_entry(row) for row in fetch_host_top20_total(guild_id)]
-    candidates.sort(key=_total_sort_key)
-    return candidates[:20]
-
-
-def _monthly_entry(row) -> dict:
-    last_earned_at = _parse_time(row["last_earned_at"])
-    return {
-        "user_id": row["user_id"],
-        "monthly_xp": row["monthly_xp"],
-        "last_earned_at": last_earned_at,
-    }
-
-
-def _monthly_sort_key(entry: dict) -> tuple:
-    last_earned = entry["last_earned_at"] or datetime.max.replace(tzinfo=timezone.utc)
-    return (-entry["monthly_xp"], last_earned, entry["user_id"])
-
-
-def _total_entry(row) -> dict:
-    last_earned_at = _parse_time(row["last_earned_at"])
-    return {
-        "user_id": row["user_id"],
-        "total_xp": row["total_xp"],
-        "last_earned_at": last_earned_at,
-    }
-
-
-def _total_sort_key(entry: dict) -> tuple:
-    last_earned = entry["last_earned_at"] or datetime.max.replace(tzinfo=timezone.utc)
-    return (-entry["total_xp"], last_earned, entry["user_id"])
-
-
-def _parse_time(value) -> datetime | None:
-    if not value:
-        return None
-    return datetime.fromisoformat(value)
+    return compute_host_top(guild_id, HOST_TOTAL, "total_xp", 20)
+
+
+def compute_host_top(guild_id: int, ordering: str, xp_field: str, limit: int) -> list[dict]:
+    return [
+        {
+            "user_id": key[2],
+            xp_field: key_xp(key),
+            "last_earned_at": key_last_earned(key),
+        }
+        for key in get_index(guild_id, ordering).range(0, limit)
+    ]
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
 
 import discord
@@ -8,17 +10,18 @@ import discord
 from .db import (
     add_host_target_channel,
     add_host_xp,
-    clear_host_session,
-    confirm_host,
-    fetch_host_session,
     fetch_host_sessions,
+    fetch_host_stats,
     fetch_host_target_channels,
+    immediate_transaction,
     increment_host_session_counts,
-    mark_host_timeout,
+    insert_host_session_history,
     remove_host_target_channel,
-    update_host_last_seen,
-    upsert_host_session,
+    save_host_sessions,
+    submit_db,
 )
+from .host_history import HOST_XP_HISTORY, host_totals
+from .rank_index import apply_host_xp
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,8 +29,80 @@ TARGET_CATEGORY_ID = 1450712250514935960
 SHABEREA_BOT_ID = 695096014482440244
 HOST_CONFIRM_TIMEOUT_SECONDS = 120
 
+
+@dataclass
+class HostSession:
+    channel_id: int
+    session_started_at: datetime
+    deadline_at: datetime
+    last_seen_at: datetime
+    host_user_id: int | None = None
+    locked: bool = False
+    host_confirmed: bool = False
+    host_timed_out: bool = False
+    peak_audience: int = 0
+    audience_total: int = 0
+    audience_samples: int = 0
+    xp: int = 0
+
+    def row(self) -> tuple:
+        started = self.session_started_at.isoformat()
+        return (
+            self.channel_id,
+            started,
+            started,
+            self.deadline_at.isoformat(),
+            self.host_user_id,
+            int(self.locked),
+            self.last_seen_at.isoformat(),
+            int(self.host_confirmed),
+            int(self.host_timed_out),
+            self.peak_audience,
+            self.audience_total,
+            self.audience_samples,
+            self.xp,
+        )
+
+    def history_row(self, ended_at: datetime) -> tuple:
+        if self.audience_samples:
+            avg_audience = self.audience_total / self.audience_samples
+        else:
+            avg_audience = float(self.peak_audience)
+        return (
+            self.channel_id,
+            self.host_user_id,
+            int(self.session_started_at.timestamp()),
+            int(ended_at.timestamp()),
+            self.peak_audience,
+            avg_audience,
+            self.xp,
+        )
+
+
+@dataclass(frozen=True)
+class HostTick:
+    guild_id: int
+    now: datetime
+    host_xp_mode: str
+    rows: list[tuple]
+    ended: list[int] = field(default_factory=list)
+    finished: list[tuple[HostSession, datetime]] = field(default_factory=list)
+    grants: dict[int, int] = field(default_factory=dict)
+    confirmations: list[int] = field(default_factory=list)
+    session_xp: list[tuple[HostSession, int]] = field(default_factory=list)
+
+
 _target_channel_ids: set[int] = set()
 _targets_loaded = False
+_sessions: dict[int, HostSession] = {}
+_human_counts: dict[int, int] = {}
+_pending_confirmations: list[int] = []
+_finished_sessions: list[tuple[HostSession, datetime]] = []
+_ended_channels: set[int] = set()
+_unpersisted_grants: dict[int, int] = {}
+_unpersisted_xp: dict[int, tuple[HostSession, int]] = {}
+_sessions_restored = False
+_deadline_timers: dict[int, asyncio.TimerHandle] = {}
 
 
 def load_host_targets(guild: discord.Guild) -> None:
@@ -44,19 +119,46 @@ def load_host_targets(guild: discord.Guild) -> None:
     _LOGGER.info("host targets loaded: %s", len(_target_channel_ids))
 
 
-def handle_channel_create(channel: discord.abc.GuildChannel) -> None:
+def restore_host_sessions(guild: discord.Guild) -> None:
+    global _sessions_restored
+    _ensure_targets_loaded(guild)
+    for channel_id in list(_sessions):
+        _end_session(channel_id)
+    _human_counts.clear()
+    for channel_id in _target_channel_ids:
+        channel = guild.get_channel(channel_id)
+        if _is_target_channel(channel):
+            _human_counts[channel_id] = _count_humans(channel)
+    for row in fetch_host_sessions(guild.id):
+        session = _session_from_row(row)
+        if _human_counts.get(session.channel_id, 0) == 0:
+            _finished_sessions.append((session, session.last_seen_at))
+            _ended_channels.add(session.channel_id)
+            continue
+        _start_session(session)
+    now = datetime.now(timezone.utc)
+    for channel_id in _human_counts:
+        _reconcile_channel(channel_id, now)
+    _sessions_restored = True
+    _LOGGER.info("host sessions restored: %s", len(_sessions))
+
+
+async def handle_channel_create(channel: discord.abc.GuildChannel) -> None:
     if not _is_target_category_channel(channel):
         return
     now = _utc_now()
-    add_host_target_channel(channel.guild.id, channel.id, now)
     _target_channel_ids.add(channel.id)
+    _human_counts[channel.id] = _count_humans(channel)
+    _reconcile_channel(channel.id, datetime.now(timezone.utc))
+    await submit_db(add_host_target_channel, channel.guild.id, channel.id, now)
     _LOGGER.info("host target added: %s", channel.id)
 
 
-def handle_channel_delete(channel: discord.abc.GuildChannel) -> None:
-    remove_host_target_channel(channel.guild.id, channel.id)
+async def handle_channel_delete(channel: discord.abc.GuildChannel) -> None:
     _target_channel_ids.discard(channel.id)
-    clear_host_session(channel.guild.id, channel.id)
+    _human_counts.pop(channel.id, None)
+    _end_session(channel.id, datetime.now(timezone.utc))
+    await submit_db(remove_host_target_channel, channel.guild.id, channel.id)
     _LOGGER.info("host target removed: %s", channel.id)
 
 
@@ -67,21 +169,18 @@ def handle_voice_state_update(
 ) -> None:
     if member.bot:
         return
-    guild = member.guild
-    _ensure_targets_loaded(guild)
-    channel_ids: set[int] = set()
-    if before.channel is not None:
-        channel_ids.add(before.channel.id)
-    if after.channel is not None:
-        channel_ids.add(after.channel.id)
-    if not channel_ids:
+    if before.channel == after.channel:
         return
+    _ensure_targets_loaded(member.guild)
     now = datetime.now(timezone.utc)
-    for channel_id in channel_ids:
-        channel = guild.get_channel(channel_id)
-        if not _is_target_channel(channel):
-            continue
-        _reconcile_channel(guild.id, channel, now)
+    if _is_target_channel(before.channel):
+        channel_id = before.channel.id
+        _human_counts[channel_id] = max(0, _human_counts.get(channel_id, 0) - 1)
+        _reconcile_channel(channel_id, now)
+    if _is_target_channel(after.channel):
+        channel_id = after.channel.id
+        _human_counts[channel_id] = _human_counts.get(channel_id, 0) + 1
+        _reconcile_channel(channel_id, now)
 
 
 def handle_shaberea_message(message: discord.Message) -> None:
@@ -102,111 +201,204 @@ def handle_shaberea_message(message: discord.Message) -> None:
     channel = member.voice.channel
     if not _is_target_channel(channel):
         return
-    session = fetch_host_session(guild.id, channel.id)
+    session = _sessions.get(channel.id)
     if session is None:
         return
-    if session["locked"] or session["host_timed_out"]:
+    if session.locked or session.host_timed_out:
         return
-    now = datetime.now(timezone.utc)
-    deadline = _parse_time(session["deadline_at"])
-    if deadline is not None and now > deadline:
-        mark_host_timeout(guild.id, channel.id)
+    if datetime.now(timezone.utc) > session.deadline_at:
+        _expire_session(channel.id)
         return
-    confirm_host(guild.id, channel.id, member.id)
-    increment_host_session_counts(guild.id, member.id)
+    _cancel_deadline(channel.id)
+    session.host_user_id = member.id
+    session.locked = True
+    session.host_confirmed = True
+    _pending_confirmations.append(member.id)
     _LOGGER.info("host confirmed: channel=%s user=%s", channel.id, member.id)
 
 
-def snapshot_host_sessions(guild: discord.Guild) -> None:
-    _ensure_targets_loaded(guild)
-    now = datetime.now(timezone.utc)
-    sessions = {
-        row["channel_id"]: row for row in fetch_host_sessions(guild.id)
-    }
-    for channel_id in list(_target_channel_ids):
-        channel = guild.get_channel(channel_id)
-        if not _is_target_channel(channel):
-            continue
-        member_count = _count_humans(channel)
-        session = sessions.get(channel_id)
-        if member_count == 0:
-            if session is not None:
-                clear_host_session(guild.id, channel_id)
-            continue
-        if session is None:
-            deadline = now + timedelta(seconds=HOST_CONFIRM_TIMEOUT_SECONDS)
-            now_iso = now.isoformat()
-            upsert_host_session(
-                guild.id,
-                channel_id,
-                now_iso,
-                deadline.isoformat(),
-                now_iso,
-            )
-            continue
-        update_host_last_seen(guild.id, channel_id, now.isoformat())
-        if not session["locked"] and not session["host_timed_out"]:
-            deadline = _parse_time(session["deadline_at"])
-            if deadline is not None and now > deadline:
-                mark_host_timeout(guild.id, channel_id)
-
-
-def tick_host_xp(guild: discord.Guild) -> int:
+def capture_host_tick(guild: discord.Guild, host_xp_mode: str) -> HostTick:
     _ensure_targets_loaded(guild)
     now = datetime.now(timezone.utc)
-    sessions = {
-        row["channel_id"]: row for row in fetch_host_sessions(guild.id)
+    if not _sessions_restored:
+        return HostTick(guild_id=guild.id, now=now, host_xp_mode=host_xp_mode, rows=[])
+    grants = dict(_unpersisted_grants)
+    _unpersisted_grants.clear()
+    session_xp = {
+        channel_id: amount
+        for channel_id, (session, amount) in _unpersisted_xp.items()
+        if _sessions.get(channel_id) is session
     }
-    updated = 0
-    for channel_id in list(_target_channel_ids):
-        channel = guild.get_channel(channel_id)
-        if not _is_target_channel(channel):
+    _unpersisted_xp.clear()
+    for channel_id, session in _sessions.items():
+        session.last_seen_at = now
+        member_count = _human_counts.get(channel_id, 0)
+        session.audience_total += member_count
+        session.audience_samples += 1
+        if not session.locked or session.host_timed_out:
             continue
-        session = sessions.get(channel_id)
-        if session is None or not session["locked"]:
+        if session.host_user_id is None:
             continue
-        if session["host_timed_out"]:
-            continue
-        host_user_id = session["host_user_id"]
-        if host_user_id is None:
-            continue
-        member_count = _count_humans(channel)
         if member_count < 2:
             continue
+        session_xp[channel_id] = session_xp.get(channel_id, 0) + member_count
+        grants[session.host_user_id] = (
+            grants.get(session.host_user_id, 0) + member_count
+        )
+    confirmations = list(_pending_confirmations)
+    _pending_confirmations.clear()
+    finished = list(_finished_sessions)
+    _finished_sessions.clear()
+    ended = list(_ended_channels)
+    _ended_channels.clear()
+    return HostTick(
+        guild_id=guild.id,
+        now=now,
+        host_xp_mode=host_xp_mode,
+        rows=[
+            replace(session, xp=session.xp + session_xp.get(channel_id, 0)).row()
+            for channel_id, session in _sessions.items()
+        ],
+        ended=ended,
+        finished=finished,
+        grants=grants,
+        confirmations=confirmations,
+        session_xp=[
+            (_sessions[channel_id], amount) for channel_id, amount in session_xp.items()
+        ],
+    )
+
+
+def persist_host_tick(tick: HostTick) -> None:
+    with immediate_transaction():
+        save_host_sessions(tick.guild_id, tick.rows, tick.ended, commit=False)
+        insert_host_session_history(
+            tick.guild_id,
+            [session.history_row(ended_at) for session, ended_at in tick.finished],
+            commit=False,
+        )
+        if tick.host_xp_mode != HOST_XP_HISTORY:
+            _add_host_counters(tick)
+
+
+def refresh_host_index(tick: HostTick) -> dict[int, int]:
+    if tick.host_xp_mode != HOST_XP_HISTORY:
+        rows = [fetch_host_stats(tick.guild_id, user_id) for user_id in tick.grants]
+    else:
+        rows = host_totals(tick.guild_id, tick.grants)
+    for row in rows:
+        if row is not None:
+            apply_host_xp(
+                tick.guild_id, row["user_id"], row["monthly_xp"], row["total_xp"], tick.now
+            )
+    return tick.grants
+
+
+def commit_host_tick(tick: HostTick) -> None:
+    for session, amount in tick.session_xp:
+        session.xp += amount
+
+
+def requeue_host_tick(tick: HostTick) -> None:
+    _pending_confirmations[:0] = tick.confirmations
+    _finished_sessions[:0] = tick.finished
+    _ended_channels.update(
+        channel_id for channel_id in tick.ended if channel_id not in _sessions
+    )
+    for user_id, amount in tick.grants.items():
+        _unpersisted_grants[user_id] = _unpersisted_grants.get(user_id, 0) + amount
+    for session, amount in tick.session_xp:
+        if _sessions.get(session.channel_id) is session:
+            _unpersisted_xp[session.channel_id] = (session, amount)
+        else:
+            session.xp += amount
+
+
+def _add_host_counters(tick: HostTick) -> None:
+    earned_at = tick.now.isoformat()
+    for user_id in tick.confirmations:
+        increment_host_session_counts(tick.guild_id, user_id, commit=False)
+    for user_id, amount in tick.grants.items():
         add_host_xp(
-            guild_id=guild.id,
-            user_id=host_user_id,
-            monthly_inc=member_count,
-            total_inc=member_count,
-            last_earned_at=now.isoformat(),
+            guild_id=tick.guild_id,
+            user_id=user_id,
+            monthly_inc=amount,
+            total_inc=amount,
+            last_earned_at=earned_at,
+            commit=False,
         )
-        updated += 1
-    return updated
 
 
-def _reconcile_channel(
-    guild_id: int, channel: discord.abc.GuildChannel, now: datetime
-) -> None:
-    if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
-        return
-    member_count = _count_humans(channel)
-    session = fetch_host_session(guild_id, channel.id)
-    if member_count == 0:
-        if session is not None:
-            clear_host_session(guild_id, channel.id)
+def _reconcile_channel(channel_id: int, now: datetime) -> None:
+    session = _sessions.get(channel_id)
+    if _human_counts.get(channel_id, 0) == 0:
+        _end_session(channel_id, now)
         return
     if session is None:
-        deadline = now + timedelta(seconds=HOST_CONFIRM_TIMEOUT_SECONDS)
-        now_iso = now.isoformat()
-        upsert_host_session(
-            guild_id, channel.id, now_iso, deadline.isoformat(), now_iso
+        session = HostSession(
+            channel_id=channel_id,
+            session_started_at=now,
+            deadline_at=now + timedelta(seconds=HOST_CONFIRM_TIMEOUT_SECONDS),
+            last_seen_at=now,
         )
+        _start_session(session)
+    session.last_seen_at = now
+    session.peak_audience = max(session.peak_audience, _human_counts[channel_id])
+
+
+def _start_session(session: HostSession) -> None:
+    _sessions[session.channel_id] = session
+    _ended_channels.discard(session.channel_id)
+    if session.locked or session.host_timed_out:
+        return
+    loop = asyncio.get_running_loop()
+    delay = (session.deadline_at - datetime.now(timezone.utc)).total_seconds()
+    _deadline_timers[session.channel_id] = loop.call_at(
+        loop.time() + max(0.0, delay), _expire_session, session.channel_id
+    )
+
+
+def _end_session(channel_id: int, ended_at: datetime | None = None) -> None:
+    _cancel_deadline(channel_id)
+    session = _sessions.pop(channel_id, None)
+    if session is not None:
+        _ended_channels.add(channel_id)
+    if session is not None and ended_at is not None:
+        _finished_sessions.append((session, ended_at))
+
+
+def _cancel_deadline(channel_id: int) -> None:
+    timer = _deadline_timers.pop(channel_id, None)
+    if timer is not None:
+        timer.cancel()
+
+
+def _expire_session(channel_id: int) -> None:
+    _deadline_timers.pop(channel_id, None)
+    session = _sessions.get(channel_id)
+    if session is None or session.locked or session.host_timed_out:
         return
-    update_host_last_seen(guild_id, channel.id, now.isoformat())
-    if not session["locked"] and not session["host_timed_out"]:
-        deadline = _parse_time(session["deadline_at"])
-        if deadline is not None and now > deadline:
-            mark_host_timeout(guild_id, channel.id)
+    session.host_timed_out = True
+    session.locked = False
+    _LOGGER.info("host confirmation timed out: channel=%s", channel_id)
+
+
+def _session_from_row(row) -> HostSession:
+    started = _parse_time(row["session_started_at"])
+    return HostSession(
+        channel_id=row["channel_id"],
+        session_started_at=started,
+        deadline_at=_parse_time(row["deadline_at"]),
+        last_seen_at=_parse_time(row["last_seen_at"]) or started,
+        host_user_id=row["host_user_id"],
+        locked=bool(row["locked"]),
+        host_confirmed=bool(row["host_confirmed"]),
+        host_timed_out=bool(row["host_timed_out"]),
+        peak_audience=row["peak_audience"],
+        audience_total=row["audience_total"],
+        audience_samples=row["audience_samples"],
+        xp=row["xp"],
+    )
 
 
 def _ensure_targets_loaded(guild: discord.Guild) -> None:
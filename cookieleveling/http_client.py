@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import aiohttp
+
+from . import metrics
+
+_TOTAL_TIMEOUT_SECONDS = 10
+_CONNECTION_LIMIT = 32
+_CONNECTION_LIMIT_PER_HOST = 8
+_DNS_CACHE_TTL_SECONDS = 300
+_KEEPALIVE_SECONDS = 60.0
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=_CONNECTION_LIMIT,
+        limit_per_host=_CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=_DNS_CACHE_TTL_SECONDS,
+        keepalive_timeout=_KEEPALIVE_SECONDS,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=_TOTAL_TIMEOUT_SECONDS),
+        trace_configs=[_trace_config()],
+    )
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(_counter("http.connection_created"))
+    trace.on_connection_reuseconn.append(_counter("http.connection_reused"))
+    trace.on_dns_cache_hit.append(_counter("http.dns_cache_hit"))
+    trace.on_dns_cache_miss.append(_counter("http.dns_cache_miss"))
+    trace.on_connection_queued_start.append(_on_queued_start)
+    trace.on_connection_queued_end.append(_on_queued_end)
+    return trace
+
+
+def _counter(name: str):
+    async def _record(
+        session: aiohttp.ClientSession, context: SimpleNamespace, params
+    ) -> None:
+        metrics.increment(name)
+
+    return _record
+
+
+async def _on_queued_start(
+    session: aiohttp.ClientSession, context: SimpleNamespace, params
+) -> None:
+    context.queued_at = time.perf_counter()
+
+
+async def _on_queued_end(
+    session: aiohttp.ClientSession, context: SimpleNamespace, params
+) -> None:
+    queued_at = getattr(context, "queued_at", None)
+    if queued_at is not None:
+        metrics.observe("http.pool_wait", time.perf_counter() - queued_at)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 from datetime import datetime
-from typing import Iterable
+from typing import IO, Iterable
 from zoneinfo import ZoneInfo
 
 from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageFilter
@@ -16,7 +16,7 @@ _PANEL_PADDING = 16
 _HEADER_HEIGHT = 50
 _TABLE_TOP_GAP = 8
 _ROW_HEIGHT = 120
-_AVATAR_SIZE = 76
+AVATAR_SIZE = 76
 _ROWS_PER_COLUMN = 10
 _COLUMNS_PER_PANEL = 2
 
@@ -35,6 +35,11 @@ _TEXT_SHADOW = (0, 0, 0, 0)
 _AVATAR_PLACEHOLDER = (217, 217, 217, 255)
 _EMOJI_PLACEHOLDER = (217, 217, 217, 255)
 _XP_BAR_FILL = (255, 192, 203, 255)
+_MOVEMENT_UP = (46, 160, 67, 255)
+_MOVEMENT_DOWN = (207, 34, 46, 255)
+_MOVEMENT_SAME = (160, 160, 160, 255)
+_NEW_BADGE_FILL = (255, 140, 0, 255)
+_NEW_BADGE_TEXT = (255, 255, 255, 255)
 _XP_BAR_BG = (228, 228, 228, 255)
 
 _FONT_PATH = "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"
@@ -52,6 +57,8 @@ _HEADER_FONT_SIZE = 16
 _NAME_FONT_SIZE = 30
 _RANK_FONT_SIZE = 30
 _LEVEL_FONT_SIZE = 44
+_MOVEMENT_FONT_SIZE = 16
+_MOVEMENT_HEIGHT = 22
 _EMPTY_SLOT_NAME = "—"
 _CARD_RADIUS = 18
 _PANEL_RADIUS = 24
@@ -65,9 +72,10 @@ _XP_BAR_SIDE_PADDING = 8
 
 def render_rankboard_image(
     entries: Iterable[dict],
-    output_path: str,
+    output_path: str | IO[bytes],
     *,
     title: str,
+    start_rank: int = 1,
     background: tuple[int, int, int] | None = None,
     header_fill: tuple[int, int, int] | None = None,
     xp_bar_fill: tuple[int, int, int] | tuple[int, int, int, int] | None = None,
@@ -82,6 +90,7 @@ def render_rankboard_image(
     name_font = _load_font(_NAME_FONT_SIZE)
     rank_font = _load_font(_RANK_FONT_SIZE, prefer_bold=True)
     level_font = _load_font(_LEVEL_FONT_SIZE, prefer_bold=True)
+    movement_font = _load_font(_MOVEMENT_FONT_SIZE, prefer_bold=True)
 
     panel_rect = (
         _OUTER_MARGIN,
@@ -97,6 +106,8 @@ def render_rankboard_image(
         name_font,
         rank_font,
         level_font,
+        start_rank=start_rank,
+        movement_font=movement_font,
         title_font=title_font,
         header_font=header_font,
         title=title,
@@ -115,6 +126,8 @@ def _draw_panel(
     rank_font: ImageFont.ImageFont,
     level_font: ImageFont.ImageFont,
     *,
+    start_rank: int,
+    movement_font: ImageFont.ImageFont,
     title_font: ImageFont.ImageFont,
     header_font: ImageFont.ImageFont,
     title: str,
@@ -162,8 +175,8 @@ def _draw_panel(
         width=content_width,
     )
 
-    mask = _circle_mask(_AVATAR_SIZE)
-    placeholder = _circle_placeholder(_AVATAR_SIZE)
+    mask = _circle_mask(AVATAR_SIZE)
+    placeholder = _circle_placeholder(AVATAR_SIZE)
     emoji_size = min(40, int(row_height) - 18)
     emoji_placeholder = _emoji_placeholder(emoji_size)
 
@@ -177,32 +190,43 @@ def _draw_panel(
 
         name_tokens = _resolve_name_tokens(entry)
         avatar = entry.get("avatar")
-        rank_text = str(idx)
+        rank_text = str(start_rank + idx - 1)
         level_value = entry.get("level")
         progress = entry.get("xp_progress")
         column_set = column_sets[col_idx]
         for col in column_set:
             key = col["key"]
             if key == "rank":
+                movement = entry.get("movement")
+                card_height = card_rect[3] - card_rect[1]
+                fitted_rank_font = _fit_rank_font(draw, rank_text, col, rank_font)
+                if movement is None:
+                    _draw_text_aligned(
+                        draw, rank_text, col, card_rect[1], card_height, fitted_rank_font
+                    )
+                    continue
+                rank_height = card_height - _MOVEMENT_HEIGHT
                 _draw_text_aligned(
+                    draw, rank_text, col, card_rect[1], rank_height, fitted_rank_font
+                )
+                _draw_movement(
                     draw,
-                    rank_text,
+                    movement,
                     col,
-                    card_rect[1],
-                    card_rect[3] - card_rect[1],
-                    rank_font,
+                    card_rect[1] + rank_height - 6,
+                    movement_font,
                 )
                 continue
             if key == "avatar":
-                avatar_x = int(col["x"] + (col["width"] - _AVATAR_SIZE) / 2)
+                avatar_x = int(col["x"] + (col["width"] - AVATAR_SIZE) / 2)
                 avatar_y = int(
-                    card_rect[1] + (card_rect[3] - card_rect[1] - _AVATAR_SIZE) / 2
+                    card_rect[1] + (card_rect[3] - card_rect[1] - AVATAR_SIZE) / 2
                 )
                 if avatar is None:
                     image.paste(placeholder, (avatar_x, avatar_y), mask)
                 else:
                     avatar_image = ImageOps.fit(
-                        avatar.convert("RGBA"), (_AVATAR_SIZE, _AVATAR_SIZE)
+                        avatar.convert("RGBA"), (AVATAR_SIZE, AVATAR_SIZE)
                     )
                     image.paste(avatar_image, (avatar_x, avatar_y), mask)
                 continue
@@ -224,6 +248,49 @@ def _draw_panel(
                 continue
 
 
+def _fit_rank_font(
+    draw: ImageDraw.ImageDraw, text: str, col: dict, font: ImageFont.ImageFont
+) -> ImageFont.ImageFont:
+    max_width = col["width"] - 10
+    text_width = _text_width(draw, text, font)
+    if text_width <= max_width:
+        return font
+    size = max(12, int(_RANK_FONT_SIZE * max_width / text_width))
+    return _load_font(size, prefer_bold=True)
+
+
+def _draw_movement(
+    draw: ImageDraw.ImageDraw,
+    movement: int | str,
+    col: dict,
+    top: float,
+    font: ImageFont.ImageFont,
+) -> None:
+    padding = 8
+    x_right = col["x_right"] - padding
+    text_y = _center_text_y(draw, top, _MOVEMENT_HEIGHT, font)
+    if movement == "new":
+        text = "NEW"
+        text_width = _text_width(draw, text, font)
+        x_right = col["x_right"] - 2
+        badge_left = x_right - text_width - 8
+        draw.rounded_rectangle(
+            (badge_left, top + 2, x_right, top + _MOVEMENT_HEIGHT - 2),
+            radius=(_MOVEMENT_HEIGHT - 4) // 2,
+            fill=_NEW_BADGE_FILL,
+        )
+        draw.text((badge_left + 4, text_y), text, font=font, fill=_NEW_BADGE_TEXT)
+        return
+    if movement > 0:
+        text, fill = f"▲{movement}", _MOVEMENT_UP
+    elif movement < 0:
+        text, fill = f"▼{-movement}", _MOVEMENT_DOWN
+    else:
+        text, fill = "−", _MOVEMENT_SAME
+    text_width = _text_width(draw, text, font)
+    draw.text((x_right - text_width, text_y), text, font=font, fill=fill)
+
+
 def _resolve_name_tokens(entry: dict) -> list[NameToken]:
     tokens = entry.get("name_tokens")
     if tokens is not None:
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import math
+from dataclasses import dataclass
+from typing import Callable
+
+import discord
+
+from . import metrics
+from .board_fingerprint import fingerprint_board
+from .board_resolver import ResolvedUser, resolve_board_users
+from .config import Config
+from .rank_index import LIFETIME, SEASON, get_index
+from .rank_snapshots import annotate_movement, previous_ranks
+from .rankboard_publisher import build_lifetime_entries, build_season_entries
+from .rankboard_renderer import render_leaderboard_page
+from .ranker import lifetime_range, season_range
+from .write_scheduler import PRIORITY_INTERACTION, outbound_writes
+
+_LOGGER = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_PLACES = 100
+LEADERBOARD_BOARDS = (SEASON, LIFETIME)
+_VIEW_TIMEOUT_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class _BoardSpec:
+    xp_field: str
+    load: Callable[[int, int, int], list[dict]]
+    build: Callable[[list[dict], dict[int, ResolvedUser]], list[dict]]
+
+
+@dataclass(frozen=True)
+class _CachedPage:
+    fingerprint: str
+    png: bytes
+
+
+_SPECS = {
+    SEASON: _BoardSpec("season_xp", season_range, build_season_entries),
+    LIFETIME: _BoardSpec("lifetime_xp", lifetime_range, build_lifetime_entries),
+}
+_page_cache: dict[tuple[str, int], _CachedPage] = {}
+
+
+def page_count(guild_id: int, board: str) -> int:
+    ranked = min(len(get_index(guild_id, board)), MAX_PLACES)
+    return max(1, math.ceil(ranked / PAGE_SIZE))
+
+
+async def render_page(
+    bot: discord.Client, config: Config, board: str, page: int
+) -> bytes:
+    guild = bot.get_guild(config.guild_id)
+    if guild is None:
+        raise RuntimeError("leaderboardの描画に必要なGuildが見つかりません。")
+    spec = _SPECS[board]
+    start = (page - 1) * PAGE_SIZE
+    rows = spec.load(guild.id, start, start + PAGE_SIZE)
+    annotate_movement(
+        rows, previous_ranks(guild.id, (board,)).get(board), start_rank=start + 1
+    )
+    fingerprint = fingerprint_board(guild, rows, spec.xp_field)
+    cached = _page_cache.get((board, page))
+    if cached is not None and cached.fingerprint == fingerprint:
+        metrics.increment("leaderboard.cache_hit")
+        return cached.png
+
+    metrics.increment("leaderboard.cache_miss")
+    with metrics.timed("leaderboard.render"):
+        resolved = await resolve_board_users(
+            guild,
+            [row["user_id"] for row in rows],
+            bot.asset_session,
+            concurrency=config.board_resolve_concurrency,
+            timeout=config.board_lookup_timeout_seconds,
+        )
+        png = await asyncio.to_thread(
+            render_leaderboard_page,
+            spec.build(rows, resolved),
+            lifetime=board == LIFETIME,
+            start_rank=start + 1,
+            end_rank=start + PAGE_SIZE,
+        )
+    _page_cache[(board, page)] = _CachedPage(fingerprint, png)
+    return png
+
+
+def page_file(board: str, page: int, png: bytes) -> discord.File:
+    return discord.File(io.BytesIO(png), filename=f"leaderboard_{board}_{page}.png")
+
+
+class LeaderboardView(discord.ui.View):
+    def __init__(
+        self, bot: discord.Client, config: Config, board: str, page: int
+    ) -> None:
+        super().__init__(timeout=_VIEW_TIMEOUT_SECONDS)
+        self._bot = bot
+        self._config = config
+        self._board = board
+        self.page = page
+        self._sync_buttons()
+
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="1 / 1", style=discord.ButtonStyle.secondary, disabled=True)
+    async def page_indicator(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await interaction.response.defer()
+
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self._show(interaction, self.page + 1)
+
+    async def _show(self, interaction: discord.Interaction, page: int) -> None:
+        await interaction.response.defer()
+        page = max(1, min(page, page_count(self._config.guild_id, self._board)))
+        try:
+            png = await render_page(self._bot, self._config, self._board, page)
+        except Exception:
+            _LOGGER.exception("leaderboard page render failed: page=%s", page)
+            await outbound_writes.submit(
+                "interaction.followup",
+                lambda: interaction.followup.send(
+                    "画像生成に失敗しました。", ephemeral=True
+                ),
+                priority=PRIORITY_INTERACTION,
+            )
+            return
+        self.page = page
+        self._sync_buttons()
+        await outbound_writes.submit(
+            "interaction.edit",
+            lambda: interaction.edit_original_response(
+                attachments=[page_file(self._board, page, png)], view=self
+            ),
+            priority=PRIORITY_INTERACTION,
+            key=("message", interaction.message.id) if interaction.message else None,
+        )
+
+    def _sync_buttons(self) -> None:
+        pages = page_count(self._config.guild_id, self._board)
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = self.page >= pages
+        self.page_indicator.label = f"{self.page} / {pages}"
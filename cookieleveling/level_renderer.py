@@ -10,16 +10,18 @@ from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageOps
 
 from .display_name_tokens import NameToken
 
-_CANVAS_SIZE = (900, 360)
+_CANVAS_SIZE = (900, 400)
 _OUTER_MARGIN = 20
 _PANEL_PADDING = 20
 _HEADER_HEIGHT = 56
-_AVATAR_SIZE = 96
+AVATAR_SIZE = 96
 _NAME_LINE_HEIGHT = 36
 _STAT_LINE_HEIGHT = 24
 _STAT_GAP = 16
 _BAR_HEIGHT = 12
 _BAR_GAP = 6
+_RANK_LINE_HEIGHT = 22
+_NEIGHBOR_NAME_CHARS = 10
 _CARD_RADIUS = 24
 
 _BACKGROUND = (255, 243, 247)
@@ -50,6 +52,7 @@ _NAME_FONT_SIZE = 32
 _LABEL_FONT_SIZE = 20
 _LEVEL_FONT_SIZE = 24
 _SMALL_FONT_SIZE = 16
+_RANK_FONT_SIZE = 15
 
 
 def render_level_card(
@@ -69,6 +72,7 @@ def render_level_card(
     label_font = _load_font(_LABEL_FONT_SIZE)
     level_font = _load_font(_LEVEL_FONT_SIZE, prefer_bold=True)
     small_font = _load_font(_SMALL_FONT_SIZE, prefer_mono=True)
+    rank_font = _load_font(_RANK_FONT_SIZE)
 
     panel_rect = (
         _OUTER_MARGIN,
@@ -97,7 +101,7 @@ def render_level_card(
     avatar_y = body_top + 6
     _draw_avatar(image, avatar, (avatar_x, avatar_y))
 
-    right_x = avatar_x + _AVATAR_SIZE + 20
+    right_x = avatar_x + AVATAR_SIZE + 20
     right_width = content_right - right_x
 
     name_tokens = _fit_tokens_to_width(
@@ -126,6 +130,14 @@ def render_level_card(
         level_font=level_font,
         small_font=small_font,
     )
+    stats_top = _draw_position_line(
+        draw,
+        season_stats.get("position"),
+        left=right_x,
+        top=stats_top,
+        width=right_width,
+        font=rank_font,
+    )
     stats_top = _draw_stat_block(
         draw,
         label="累計",
@@ -137,6 +149,14 @@ def render_level_card(
         level_font=level_font,
         small_font=small_font,
     )
+    _draw_position_line(
+        draw,
+        lifetime_stats.get("position"),
+        left=right_x,
+        top=stats_top,
+        width=right_width,
+        font=rank_font,
+    )
 
     if optout:
         text = "optout中（XP加算なし）"
@@ -193,13 +213,13 @@ def _draw_panel(image: Image.Image, rect: tuple[int, int, int, int]) -> None:
 def _draw_avatar(
     image: Image.Image, avatar: Image.Image | None, position: tuple[int, int]
 ) -> None:
-    mask = _circle_mask(_AVATAR_SIZE)
-    placeholder = _circle_placeholder(_AVATAR_SIZE)
+    mask = _circle_mask(AVATAR_SIZE)
+    placeholder = _circle_placeholder(AVATAR_SIZE)
     if avatar is None:
         image.paste(placeholder, position, mask)
     else:
         avatar_image = ImageOps.fit(
-            avatar.convert("RGBA"), (_AVATAR_SIZE, _AVATAR_SIZE)
+            avatar.convert("RGBA"), (AVATAR_SIZE, AVATAR_SIZE)
         )
         image.paste(avatar_image, position, mask)
 
@@ -244,6 +264,45 @@ def _draw_stat_block(
     return bar_bottom
 
 
+def _draw_position_line(
+    draw: ImageDraw.ImageDraw,
+    position: dict | None,
+    *,
+    left: int,
+    top: int,
+    width: int,
+    font: ImageFont.ImageFont,
+) -> int:
+    text_y = _center_text_y(draw, top + 4, _RANK_LINE_HEIGHT - 4, font)
+    if position is None:
+        _draw_text(draw, (left, text_y), "ランク外", font, _TEXT_MUTED)
+        return top + _RANK_LINE_HEIGHT
+    rank_text = (
+        f"{_format_number(position['rank'])}位 / {_format_number(position['total'])}人"
+    )
+    _draw_text(draw, (left, text_y), rank_text, font, _TEXT)
+    neighbors = [
+        _format_neighbor(mark, position.get(side))
+        for mark, side in (("↑", "above"), ("↓", "below"))
+    ]
+    neighbor_text = "  ".join(text for text in neighbors if text)
+    if neighbor_text:
+        neighbor_width = _text_width(draw, neighbor_text, font)
+        neighbor_x = left + width - neighbor_width
+        _draw_text(draw, (neighbor_x, text_y), neighbor_text, font, _TEXT_SUB)
+    return top + _RANK_LINE_HEIGHT
+
+
+def _format_neighbor(mark: str, neighbor: dict | None) -> str | None:
+    if neighbor is None:
+        return None
+    name = neighbor.get("name") or str(neighbor.get("user_id"))
+    if len(name) > _NEIGHBOR_NAME_CHARS:
+        name = name[: _NEIGHBOR_NAME_CHARS - 1] + "…"
+    gap = int(neighbor.get("xp_gap", 0))
+    return f"{mark} {name} {gap:+,} XP"
+
+
 def _draw_xp_bar(
     draw: ImageDraw.ImageDraw,
     *,
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+_DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+_lock = threading.Lock()
+_histograms: dict[str, "Histogram"] = {}
+_counters: dict[str, int] = {}
+_gauges: dict[str, float] = {}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = _DEFAULT_BUCKETS) -> None:
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= target:
+                if idx < len(self._bounds):
+                    return min(self._bounds[idx], self.max)
+                return self.max
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            _histograms[name] = histogram
+        histogram.observe(value)
+
+
+def increment(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def gauge(name: str) -> float | None:
+    with _lock:
+        return _gauges.get(name)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def format_report(prefix: str | None = None) -> list[str]:
+    lines: list[str] = []
+    with _lock:
+        for name in sorted(_histograms):
+            if prefix and not name.startswith(prefix):
+                continue
+            histogram = _histograms[name]
+            lines.append(
+                f"{name}: n={histogram.count} mean={histogram.mean:.3f}s "
+                f"p50={histogram.quantile(0.5):.3f}s "
+                f"p95={histogram.quantile(0.95):.3f}s "
+                f"max={histogram.max:.3f}s"
+            )
+        for name in sorted(_counters):
+            if prefix and not name.startswith(prefix):
+                continue
+            lines.append(f"{name}: {_counters[name]}")
+        for name in sorted(_gauges):
+            if prefix and not name.startswith(prefix):
+                continue
+            lines.append(f"{name}: {_gauges[name]:g}")
+    return lines
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from datetime import datetime, timezone
+from typing import Iterable
+
+from .db import fetch_lifetime_candidates, fetch_rank_candidates
+from .host_history import HOST_XP_COUNTERS, host_board_rows
+
+SEASON = "season"
+LIFETIME = "lifetime"
+HOST_MONTHLY = "host_monthly"
+HOST_TOTAL = "host_total"
+ORDERINGS = (SEASON, LIFETIME, HOST_MONTHLY, HOST_TOTAL)
+
+_NEVER = datetime.max.replace(tzinfo=timezone.utc)
+
+RankKey = tuple[int, datetime, int]
+
+
+class RankIndex:
+    def __init__(self) -> None:
+        self._keys: list[RankKey] = []
+        self._by_user: dict[int, RankKey] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, user_id: int, xp: int, last_earned_at: datetime | None) -> None:
+        with self._lock:
+            self._discard(user_id)
+            if xp <= 0:
+                return
+            key = (-xp, last_earned_at or _NEVER, user_id)
+            bisect.insort(self._keys, key)
+            self._by_user[user_id] = key
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._by_user.clear()
+
+    def xp_of(self, user_id: int) -> int:
+        key = self._by_user.get(user_id)
+        return -key[0] if key else 0
+
+    def rank_of(self, user_id: int) -> int | None:
+        with self._lock:
+            key = self._by_user.get(user_id)
+            if key is None:
+                return None
+            return bisect.bisect_left(self._keys, key) + 1
+
+    def tie_range(self, xp: int) -> tuple[int, int]:
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, (-xp,))
+            hi = bisect.bisect_left(self._keys, (-xp + 1,))
+            return lo, hi
+
+    def range(self, start: int, stop: int) -> list[RankKey]:
+        with self._lock:
+            return self._keys[max(0, start) : max(0, stop)]
+
+    def top_with_ties(self, limit: int) -> list[RankKey]:
+        with self._lock:
+            if limit <= 0 or not self._keys:
+                return []
+            if len(self._keys) <= limit:
+                return list(self._keys)
+            boundary_xp = self._keys[limit - 1][0]
+            stop = bisect.bisect_left(self._keys, (boundary_xp + 1,))
+            return self._keys[:stop]
+
+    def _discard(self, user_id: int) -> None:
+        key = self._by_user.pop(user_id, None)
+        if key is None:
+            return
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            del self._keys[idx]
+
+
+def key_xp(key: RankKey) -> int:
+    return -key[0]
+
+
+def key_last_earned(key: RankKey) -> datetime | None:
+    return None if key[1] == _NEVER else key[1]
+
+
+_registry_lock = threading.RLock()
+_indexes: dict[tuple[int, str], RankIndex] = {}
+_loaded_guilds: set[int] = set()
+_host_xp_mode = HOST_XP_COUNTERS
+
+
+def get_index(guild_id: int, ordering: str) -> RankIndex:
+    with _registry_lock:
+        if guild_id not in _loaded_guilds:
+            load_rank_indexes(guild_id)
+        return _indexes[(guild_id, ordering)]
+
+
+def load_rank_indexes(guild_id: int, host_xp_mode: str | None = None) -> None:
+    global _host_xp_mode
+    with _registry_lock:
+        if host_xp_mode is not None:
+            _host_xp_mode = host_xp_mode
+        monthly_rows, total_rows = host_board_rows(guild_id, _host_xp_mode)
+        season = RankIndex()
+        for row in fetch_rank_candidates(guild_id):
+            if not row["optout"]:
+                season.update(row["user_id"], row["season_xp"], _parse_time(row["last_earned_at"]))
+        lifetime = RankIndex()
+        for row in fetch_lifetime_candidates(guild_id):
+            if not row["optout"]:
+                lifetime.update(
+                    row["user_id"], row["lifetime_xp"], _parse_time(row["last_earned_at"])
+                )
+        host_monthly = RankIndex()
+        for row in monthly_rows:
+            host_monthly.update(
+                row["user_id"], row["monthly_xp"], _parse_time(row["last_earned_at"])
+            )
+        host_total = RankIndex()
+        for row in total_rows:
+            host_total.update(row["user_id"], row["total_xp"], _parse_time(row["last_earned_at"]))
+        _indexes[(guild_id, SEASON)] = season
+        _indexes[(guild_id, LIFETIME)] = lifetime
+        _indexes[(guild_id, HOST_MONTHLY)] = host_monthly
+        _indexes[(guild_id, HOST_TOTAL)] = host_total
+        _loaded_guilds.add(guild_id)
+
+
+def apply_user_xp(
+    guild_id: int,
+    updates: Iterable[tuple[int, int, int]],
+    last_earned_at: datetime,
+) -> None:
+    season = get_index(guild_id, SEASON)
+    lifetime = get_index(guild_id, LIFETIME)
+    for user_id, season_xp, lifetime_xp in updates:
+        season.update(user_id, season_xp, last_earned_at)
+        lifetime.update(user_id, lifetime_xp, last_earned_at)
+
+
+def apply_host_xp(
+    guild_id: int,
+    user_id: int,
+    monthly_xp: int,
+    total_xp: int,
+    last_earned_at: datetime,
+) -> None:
+    get_index(guild_id, HOST_MONTHLY).update(user_id, monthly_xp, last_earned_at)
+    get_index(guild_id, HOST_TOTAL).update(user_id, total_xp, last_earned_at)
+
+
+def apply_user_row(guild_id: int, row) -> None:
+    user_id = row["user_id"]
+    season = get_index(guild_id, SEASON)
+    lifetime = get_index(guild_id, LIFETIME)
+    if row["optout"]:
+        season.remove(user_id)
+        lifetime.remove(user_id)
+        return
+    last_earned_at = _parse_time(row["last_earned_at"])
+    season.update(user_id, row["season_xp"], last_earned_at)
+    lifetime.update(user_id, row["lifetime_xp"], last_earned_at)
+
+
+def reset_ordering(guild_id: int, ordering: str) -> None:
+    get_index(guild_id, ordering).clear()
+
+
+def _parse_time(value) -> datetime | None:
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
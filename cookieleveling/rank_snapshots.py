@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import logging
+import time
+import zlib
+from typing import Iterable
+
+from . import metrics
+from .db import compact_rank_snapshots, fetch_latest_rank_snapshots, insert_rank_snapshot
+from .host_ranker import compute_host_top
+from .rank_index import HOST_MONTHLY, HOST_TOTAL, LIFETIME, SEASON
+from .ranker import lifetime_range, season_range
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_DEPTH = 100
+MOVEMENT_NEW = "new"
+
+_FORMAT_VERSION = 1
+_COMPARE_SECONDS = 3600
+_HOURLY_RETENTION_SECONDS = 7 * 86400
+_DAILY_RETENTION_SECONDS = 400 * 86400
+_JST_OFFSET_SECONDS = 9 * 3600
+
+
+def encode_snapshot(entries: Iterable[tuple[int, int]]) -> bytes:
+    entries = list(entries)
+    out = bytearray()
+    _write_varint(out, _FORMAT_VERSION)
+    _write_varint(out, len(entries))
+    prev_user_id = 0
+    prev_xp = entries[0][1] if entries else 0
+    _write_varint(out, prev_xp)
+    for user_id, xp in entries:
+        _write_varint(out, _zigzag(user_id - prev_user_id))
+        _write_varint(out, _zigzag(prev_xp - xp))
+        prev_user_id = user_id
+        prev_xp = xp
+    return zlib.compress(bytes(out), 9)
+
+
+def decode_snapshot(payload: bytes) -> list[tuple[int, int]]:
+    data = zlib.decompress(payload)
+    pos = 0
+    version, pos = _read_varint(data, pos)
+    if version != _FORMAT_VERSION:
+        raise ValueError(f"unsupported rank snapshot format: {version}")
+    count, pos = _read_varint(data, pos)
+    prev_xp, pos = _read_varint(data, pos)
+    prev_user_id = 0
+    entries: list[tuple[int, int]] = []
+    for _ in range(count):
+        user_delta, pos = _read_varint(data, pos)
+        xp_delta, pos = _read_varint(data, pos)
+        prev_user_id += _unzigzag(user_delta)
+        prev_xp -= _unzigzag(xp_delta)
+        entries.append((prev_user_id, prev_xp))
+    return entries
+
+
+def capture_rank_snapshots(guild_id: int, captured_at: int) -> int:
+    boards = {
+        SEASON: [
+            (row["user_id"], row["season_xp"])
+            for row in season_range(guild_id, 0, SNAPSHOT_DEPTH)
+        ],
+        LIFETIME: [
+            (row["user_id"], row["lifetime_xp"])
+            for row in lifetime_range(guild_id, 0, SNAPSHOT_DEPTH)
+        ],
+        HOST_MONTHLY: [
+            (row["user_id"], row["monthly_xp"])
+            for row in compute_host_top(guild_id, HOST_MONTHLY, "monthly_xp", SNAPSHOT_DEPTH)
+        ],
+        HOST_TOTAL: [
+            (row["user_id"], row["total_xp"])
+            for row in compute_host_top(guild_id, HOST_TOTAL, "total_xp", SNAPSHOT_DEPTH)
+        ],
+    }
+    written = 0
+    for board, entries in boards.items():
+        payload = encode_snapshot(entries)
+        insert_rank_snapshot(guild_id, board, captured_at, payload)
+        written += len(payload)
+    metrics.set_gauge("snapshots.bytes_per_capture", written)
+    return written
+
+
+def previous_ranks(
+    guild_id: int, boards: Iterable[str], now: float | None = None
+) -> dict[str, dict[int, int]]:
+    now = time.time() if now is None else now
+    previous: dict[str, dict[int, int]] = {}
+    for row in fetch_latest_rank_snapshots(guild_id, boards, int(now) - _COMPARE_SECONDS):
+        try:
+            entries = decode_snapshot(row["payload"])
+        except (ValueError, zlib.error):
+            _LOGGER.warning("rank snapshot unreadable: board=%s", row["board"])
+            continue
+        previous[row["board"]] = {
+            user_id: rank for rank, (user_id, _) in enumerate(entries, start=1)
+        }
+    return previous
+
+
+def annotate_movement(
+    rows: list[dict], previous: dict[int, int] | None, *, start_rank: int = 1
+) -> None:
+    for rank, row in enumerate(rows, start=start_rank):
+        if previous is None:
+            row["movement"] = None
+            continue
+        previous_rank = previous.get(row["user_id"])
+        row["movement"] = MOVEMENT_NEW if previous_rank is None else previous_rank - rank
+
+
+def compact_snapshots(guild_id: int, now: float | None = None) -> int:
+    now = int(time.time() if now is None else now)
+    removed = compact_rank_snapshots(
+        guild_id,
+        hourly_before=now - _HOURLY_RETENTION_SECONDS,
+        expire_before=now - _DAILY_RETENTION_SECONDS,
+        day_offset=_JST_OFFSET_SECONDS,
+    )
+    if removed:
+        _LOGGER.info("rank snapshots compacted: removed=%s", removed)
+    return removed
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
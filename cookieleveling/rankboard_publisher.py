@@ -1,28 +1,82 @@
 from __future__ import annotations
 
-import io
 import logging
 import time
+from functools import partial
+from dataclasses import dataclass
 
-import aiohttp
 import discord
-from PIL import Image
 
+from .board_fingerprint import fingerprint_board
+from .board_messages import (
+    BOARD_LAYOUT_COMBINED,
+    BoardWebhook,
+    BoardWebhookLost,
+    board_webhook,
+    create_board_webhook,
+    delete_board_message,
+    edit_board_message,
+    resend_board,
+    retire_board_webhook,
+    send_board_message,
+)
+from .board_resolver import ResolvedUser, resolve_board_users
 from .config import Config
-from .db import fetch_guild_settings, upsert_guild_settings
-from .display_name_tokens import tokenize_display_name, truncate_tokens
-from .emoji_assets import resolve_emoji_tokens
+from .rank_index import SEASON, LIFETIME
+from .rank_snapshots import annotate_movement, previous_ranks
+from .db import (
+    fetch_guild_settings,
+    submit_db,
+    update_board_fingerprints,
+    upsert_guild_settings,
+)
 from .rankboard_renderer import RenderedRankboard, render_rankboard
 from .ranker import compute_lifetime_top20, compute_top20
 from .xp_engine import progress_for_xp
 
 _LOGGER = logging.getLogger(__name__)
-_AVATAR_CACHE_TTL_SECONDS = 3600
-_AVATAR_CACHE_MAX_SIZE = 256
-_AVATAR_CACHE: dict[str, tuple[float, Image.Image]] = {}
 
 
-async def update_rankboard(bot: discord.Client, config: Config) -> bool:
+@dataclass(frozen=True)
+class RankboardData:
+    season_rows: list[dict]
+    lifetime_rows: list[dict]
+
+    def user_ids(self) -> list[int]:
+        return [row["user_id"] for row in self.season_rows + self.lifetime_rows]
+
+    def composition(self) -> tuple:
+        return (
+            tuple(row["user_id"] for row in self.season_rows),
+            tuple(row["user_id"] for row in self.lifetime_rows),
+        )
+
+    def fingerprints(self, guild: discord.Guild) -> dict[str, str]:
+        return {
+            "season_fingerprint": fingerprint_board(guild, self.season_rows, "season_xp"),
+            "lifetime_fingerprint": fingerprint_board(guild, self.lifetime_rows, "lifetime_xp"),
+        }
+
+
+def load_rankboard_data(guild_id: int) -> RankboardData:
+    data = RankboardData(
+        season_rows=compute_top20(guild_id),
+        lifetime_rows=compute_lifetime_top20(guild_id),
+    )
+    previous = previous_ranks(guild_id, (SEASON, LIFETIME))
+    annotate_movement(data.season_rows, previous.get(SEASON))
+    annotate_movement(data.lifetime_rows, previous.get(LIFETIME))
+    return data
+
+
+async def update_rankboard(
+    bot: discord.Client,
+    config: Config,
+    data: RankboardData | None = None,
+    resolved: dict[int, ResolvedUser] | None = None,
+    timings: dict[str, float] | None = None,
+    fingerprints: dict[str, str] | None = None,
+) -> bool:
     settings = fetch_guild_settings(config.guild_id)
     if settings is None:
         _LOGGER.warning("rankboard not configured")
@@ -51,77 +105,151 @@ async def update_rankboard(bot: discord.Client, config: Config) -> bool:
         _LOGGER.warning("rankboard channel not found: %s", lifetime_channel_id)
         return False
 
-    try:
-        season_message = await season_channel.fetch_message(season_message_id)
-    except discord.NotFound:
-        _LOGGER.warning("rankboard message not found: %s", season_message_id)
-        return False
-
-    try:
-        lifetime_message = await lifetime_channel.fetch_message(lifetime_message_id)
-    except discord.NotFound:
-        _LOGGER.warning("rankboard message not found: %s", lifetime_message_id)
-        return False
+    webhook = board_webhook(settings, "rankboard")
+    publish_season = _needs_publish(settings, fingerprints, "season_fingerprint")
+    publish_lifetime = _needs_publish(settings, fingerprints, "lifetime_fingerprint")
+    combined = season_message_id == lifetime_message_id
+    if combined:
+        publish_season = publish_lifetime = publish_season or publish_lifetime
+    if not publish_season and not publish_lifetime:
+        return True
 
+    render_started = time.perf_counter()
     try:
-        files = await _render_files(bot, config)
+        files = await _render_files(bot, config, data, resolved)
     except Exception:
         _LOGGER.exception("rankboard render failed")
         return False
-
-    season_ok = False
-    lifetime_ok = False
+    upload_started = time.perf_counter()
+    if timings is not None:
+        timings["rankboard.render"] = upload_started - render_started
+
+    season_ok = not publish_season
+    lifetime_ok = not publish_lifetime
+    published: dict[str, str] = {}
+    webhook_lost = False
+    message_lost = False
     try:
-        try:
-            await season_message.edit(
-                content="",
-                embeds=[],
-                attachments=[files.season_file],
-            )
-            season_ok = True
-            _LOGGER.info("rankboard season updated")
-        except Exception:
-            _LOGGER.exception("rankboard season update failed")
-
-        try:
-            await lifetime_message.edit(
-                content="",
-                embeds=[],
-                attachments=[files.lifetime_file],
-            )
-            lifetime_ok = True
-            _LOGGER.info("rankboard lifetime updated")
-        except Exception:
-            _LOGGER.exception("rankboard lifetime update failed")
+        if combined:
+            try:
+                await edit_board_message(
+                    bot,
+                    season_channel,
+                    season_message_id,
+                    webhook=webhook,
+                    content="",
+                    embeds=[],
+                    attachments=[files.lifetime_file, files.season_file],
+                )
+                season_ok = lifetime_ok = True
+                if fingerprints is not None:
+                    published["season_fingerprint"] = fingerprints["season_fingerprint"]
+                    published["lifetime_fingerprint"] = fingerprints["lifetime_fingerprint"]
+                _LOGGER.info("rankboard updated")
+            except BoardWebhookLost:
+                webhook_lost = True
+            except discord.NotFound:
+                _LOGGER.warning("rankboard message not found: %s", season_message_id)
+                message_lost = webhook is not None
+            except Exception:
+                _LOGGER.exception("rankboard update failed")
+        else:
+            if publish_season:
+                try:
+                    await edit_board_message(
+                        bot,
+                        season_channel,
+                        season_message_id,
+                        webhook=webhook,
+                        content="",
+                        embeds=[],
+                        attachments=[files.season_file],
+                    )
+                    season_ok = True
+                    if fingerprints is not None:
+                        published["season_fingerprint"] = fingerprints["season_fingerprint"]
+                    _LOGGER.info("rankboard season updated")
+                except BoardWebhookLost:
+                    webhook_lost = True
+                except discord.NotFound:
+                    _LOGGER.warning("rankboard message not found: %s", season_message_id)
+                    message_lost = webhook is not None
+                except Exception:
+                    _LOGGER.exception("rankboard season update failed")
+
+            if publish_lifetime:
+                try:
+                    await edit_board_message(
+                        bot,
+                        lifetime_channel,
+                        lifetime_message_id,
+                        webhook=webhook,
+                        content="",
+                        embeds=[],
+                        attachments=[files.lifetime_file],
+                    )
+                    lifetime_ok = True
+                    if fingerprints is not None:
+                        published["lifetime_fingerprint"] = fingerprints["lifetime_fingerprint"]
+                    _LOGGER.info("rankboard lifetime updated")
+                except BoardWebhookLost:
+                    webhook_lost = True
+                except discord.NotFound:
+                    _LOGGER.warning("rankboard message not found: %s", lifetime_message_id)
+                    message_lost = webhook is not None
+                except Exception:
+                    _LOGGER.exception("rankboard lifetime update failed")
     finally:
         files.cleanup()
+        if timings is not None:
+            timings["rankboard.upload"] = time.perf_counter() - upload_started
+    await submit_db(update_board_fingerprints, config.guild_id, published)
+    if webhook_lost or message_lost:
+        return await resend_board(
+            bot,
+            config,
+            season_channel,
+            settings,
+            prefix="rankboard",
+            columns=("lifetime", "season"),
+            send=lambda hook: send_rankboard_messages(bot, config, season_channel, hook),
+            store=upsert_guild_settings,
+            webhook=None if webhook_lost else webhook,
+            fingerprints=fingerprints,
+        )
 
     return season_ok and lifetime_ok
 
 
 async def send_rankboard_messages(
-    bot: discord.Client, config: Config, channel: discord.TextChannel
-) -> tuple[discord.Message, discord.Message]:
-    lifetime_message: discord.Message | None = None
+    bot: discord.Client,
+    config: Config,
+    channel: discord.TextChannel,
+    webhook: BoardWebhook | None = None,
+) -> tuple[int, int]:
+    lifetime_message_id: int | None = None
     try:
         files = await _render_files(bot, config)
         try:
-            lifetime_message = await channel.send(
-                content="",
-                files=[files.lifetime_file],
+            if config.board_layout == BOARD_LAYOUT_COMBINED:
+                message_id = await send_board_message(
+                    bot, channel, [files.lifetime_file, files.season_file], webhook
+                )
+                return message_id, message_id
+            lifetime_message_id = await send_board_message(
+                bot, channel, [files.lifetime_file], webhook
             )
-            season_message = await channel.send(
-                content="",
-                files=[files.season_file],
+            season_message_id = await send_board_message(
+                bot, channel, [files.season_file], webhook
             )
-            return lifetime_message, season_message
+            return lifetime_message_id, season_message_id
         finally:
             files.cleanup()
     except Exception:
         _LOGGER.exception("rankboard send failed: channel_id=%s", channel.id)
-        if lifetime_message is not None:
+        if lifetime_message_id is not None:
             try:
-                await lifetime_message.delete()
+                await delete_board_message(bot, channel, lifetime_message_id, webhook)
             except Exception:
                 _LOGGER.warning("failed to delete lifetime rankboard message")
         raise
@@ -135,6 +263,7 @@ async def set_rankboard(
         return False, "このチャンネルでは設置できません。"
 
     settings = fetch_guild_settings(config.guild_id)
+    old_webhook = board_webhook(settings, "rankboard")
     if settings:
         if settings["season_channel_id"] and settings["season_message_id"]:
             await _mark_rankboard_moved(
@@ -142,43 +271,79 @@ async def set_rankboard(
                 settings["season_channel_id"],
                 settings["season_message_id"],
                 target_channel.id,
+                old_webhook,
             )
-        if settings["lifetime_channel_id"] and settings["lifetime_message_id"]:
+        if (
+            settings["lifetime_channel_id"]
+            and settings["lifetime_message_id"]
+            and settings["lifetime_message_id"] != settings["season_message_id"]
+        ):
             await _mark_rankboard_moved(
                 bot,
                 settings["lifetime_channel_id"],
                 settings["lifetime_message_id"],
                 target_channel.id,
+                old_webhook,
             )
 
+    webhook = await create_board_webhook(config, target_channel)
     try:
-        lifetime_message, season_message = await send_rankboard_messages(
-            bot, config, target_channel
+        lifetime_message_id, season_message_id = await send_rankboard_messages(
+            bot, config, target_channel, webhook
         )
     except Exception:
+        await retire_board_webhook(bot, webhook)
         return False, "設置に失敗しました。"
-    upsert_guild_settings(
-        config.guild_id,
-        season_channel_id=target_channel.id,
-        season_message_id=season_message.id,
-        lifetime_channel_id=target_channel.id,
-        lifetime_message_id=lifetime_message.id,
+    await retire_board_webhook(bot, old_webhook)
+    await submit_db(
+        partial(
+            upsert_guild_settings,
+            config.guild_id,
+            season_channel_id=target_channel.id,
+            season_message_id=season_message_id,
+            lifetime_channel_id=target_channel.id,
+            lifetime_message_id=lifetime_message_id,
+            rankboard_webhook_id=webhook.webhook_id if webhook else None,
+            rankboard_webhook_token=webhook.token if webhook else None,
+        )
     )
     return True, f"<#{target_channel.id}> に設置しました。"
 
 
-async def _render_files(bot: discord.Client, config: Config) -> RenderedRankboard:
+async def _render_files(
+    bot: discord.Client,
+    config: Config,
+    data: RankboardData | None = None,
+    resolved: dict[int, ResolvedUser] | None = None,
+) -> RenderedRankboard:
     guild = bot.get_guild(config.guild_id)
     if guild is None:
         raise RuntimeError("rankboardの描画に必要なGuildが見つかりません。")
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=10)
-    ) as session:
-        season_entries = await _prepare_season_entries(guild, session)
-        lifetime_entries = await _prepare_lifetime_entries(guild, session)
+    if data is None:
+        data = load_rankboard_data(guild.id)
+    missing = [user_id for user_id in data.user_ids() if user_id not in (resolved or {})]
+    if missing:
+        resolved = await resolve_board_users(
+            guild,
+            missing,
+            bot.asset_session,
+            concurrency=config.board_resolve_concurrency,
+            timeout=config.board_lookup_timeout_seconds,
+            known=resolved,
+        )
+    season_entries = build_season_entries(data.season_rows, resolved or {})
+    lifetime_entries = build_lifetime_entries(data.lifetime_rows, resolved or {})
     return await render_rankboard(season_entries, lifetime_entries)
 
 
+def _needs_publish(
+    settings, fingerprints: dict[str, str] | None, column: str
+) -> bool:
+    if fingerprints is None:
+        return True
+    return settings[column] != fingerprints[column]
+
+
 def _normalize_rankboard_channel(
     channel: discord.abc.GuildChannel,
 ) -> discord.TextChannel | None:
@@ -190,150 +355,69 @@ def _normalize_rankboard_channel(
 
 
 async def _mark_rankboard_moved(
-    bot: discord.Client, channel_id: int, message_id: int, new_channel_id: int
+    bot: discord.Client,
+    channel_id: int,
+    message_id: int,
+    new_channel_id: int,
+    webhook: BoardWebhook | None,
 ) -> None:
     channel = bot.get_channel(channel_id)
     if channel is None or not isinstance(channel, discord.TextChannel):
         return
     try:
-        message = await channel.fetch_message(message_id)
-    except discord.NotFound:
+        await edit_board_message(
+            bot,
+            channel,
+            message_id,
+            webhook=webhook,
+            route="board.notice",
+            content=f"移動しました: <#{new_channel_id}>",
+            embeds=[],
+            attachments=[],
+        )
+    except (discord.NotFound, BoardWebhookLost):
         return
-    await message.edit(
-        content=f"移動しました: <#{new_channel_id}>",
-        embeds=[],
-        attachments=[],
-    )
 
 
-async def _prepare_season_entries(
-    guild: discord.Guild, session: aiohttp.ClientSession
+def build_season_entries(
+    rows: list[dict], resolved: dict[int, ResolvedUser]
 ) -> list[dict]:
     entries: list[dict] = []
-    for row in compute_top20(guild.id):
-        user_id = row["user_id"]
-        member = await _resolve_member(guild, user_id)
-        name_tokens = await _prepare_name_tokens(member, user_id, session)
+    for row in rows:
+        user = resolved[row["user_id"]]
         level, _, _, progress = progress_for_xp(row["season_xp"])
         entries.append(
             {
-                "user_id": user_id,
-                "name": member.display_name if member else None,
-                "name_tokens": name_tokens,
+                "user_id": user.user_id,
+                "name": user.display_name,
+                "name_tokens": user.name_tokens,
                 "season_xp": row["season_xp"],
                 "level": level,
                 "xp_progress": progress,
-                "avatar": await _fetch_avatar(member, session),
+                "avatar": user.avatar,
+                "movement": row.get("movement"),
             }
         )
     return entries
 
 
-async def _prepare_lifetime_entries(
-    guild: discord.Guild, session: aiohttp.ClientSession
+def build_lifetime_entries(
+    rows: list[dict], resolved: dict[int, ResolvedUser]
 ) -> list[dict]:
     entries: list[dict] = []
-    for row in compute_lifetime_top20(guild.id):
-        user_id = row["user_id"]
-        member = await _resolve_member(guild, user_id)
-        name_tokens = await _prepare_name_tokens(member, user_id, session)
+    for row in rows:
+        user = resolved[row["user_id"]]
         level, _, _, progress = progress_for_xp(row["lifetime_xp"])
         entries.append(
             {
-                "user_id": user_id,
-                "name": member.display_name if member else None,
-                "name_tokens": name_tokens,
+                "user_id": user.user_id,
+                "name": user.display_name,
+                "name_tokens": user.name_tokens,
                 "level": level,
                 "lifetime_xp": row["lifetime_xp"],
                 "xp_progress": progress,
-                "avatar": await _fetch_avatar(member, session),
+                "avatar": user.avatar,
+                "movement": row.get("movement"),
             }
         )
     return entries
-
-
-async def _resolve_member(
-    guild: discord.Guild, user_id: int
-) -> discord.Member | None:
-    member = guild.get_member(user_id)
-    if member is not None:
-        return member
-    try:
-        return await guild.fetch_member(user_id)
-    except Exception:
-        _LOGGER.exception("member fetch failed: user_id=%s", user_id)
-        return None
-
-
-async def _prepare_name_tokens(
-    member: discord.Member | None,
-    user_id: int,
-    session: aiohttp.ClientSession,
-) -> list:
-    name = member.display_name if member else str(user_id)
-    tokens = tokenize_display_name(name)
-    tokens = truncate_tokens(tokens, max_chars=16)
-    await resolve_emoji_tokens(tokens, session)
-    return tokens
-
-
-async def _fetch_avatar(
-    member: discord.Member | None, session: aiohttp.ClientSession
-) -> Image.Image | None:
-    if member is None:
-        return None
-    url = str(member.display_avatar.url)
-    cached = _get_cached_avatar(url)
-    if cached is not None:
-        return cached
-    try:
-        async with session.get(url) as response:
-            if response.status != 200:
-                _LOGGER.warning(
-                    "avatar download failed: user_id=%s status=%s",
-                    member.id,
-                    response.status,
-                )
-                return None
-            data = await response.read()
-    except Exception:
-        _LOGGER.exception("avatar download failed: user_id=%s", member.id)
-        return None
-    try:
-        image = Image.open(io.BytesIO(data)).convert("RGB")
-    except Exception:
-        _LOGGER.exception("avatar decode failed: user_id=%s", member.id)
-        return None
-    _store_cached_avatar(url, image)
-    return image.copy()
-
-
-def _get_cached_avatar(url: str) -> Image.Image | None:
-    now = time.monotonic()
-    cached = _AVATAR_CACHE.get(url)
-    if cached is None:
-        return None
-    cached_at, image = cached
-    if now - cached_at > _AVATAR_CACHE_TTL_SECONDS:
-        _AVATAR_CACHE.pop(url, None)
-        return None
-    return image.copy()
-
-
-def _store_cached_avatar(url: str, image: Image.Image) -> None:
-    now = time.monotonic()
-    _prune_avatar_cache(now)
-    if len(_AVATAR_CACHE) >= _AVATAR_CACHE_MAX_SIZE:
-        oldest_url = min(_AVATAR_CACHE.items(), key=lambda item: item[1][0])[0]
-        _AVATAR_CACHE.pop(oldest_url, None)
-    _AVATAR_CACHE[url] = (now, image)
-
-
-def _prune_avatar_cache(now: float) -> None:
-    expired = [
-        url
-        for url, (cached_at, _) in _AVATAR_CACHE.items()
-        if now - cached_at > _AVATAR_CACHE_TTL_SECONDS
-    ]
-    for url in expired:
-        _AVATAR_CACHE.pop(url, None)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import os
 import tempfile
 from dataclasses import dataclass
@@ -32,18 +34,22 @@ async def render_rankboard(
     season_path = _make_temp_path("season_board")
     lifetime_path = _make_temp_path("lifetime_board")
 
-    render_rankboard_image(
-        season_entries,
-        season_path,
-        title="月間 通話ランキングTOP20",
-    )
-    render_rankboard_image(
-        lifetime_entries,
-        lifetime_path,
-        title="累計 通話ランキングTOP20",
-        background=_LIFETIME_BACKGROUND,
-        header_fill=_LIFETIME_BACKGROUND,
-        xp_bar_fill=_LIFETIME_XP_BAR_FILL,
+    await asyncio.gather(
+        asyncio.to_thread(
+            render_rankboard_image,
+            season_entries,
+            season_path,
+            title="月間 通話ランキングTOP20",
+        ),
+        asyncio.to_thread(
+            render_rankboard_image,
+            lifetime_entries,
+            lifetime_path,
+            title="累計 通話ランキングTOP20",
+            background=_LIFETIME_BACKGROUND,
+            header_fill=_LIFETIME_BACKGROUND,
+            xp_bar_fill=_LIFETIME_XP_BAR_FILL,
+        ),
     )
 
     return RenderedRankboard(
@@ -53,6 +59,37 @@ async def render_rankboard(
     )
 
 
+def render_leaderboard_page(
+    entries: list[dict], *, lifetime: bool, start_rank: int, end_rank: int
+) -> bytes:
+    label = "累計" if lifetime else "月間"
+    return render_board_png(
+        entries,
+        title=f"{label} 通話ランキング {start_rank}〜{end_rank}位",
+        lifetime=lifetime,
+        start_rank=start_rank,
+    )
+
+
+def render_board_png(
+    entries: list[dict], *, title: str, lifetime: bool = False, start_rank: int = 1
+) -> bytes:
+    output = io.BytesIO()
+    style = (
+        {
+            "background": _LIFETIME_BACKGROUND,
+            "header_fill": _LIFETIME_BACKGROUND,
+            "xp_bar_fill": _LIFETIME_XP_BAR_FILL,
+        }
+        if lifetime
+        else {}
+    )
+    render_rankboard_image(
+        entries, output, title=title, start_rank=start_rank, **style
+    )
+    return output.getvalue()
+
+
 def _make_temp_path(prefix: str) -> str:
     path = os.path.join(tempfile.gettempdir(), f"cookieleveling_{prefix}.png")
     return path
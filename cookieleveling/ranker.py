@@ -1,24 +1,191 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from .db import fetch_lifetime_candidates, fetch_rank_candidates
+from .db import fetch_season_voice_ties
+from .rank_index import (
+    LIFETIME,
+    SEASON,
+    RankIndex,
+    RankKey,
+    get_index,
+    key_last_earned,
+    key_xp,
+)
 
 
 def compute_top20(guild_id: int) -> list[dict]:
-    now = datetime.now(timezone.utc)
-    candidates = [
-        _rank_entry(row, now) for row in fetch_rank_candidates(guild_id) if not row["optout"]
-    ]
-    candidates.sort(key=_sort_key)
-    return candidates[:20]
+    return compute_season_top(guild_id, 20)
 
 
 def compute_lifetime_top20(guild_id: int) -> list[dict]:
-    candidates = [
-        _lifetime_entry(row) for row in fetch_lifetime_candidates(guild_id) if not row["optout"]
+    return compute_lifetime_top(guild_id, 20)
+
+
+def compute_season_top(guild_id: int, limit: int) -> list[dict]:
+    return season_range(guild_id, 0, limit)
+
+
+def compute_lifetime_top(guild_id: int, limit: int) -> list[dict]:
+    return lifetime_range(guild_id, 0, limit)
+
+
+def season_range(guild_id: int, start: int, stop: int) -> list[dict]:
+    index = get_index(guild_id, SEASON)
+    entries: list[dict] = []
+    position = max(0, start)
+    while position < stop:
+        keys = index.range(position, position + 1)
+        if not keys:
+            break
+        xp = key_xp(keys[0])
+        lo, hi = index.tie_range(xp)
+        end = min(stop, hi)
+        entries.extend(_tie_window(guild_id, index, xp, lo, hi, position - lo, end - lo))
+        position = end
+    return entries
+
+
+def lifetime_range(guild_id: int, start: int, stop: int) -> list[dict]:
+    keys = get_index(guild_id, LIFETIME).range(start, stop)
+    return [_lifetime_key_entry(key) for key in keys]
+
+
+def season_rank(guild_id: int, user_id: int) -> int | None:
+    index = get_index(guild_id, SEASON)
+    xp = index.xp_of(user_id)
+    rank = index.rank_of(user_id)
+    if xp <= 0 or rank is None:
+        return None
+    lo, hi = index.tie_range(xp)
+    if hi - lo <= 1:
+        return rank
+    active = _active_ties(guild_id, index, xp)
+    for offset, entry in enumerate(active):
+        if entry["user_id"] == user_id:
+            return lo + offset + 1
+    return rank + sum(
+        1 for entry in active if (index.rank_of(entry["user_id"]) or 0) > rank
+    )
+
+
+def lifetime_rank(guild_id: int, user_id: int) -> int | None:
+    return get_index(guild_id, LIFETIME).rank_of(user_id)
+
+
+def season_position(guild_id: int, user_id: int) -> dict | None:
+    rank = season_rank(guild_id, user_id)
+    if rank is None:
+        return None
+    start = max(0, rank - 2)
+    window = season_range(guild_id, start, rank + 1)
+    return _position(rank, start, window, len(get_index(guild_id, SEASON)), "season_xp")
+
+
+def lifetime_position(guild_id: int, user_id: int) -> dict | None:
+    rank = lifetime_rank(guild_id, user_id)
+    if rank is None:
+        return None
+    start = max(0, rank - 2)
+    window = lifetime_range(guild_id, start, rank + 1)
+    return _position(
+        rank, start, window, len(get_index(guild_id, LIFETIME)), "lifetime_xp"
+    )
+
+
+def _position(
+    rank: int, start: int, window: list[dict], total: int, xp_field: str
+) -> dict:
+    offset = rank - 1 - start
+    above = window[offset - 1] if offset > 0 else None
+    below = window[offset + 1] if offset + 1 < len(window) else None
+    xp = window[offset][xp_field] if offset < len(window) else 0
+    return {
+        "rank": rank,
+        "total": total,
+        "above": _neighbor(above, xp, xp_field),
+        "below": _neighbor(below, xp, xp_field),
+    }
+
+
+def _neighbor(entry: dict | None, xp: int, xp_field: str) -> dict | None:
+    if entry is None:
+        return None
+    return {"user_id": entry["user_id"], "xp_gap": entry[xp_field] - xp}
+
+
+def rank_season_rows(rows, now: datetime, limit: int) -> list[dict]:
+    entries = [_rank_entry(row, now) for row in rows]
+    entries.sort(key=_sort_key)
+    return entries[:limit]
+
+
+def rank_static_rows(rows, xp_field: str, limit: int) -> list[dict]:
+    entries = [
+        {
+            "user_id": row["user_id"],
+            xp_field: row[xp_field],
+            "last_earned_at": _parse_time(row["last_earned_at"]),
+        }
+        for row in rows
     ]
-    candidates.sort(key=_lifetime_sort_key)
-    return candidates[:20]
+    never = datetime.max.replace(tzinfo=timezone.utc)
+    entries.sort(
+        key=lambda entry: (
+            -entry[xp_field],
+            entry["last_earned_at"] or never,
+            entry["user_id"],
+        )
+    )
+    return entries[:limit]
+
+
+def _tie_window(
+    guild_id: int, index: RankIndex, xp: int, lo: int, hi: int, start: int, stop: int
+) -> list[dict]:
+    if hi - lo <= 1:
+        return [_season_key_entry(key) for key in index.range(lo + start, lo + stop)]
+    active = _active_ties(guild_id, index, xp)
+    window = active[start:stop]
+    needed = stop - start - len(window)
+    if needed <= 0:
+        return window
+    skip = max(0, start - len(active))
+    active_ids = {entry["user_id"] for entry in active}
+    before = sum(
+        1 for user_id in active_ids if (index.rank_of(user_id) or hi) - 1 < lo + skip
+    )
+    keys = index.range(lo + skip, min(hi, lo + skip + before + needed + len(active)))
+    idle = [key for key in keys if key[2] not in active_ids][before : before + needed]
+    return window + [_season_key_entry(key) for key in idle]
+
+
+def _active_ties(guild_id: int, index: RankIndex, xp: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    entries = [
+        _rank_entry(row, now)
+        for row in fetch_season_voice_ties(guild_id, xp)
+        if index.xp_of(row["user_id"]) == xp
+    ]
+    active = [entry for entry in entries if entry["active_seconds"] > 0]
+    active.sort(key=_sort_key)
+    return active
+
+
+def _season_key_entry(key: RankKey) -> dict:
+    return {
+        "user_id": key[2],
+        "season_xp": key_xp(key),
+        "active_seconds": 0,
+        "last_earned_at": key_last_earned(key),
+    }
+
+
+def _lifetime_key_entry(key: RankKey) -> dict:
+    return {
+        "user_id": key[2],
+        "lifetime_xp": key_xp(key),
+        "last_earned_at": key_last_earned(key),
+    }
 
 
 def _rank_entry(row, now: datetime) -> dict:
@@ -46,20 +213,6 @@ def _sort_key(entry: dict) -> tuple:
     )
 
 
-def _lifetime_entry(row) -> dict:
-    last_earned_at = _parse_time(row["last_earned_at"])
-    return {
-        "user_id": row["user_id"],
-        "lifetime_xp": row["lifetime_xp"],
-        "last_earned_at": last_earned_at,
-    }
-
-
-def _lifetime_sort_key(entry: dict) -> tuple:
-    last_earned = entry["last_earned_at"] or datetime.max.replace(tzinfo=timezone.utc)
-    return (-entry["lifetime_xp"], last_earned, entry["user_id"])
-
-
 def _parse_time(value) -> datetime | None:
     if not value:
         return None
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from .config import Config
+
+RANKBOARD = "rankboard"
+HOSTBOARD = "hostboard"
+BOARD_GROUPS = (RANKBOARD, HOSTBOARD)
+
+_BUDGET_WINDOW_SECONDS = 3600.0
+
+
+@dataclass
+class _GroupState:
+    published_at: float | None = None
+    composition: tuple = ()
+    top_user_ids: frozenset[int] = field(default_factory=frozenset)
+    xp_delta: int = 0
+    dirty: bool = False
+
+
+_states: dict[str, _GroupState] = {group: _GroupState() for group in BOARD_GROUPS}
+_budget_tokens: float | None = None
+_budget_updated_at = 0.0
+
+
+def observe_tick(earned_user_ids: Iterable[int], host_grants: dict[int, int]) -> None:
+    earned = list(earned_user_ids)
+    rankboard = _states[RANKBOARD]
+    if earned:
+        rankboard.dirty = True
+        rankboard.xp_delta += sum(
+            1 for user_id in earned if user_id in rankboard.top_user_ids
+        )
+    hostboard = _states[HOSTBOARD]
+    if host_grants:
+        hostboard.dirty = True
+        hostboard.xp_delta += sum(
+            amount
+            for user_id, amount in host_grants.items()
+            if user_id in hostboard.top_user_ids
+        )
+
+
+def candidate_groups(config: Config, now: float | None = None) -> list[str]:
+    now = time.time() if now is None else now
+    if _available_budget(config, now) < 1.0:
+        return []
+    groups: list[str] = []
+    for group, state in _states.items():
+        if state.published_at is None or not state.dirty:
+            continue
+        if now - state.published_at < config.board_min_refresh_seconds:
+            continue
+        groups.append(group)
+    return groups
+
+
+def is_meaningful(group: str, composition: tuple, config: Config) -> bool:
+    state = _states[group]
+    state.dirty = False
+    if composition != state.composition:
+        return True
+    return state.xp_delta >= config.board_refresh_xp_threshold
+
+
+def mark_published(
+    group: str,
+    composition: tuple,
+    user_ids: Iterable[int],
+    config: Config,
+    *,
+    adaptive: bool = False,
+) -> None:
+    global _budget_tokens
+    now = time.time()
+    state = _states[group]
+    state.published_at = now
+    state.composition = composition
+    state.top_user_ids = frozenset(user_ids)
+    state.xp_delta = 0
+    state.dirty = False
+    if adaptive:
+        _budget_tokens = max(0.0, _available_budget(config, now) - 1.0)
+
+
+def _available_budget(config: Config, now: float) -> float:
+    global _budget_tokens, _budget_updated_at
+    capacity = float(config.board_refresh_budget_per_hour)
+    if _budget_tokens is None:
+        _budget_tokens = capacity
+    else:
+        refill = (now - _budget_updated_at) * capacity / _BUDGET_WINDOW_SECONDS
+        _budget_tokens = min(capacity, _budget_tokens + refill)
+    _budget_updated_at = now
+    return _budget_tokens
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, Optional
 
 import discord
 
@@ -7,12 +10,20 @@ from .xp_engine import level_from_xp
 
 _LOGGER = logging.getLogger(__name__)
 
+_MEMBER_QUERY_BATCH = 100
+
 _ROLE_LV1 = 1451925109248884786
 _ROLE_LV20 = 1451924268144394385
 _ROLE_LV40 = 1451924729475764394
 _ROLE_LV80 = 1451906366024188014
 
 _ROLE_IDS = (_ROLE_LV1, _ROLE_LV20, _ROLE_LV40, _ROLE_LV80)
+_ROLE_LABELS = {
+    _ROLE_LV1: "Lv1",
+    _ROLE_LV20: "Lv20",
+    _ROLE_LV40: "Lv40",
+    _ROLE_LV80: "Lv80",
+}
 
 
 def _target_role_id(level: int) -> int:
@@ -25,7 +36,7 @@ def _target_role_id(level: int) -> int:
     return _ROLE_LV1
 
 
-async def apply_lifetime_role(
+async def edit_lifetime_role(
     guild: discord.Guild, member: discord.Member, level: int
 ) -> bool:
     if member.bot:
@@ -44,44 +55,90 @@ async def apply_lifetime_role(
 
     new_roles = [role for role in member.roles if role.id not in _ROLE_IDS]
     new_roles.append(target_role)
-    try:
-        await member.edit(roles=new_roles, reason="CookieLeveling lifetime role update")
-    except (discord.Forbidden, discord.HTTPException):
-        _LOGGER.warning(
-            "lifetime role update failed: user_id=%s target_role_id=%s",
-            member.id,
-            target_role_id,
-        )
-        return False
+    await member.edit(roles=new_roles, reason="CookieLeveling lifetime role update")
     return True
 
 
-async def apply_lifetime_roles_for_levels(
-    guild: discord.Guild, levels: dict[int, int]
+async def sync_lifetime_roles(
+    guild: discord.Guild,
+    enqueue: Callable[[dict[int, int]], Awaitable[None]],
+    *,
+    dry_run: bool = False,
+    checkpoint: Optional[Callable[[], Awaitable[None]]] = None,
 ) -> int:
-    updated = 0
+    levels = {
+        row["user_id"]: level_from_xp(int(row["lifetime_xp"]))
+        for row in fetch_lifetime_users(guild.id)
+    }
+    members = await _load_members(guild, levels.keys(), checkpoint)
+    changes = plan_lifetime_roles(members, levels)
+    tiers = Counter(_ROLE_LABELS[_target_role_id(level)] for level in changes.values())
+    _LOGGER.info(
+        "lifetime role sync%s: %s edits for %s members (%s)",
+        " dry run" if dry_run else "",
+        len(changes),
+        len(members),
+        " ".join(f"{label}={tiers[label]}" for label in _ROLE_LABELS.values()),
+    )
+    if changes and not dry_run:
+        await enqueue(changes)
+    return len(changes)
+
+
+def plan_lifetime_roles(
+    members: dict[int, discord.Member], levels: dict[int, int]
+) -> dict[int, int]:
+    changes: dict[int, int] = {}
     for user_id, level in levels.items():
+        member = members.get(user_id)
+        if member is None or member.bot:
+            continue
+        held = {role.id for role in member.roles}.intersection(_ROLE_IDS)
+        if held != {_target_role_id(level)}:
+            changes[user_id] = level
+    return changes
+
+
+async def _load_members(
+    guild: discord.Guild,
+    user_ids: Iterable[int],
+    checkpoint: Optional[Callable[[], Awaitable[None]]],
+) -> dict[int, discord.Member]:
+    members: dict[int, discord.Member] = {}
+    missing: list[int] = []
+    for user_id in user_ids:
         member = guild.get_member(user_id)
         if member is None:
-            try:
-                member = await guild.fetch_member(user_id)
-            except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                continue
-        if await apply_lifetime_role(guild, member, level):
-            updated += 1
-    return updated
-
-
-async def sync_lifetime_roles(guild: discord.Guild) -> int:
-    updated = 0
-    for row in fetch_lifetime_users(guild.id):
-        level = level_from_xp(int(row["lifetime_xp"]))
-        member = guild.get_member(row["user_id"])
-        if member is None:
-            try:
-                member = await guild.fetch_member(row["user_id"])
-            except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                continue
-        if await apply_lifetime_role(guild, member, level):
-            updated += 1
-    return updated
+            missing.append(user_id)
+        else:
+            members[user_id] = member
+    for start in range(0, len(missing), _MEMBER_QUERY_BATCH):
+        batch = missing[start : start + _MEMBER_QUERY_BATCH]
+        if checkpoint is not None:
+            await checkpoint()
+        try:
+            found = await guild.query_members(user_ids=batch, limit=len(batch))
+        except (asyncio.TimeoutError, discord.ClientException):
+            _LOGGER.info(
+                "member query failed; fetching %s members one by one", len(batch)
+            )
+            found = await _fetch_members(guild, batch, checkpoint)
+        for member in found:
+            members[member.id] = member
+    return members
+
+
+async def _fetch_members(
+    guild: discord.Guild,
+    user_ids: list[int],
+    checkpoint: Optional[Callable[[], Awaitable[None]]],
+) -> list[discord.Member]:
+    members: list[discord.Member] = []
+    for user_id in user_ids:
+        if checkpoint is not None:
+            await checkpoint()
+        try:
+            members.append(await guild.fetch_member(user_id))
+        except discord.HTTPException:
+            continue
+    return members
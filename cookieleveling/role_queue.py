@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import discord
+
+from . import metrics
+from .db import (
+    complete_role_edit,
+    defer_role_edit,
+    enqueue_role_edits,
+    fetch_due_role_edits,
+    fetch_role_queue_state,
+    submit_db,
+)
+from .role_assigner import edit_lifetime_role
+from .write_scheduler import PRIORITY_ROLE, outbound_writes, retry_after
+
+_LOGGER = logging.getLogger(__name__)
+
+_BATCH_SIZE = 20
+_EDIT_INTERVAL_SECONDS = 1.0
+_RETRY_BASE_SECONDS = 5.0
+_RETRY_MAX_SECONDS = 600.0
+_IDLE_POLL_SECONDS = 60.0
+_MAX_ATTEMPTS = 8
+
+
+class RoleEditQueue:
+    def __init__(self, guild_id: int) -> None:
+        self._guild_id = guild_id
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._paused_until = 0.0
+
+    async def enqueue(self, levels: dict[int, int]) -> None:
+        if not levels:
+            return
+        await submit_db(enqueue_role_edits, self._guild_id, levels, time.time())
+        self.wake()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self, bot: discord.Client) -> None:
+        if self._task is None:
+            self._task = bot.loop.create_task(self._run(bot))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, bot: discord.Client) -> None:
+        await bot.wait_until_ready()
+        while True:
+            self._wake.clear()
+            try:
+                if await self._drain(bot):
+                    continue
+                timeout = self._idle_timeout()
+            except Exception:
+                _LOGGER.exception("role edit queue pass failed")
+                timeout = _RETRY_BASE_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _idle_timeout(self) -> float:
+        depth, next_attempt_at = fetch_role_queue_state(self._guild_id)
+        metrics.set_gauge("roles.queue_depth", depth)
+        if next_attempt_at is None:
+            return _IDLE_POLL_SECONDS
+        return min(
+            max(next_attempt_at, self._paused_until) - time.time(), _IDLE_POLL_SECONDS
+        )
+
+    async def _drain(self, bot: discord.Client) -> int:
+        guild = bot.get_guild(self._guild_id)
+        if guild is None:
+            return 0
+        now = time.time()
+        if now < self._paused_until:
+            await asyncio.sleep(self._paused_until - now)
+        entries = fetch_due_role_edits(self._guild_id, time.time(), _BATCH_SIZE)
+        for entry in entries:
+            await self._process(guild, entry)
+            await asyncio.sleep(max(_EDIT_INTERVAL_SECONDS, self._paused_until - time.time()))
+        return len(entries)
+
+    async def _process(self, guild: discord.Guild, entry) -> None:
+        user_id = entry["user_id"]
+        level = entry["level"]
+        started = time.perf_counter()
+        try:
+            member = guild.get_member(user_id) or await guild.fetch_member(user_id)
+            with metrics.timed("roles.edit"):
+                changed = await outbound_writes.submit(
+                    "role.edit",
+                    lambda: edit_lifetime_role(guild, member, level),
+                    priority=PRIORITY_ROLE,
+                    key=("member", user_id),
+                )
+        except (discord.NotFound, discord.Forbidden) as exc:
+            _LOGGER.warning(
+                "lifetime role update dropped: user_id=%s level=%s (%s)",
+                user_id,
+                level,
+                exc.status,
+            )
+            metrics.increment("roles.dropped")
+            await submit_db(complete_role_edit, self._guild_id, user_id, level)
+            return
+        except discord.HTTPException as exc:
+            await self._retry(entry, exc)
+            return
+        await submit_db(complete_role_edit, self._guild_id, user_id, level)
+        metrics.increment("roles.edited" if changed else "roles.unchanged")
+        metrics.observe("roles.edit_latency", time.time() - entry["enqueued_at"])
+        _LOGGER.debug(
+            "lifetime role processed: user_id=%s level=%s changed=%s %.3fs",
+            user_id,
+            level,
+            changed,
+            time.perf_counter() - started,
+        )
+
+    async def _retry(self, entry, exc: discord.HTTPException) -> None:
+        user_id = entry["user_id"]
+        level = entry["level"]
+        attempts = entry["attempts"] + 1
+        if attempts >= _MAX_ATTEMPTS:
+            _LOGGER.warning(
+                "lifetime role update gave up: user_id=%s level=%s attempts=%s",
+                user_id,
+                level,
+                attempts,
+            )
+            metrics.increment("roles.dropped")
+            await submit_db(complete_role_edit, self._guild_id, user_id, level)
+            return
+        delay = retry_after(exc, _RETRY_BASE_SECONDS)
+        if delay is not None:
+            self._paused_until = time.time() + delay
+            metrics.increment("roles.rate_limited")
+        else:
+            delay = min(_RETRY_BASE_SECONDS * 2 ** (attempts - 1), _RETRY_MAX_SECONDS)
+        metrics.increment("roles.retry")
+        _LOGGER.info(
+            "lifetime role update retry in %.1fs: user_id=%s status=%s attempts=%s",
+            delay,
+            user_id,
+            exc.status,
+            attempts,
+        )
+        await submit_db(
+            defer_role_edit, self._guild_id, user_id, level, attempts, time.time() + delay
+        )
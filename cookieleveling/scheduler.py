@@ -1,87 +1,341 @@
+from __future__ import annotations
+
 import asyncio
 import logging
 import time
-from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
+from dataclasses import dataclass
+from typing import Awaitable, Callable
 
 import discord
 
+from . import metrics
 from .config import Config
-from .task_runner import run_hourly_tasks, run_minute_tasks
+from .task_runner import (
+    queue_maintenance,
+    run_adaptive_board_refresh,
+    run_board_prefetch,
+    run_board_refresh,
+    run_minute_tasks,
+    run_monthly_resets,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+_MINUTE_SECONDS = 60.0
+_HOUR_SECONDS = 3600.0
+_DAY_SECONDS = 86400.0
+_MAINTENANCE_OFFSET_SECONDS = 19 * _HOUR_SECONDS
+_MINUTE_BUDGET_SECONDS = 30.0
+_HOURLY_DEADLINE_SECONDS = 300.0
+_SHED_RETRY_SECONDS = _MINUTE_SECONDS
+_REPORT_PREFIXES = (
+    "scheduler.",
+    "boards.",
+    "background.",
+    "load.",
+    "level.",
+    "leaderboard.",
+    "snapshots.",
+    "roles.",
+    "assets.",
+    "http.",
+    "writes.",
+)
+
+JobHandler = Callable[["JobRun"], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    handler: JobHandler
+    interval_seconds: float
+    deadline_seconds: float
+    priority: int = 0
+    skippable: bool = False
+    offset_seconds: float = 0.0
+    run_on_start: bool = False
+    after: str | None = None
+
+
+@dataclass
+class _JobState:
+    next_at: float
+    active: asyncio.Task | None = None
+    active_run: "JobRun | None" = None
+    last_overran: bool = False
+
+
+class JobRun:
+    def __init__(
+        self,
+        scheduler: "TaskScheduler",
+        job: Job,
+        scheduled_at: float,
+        started_at: float,
+    ) -> None:
+        self._scheduler = scheduler
+        self.job = job
+        self.scheduled_at = scheduled_at
+        self.started_at = started_at
+
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def remaining(self) -> float:
+        return self.job.deadline_seconds - self.elapsed()
+
+    def should_shed(self) -> bool:
+        if self.remaining() <= 0:
+            return True
+        return self._scheduler.is_overloaded(self.job)
+
+    def shed(self, phase: str) -> None:
+        metrics.increment(f"scheduler.{self.job.name}.shed.{phase}")
+        _LOGGER.warning(
+            "job %s shed optional phase %s (elapsed %.2fs, budget %.2fs)",
+            self.job.name,
+            phase,
+            self.elapsed(),
+            self.job.deadline_seconds,
+        )
+
+
+class TaskScheduler:
+    def __init__(self, bot: discord.Client) -> None:
+        self._bot = bot
+        self._jobs: list[Job] = []
+        self._states: dict[str, _JobState] = {}
+        self._task: asyncio.Task | None = None
+
+    def add_job(self, job: Job) -> None:
+        self._jobs.append(job)
+        self._jobs.sort(key=lambda item: item.priority)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = self._bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for state in self._states.values():
+            if state.active is not None and not state.active.done():
+                state.active.cancel()
+
+    def is_overloaded(self, job: Job) -> bool:
+        for other in self._jobs:
+            if other.priority >= job.priority or other.name == job.name:
+                continue
+            state = self._states.get(other.name)
+            if state is None:
+                continue
+            if state.last_overran:
+                return True
+            if state.active_run is not None and state.active_run.remaining() <= 0:
+                return True
+        return False
+
+    async def _run(self) -> None:
+        await self._bot.wait_until_ready()
+        now = time.time()
+        for job in self._jobs:
+            next_at = now if job.run_on_start else _next_boundary(job, now)
+            self._states[job.name] = _JobState(next_at=next_at)
+            _LOGGER.info(
+                "job %s scheduled: every %.0fs, next in %.2fs",
+                job.name,
+                job.interval_seconds,
+                next_at - now,
+            )
+        while not self._bot.is_closed():
+            due_at = min(state.next_at for state in self._states.values())
+            await asyncio.sleep(max(0.0, due_at - time.time()))
+            now = time.time()
+            for job in self._jobs:
+                state = self._states[job.name]
+                if state.next_at <= now:
+                    self._dispatch(job, state, now)
+
+    def _dispatch(self, job: Job, state: _JobState, now: float) -> None:
+        scheduled_at = state.next_at
+        lag = now - scheduled_at
+        metrics.observe(f"scheduler.{job.name}.lag", lag)
+        missed = int(lag // job.interval_seconds)
+        if missed > 0:
+            metrics.increment(f"scheduler.{job.name}.missed", missed)
+            _LOGGER.warning(
+                "job %s missed %s run(s) (lag %.2fs)", job.name, missed, lag
+            )
+        regular_next = _next_boundary(job, now)
+        state.next_at = regular_next
 
-def start_minute_scheduler(bot: discord.Client, config: Config) -> asyncio.Task:
-    return bot.loop.create_task(_minute_loop(bot, config))
+        if state.active is not None and not state.active.done():
+            metrics.increment(f"scheduler.{job.name}.overlap")
+            _LOGGER.warning(
+                "job %s still running; skipping slot (running %.2fs)",
+                job.name,
+                state.active_run.elapsed() if state.active_run else 0.0,
+            )
+            return
 
+        if job.skippable and self.is_overloaded(job):
+            metrics.increment(f"scheduler.{job.name}.shed")
+            retry_at = now + _SHED_RETRY_SECONDS
+            if retry_at < regular_next:
+                state.next_at = retry_at
+            _LOGGER.warning("job %s shed under load; retrying later", job.name)
+            return
 
-def start_hourly_scheduler(bot: discord.Client, config: Config) -> asyncio.Task:
-    return bot.loop.create_task(_hourly_scheduler(bot, config))
+        run = JobRun(self, job, scheduled_at, now)
+        state.active_run = run
+        state.active = self._bot.loop.create_task(self._execute(job, state, run))
 
+    async def _wait_for(self, name: str | None) -> None:
+        state = self._states.get(name) if name is not None else None
+        if state is None or state.active is None or state.active.done():
+            return
+        started = time.perf_counter()
+        await asyncio.wait({state.active})
+        metrics.observe(f"scheduler.{name}.blocking", time.perf_counter() - started)
 
-async def _minute_loop(bot: discord.Client, config: Config) -> None:
-    await bot.wait_until_ready()
-    while not bot.is_closed():
+    async def _execute(self, job: Job, state: _JobState, run: JobRun) -> None:
+        if job.interval_seconds >= _HOUR_SECONDS:
+            _LOGGER.info("job %s start", job.name)
         try:
-            run_minute_tasks(bot, config)
+            await self._wait_for(job.after)
+            await job.handler(run)
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            _LOGGER.exception("minute tick failed")
-        await asyncio.sleep(_seconds_until_next_minute())
+            metrics.increment(f"scheduler.{job.name}.failed")
+            _LOGGER.exception("job %s failed", job.name)
+        finally:
+            runtime = run.elapsed()
+            metrics.observe(f"scheduler.{job.name}.runtime", runtime)
+            state.last_overran = runtime > job.deadline_seconds
+            state.active_run = None
+            if state.last_overran:
+                metrics.increment(f"scheduler.{job.name}.overrun")
+                _LOGGER.warning(
+                    "job %s overran its deadline: %.2fs > %.2fs",
+                    job.name,
+                    runtime,
+                    job.deadline_seconds,
+                )
+            elif job.interval_seconds >= _HOUR_SECONDS:
+                _LOGGER.info("job %s end (%.2fs)", job.name, runtime)
 
 
-async def _hourly_scheduler(bot: discord.Client, config: Config) -> None:
-    await bot.wait_until_ready()
-    if bot.get_guild(config.guild_id) is None:
-        _LOGGER.warning(
-            "hourly scheduler disabled: guild not found: %s", config.guild_id
+def start_scheduler(bot: discord.Client, config: Config) -> TaskScheduler:
+    scheduler = TaskScheduler(bot)
+
+    async def _minute(run: JobRun) -> None:
+        await run_minute_tasks(bot, config, run)
+
+    async def _monthly_reset(run: JobRun) -> None:
+        await run_monthly_resets(bot, config)
+
+    async def _boards(run: JobRun) -> None:
+        await run_board_refresh(bot, config, run)
+
+    async def _prefetch(run: JobRun) -> None:
+        await run_board_prefetch(bot, config)
+
+    async def _adaptive_boards(run: JobRun) -> None:
+        await run_adaptive_board_refresh(bot, config)
+
+    async def _maintenance(run: JobRun) -> None:
+        queue_maintenance(bot)
+
+    async def _report(run: JobRun) -> None:
+        for prefix in _REPORT_PREFIXES:
+            for line in metrics.format_report(prefix):
+                _LOGGER.info("metrics %s", line)
+
+    scheduler.add_job(
+        Job(
+            name="minute_tick",
+            handler=_minute,
+            interval_seconds=_MINUTE_SECONDS,
+            deadline_seconds=_MINUTE_BUDGET_SECONDS,
+            priority=0,
+            run_on_start=True,
         )
-        return
-    _schedule_next_hourly_tick(bot, config)
-
-
-def _seconds_until_next_minute() -> float:
-    now = time.time()
-    return max(1.0, 60.0 - (now % 60.0))
-
-
-def _schedule_next_hourly_tick(bot: discord.Client, config: Config) -> None:
-    if bot.is_closed():
-        return
-    loop = bot.loop
-    now_jst = datetime.now(ZoneInfo("Asia/Tokyo"))
-    next_boundary = now_jst.replace(minute=0, second=0, microsecond=0)
-    if now_jst >= next_boundary:
-        next_boundary += timedelta(hours=1)
-    next_boundary_utc = next_boundary.astimezone(timezone.utc)
-    now_utc = datetime.now(timezone.utc)
-    delay_seconds = max(0.0, (next_boundary_utc - now_utc).total_seconds())
-    _LOGGER.info(
-        "hourly schedule next boundary: %s (in %.2fs)",
-        next_boundary.isoformat(),
-        delay_seconds,
     )
-    handle = loop.call_at(
-        loop.time() + delay_seconds, _hourly_tick_callback, bot, config
+    scheduler.add_job(
+        Job(
+            name="monthly_reset",
+            handler=_monthly_reset,
+            interval_seconds=_HOUR_SECONDS,
+            deadline_seconds=_MINUTE_BUDGET_SECONDS,
+            priority=1,
+        )
     )
-    bot._hourly_handle = handle
-
-
-def _hourly_tick_callback(bot: discord.Client, config: Config) -> None:
-    if bot.is_closed():
-        return
-    task = bot.loop.create_task(_run_hourly_tick(bot, config))
-    bot._hourly_tick_task = task
-
-
-async def _run_hourly_tick(bot: discord.Client, config: Config) -> None:
-    tick_started = datetime.now(ZoneInfo("Asia/Tokyo")).isoformat()
-    _LOGGER.info("hourly tick start: %s", tick_started)
-    try:
-        await run_hourly_tasks(bot, config)
-    except Exception:
-        _LOGGER.exception("hourly rankboard update failed")
-    finally:
-        tick_finished = datetime.now(ZoneInfo("Asia/Tokyo")).isoformat()
-        _LOGGER.info("hourly tick end: %s", tick_finished)
-        _schedule_next_hourly_tick(bot, config)
+    scheduler.add_job(
+        Job(
+            name="board_refresh",
+            handler=_boards,
+            interval_seconds=_HOUR_SECONDS,
+            deadline_seconds=_HOURLY_DEADLINE_SECONDS,
+            priority=2,
+            skippable=True,
+            after="monthly_reset",
+        )
+    )
+    lead = config.board_prefetch_lead_seconds
+    if 0 < lead < _HOUR_SECONDS:
+        scheduler.add_job(
+            Job(
+                name="board_prefetch",
+                handler=_prefetch,
+                interval_seconds=_HOUR_SECONDS,
+                deadline_seconds=float(lead),
+                priority=3,
+                skippable=True,
+                offset_seconds=_HOUR_SECONDS - lead,
+            )
+        )
+    scheduler.add_job(
+        Job(
+            name="board_adaptive_refresh",
+            handler=_adaptive_boards,
+            interval_seconds=_MINUTE_SECONDS,
+            deadline_seconds=_MINUTE_BUDGET_SECONDS,
+            priority=4,
+            skippable=True,
+            offset_seconds=_MINUTE_SECONDS / 2,
+        )
+    )
+    scheduler.add_job(
+        Job(
+            name="maintenance",
+            handler=_maintenance,
+            interval_seconds=_DAY_SECONDS,
+            deadline_seconds=_MINUTE_BUDGET_SECONDS,
+            priority=8,
+            offset_seconds=_MAINTENANCE_OFFSET_SECONDS,
+        )
+    )
+    scheduler.add_job(
+        Job(
+            name="metrics_report",
+            handler=_report,
+            interval_seconds=_HOUR_SECONDS,
+            deadline_seconds=_MINUTE_BUDGET_SECONDS,
+            priority=9,
+            skippable=True,
+            offset_seconds=_HOUR_SECONDS / 2,
+        )
+    )
+    scheduler.start()
+    return scheduler
+
+
+def _next_boundary(job: Job, now: float) -> float:
+    # Asia/Tokyo has a whole-hour UTC offset and no DST, so epoch-aligned
+    # hour boundaries coincide with JST hour boundaries.
+    interval = job.interval_seconds
+    base = now - job.offset_seconds
+    return (base // interval + 1) * interval + job.offset_seconds
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+from zoneinfo import ZoneInfo
+
+import discord
+
+from .board_resolver import ResolvedUser, resolve_board_users
+from .config import Config
+from .db import (
+    fetch_lifetime_candidates,
+    fetch_rank_candidates,
+    fetch_season_archives,
+    fetch_unrendered_season_archives,
+    immediate_transaction,
+    insert_season_archive,
+    reset_host_monthly,
+    reset_season_xp,
+    season_archive_exists,
+    set_season_archive_image,
+    submit_db,
+)
+from .host_history import HOST_XP_COUNTERS, closed_month_rows
+from .host_rankboard_publisher import build_monthly_entries, build_total_entries
+from .host_rankboard_renderer import render_host_board_png
+from .rank_index import HOST_MONTHLY, HOST_TOTAL, LIFETIME, SEASON, reset_ordering
+from .rank_snapshots import decode_snapshot, encode_snapshot
+from .rankboard_publisher import build_lifetime_entries, build_season_entries
+from .rankboard_renderer import render_board_png
+from .ranker import rank_season_rows, rank_static_rows
+
+_LOGGER = logging.getLogger(__name__)
+
+ARCHIVE_DEPTH = 100
+ARCHIVE_BOARDS = (SEASON, LIFETIME, HOST_MONTHLY, HOST_TOTAL)
+_IMAGE_ROWS = 20
+
+_LAST_RESET_MONTH: tuple[int, int] | None = None
+_LAST_HOST_RESET_MONTH: tuple[int, int] | None = None
+
+
+@dataclass(frozen=True)
+class _ArchiveSpec:
+    xp_field: str
+    title: str
+    build: Callable[[list[dict], dict[int, ResolvedUser]], list[dict]]
+    render: Callable[[list[dict], str], bytes]
+
+
+_SPECS = {
+    SEASON: _ArchiveSpec(
+        "season_xp",
+        "月間 通話ランキング",
+        build_season_entries,
+        lambda entries, title: render_board_png(entries, title=title),
+    ),
+    LIFETIME: _ArchiveSpec(
+        "lifetime_xp",
+        "累計 通話ランキング",
+        build_lifetime_entries,
+        lambda entries, title: render_board_png(entries, title=title, lifetime=True),
+    ),
+    HOST_MONTHLY: _ArchiveSpec(
+        "monthly_xp",
+        "月間 部屋主ランキング",
+        build_monthly_entries,
+        lambda entries, title: render_host_board_png(entries, title=title),
+    ),
+    HOST_TOTAL: _ArchiveSpec(
+        "total_xp",
+        "累計 部屋主ランキング",
+        build_total_entries,
+        lambda entries, title: render_host_board_png(entries, title=title, total=True),
+    ),
+}
+
+
+def maybe_monthly_reset(guild_id: int) -> bool:
+    global _LAST_RESET_MONTH
+    now_jst = datetime.now(ZoneInfo("Asia/Tokyo"))
+    current_month = (now_jst.year, now_jst.month)
+    if now_jst.day != 1:
+        return False
+    if _LAST_RESET_MONTH == current_month:
+        return False
+    reset = archive_and_reset_season(guild_id, season_label(*current_month))
+    if reset:
+        reset_ordering(guild_id, SEASON)
+    _LAST_RESET_MONTH = current_month
+    return reset
+
+
+def maybe_host_monthly_reset(
+    guild_id: int, host_xp_mode: str = HOST_XP_COUNTERS
+) -> bool:
+    global _LAST_HOST_RESET_MONTH
+    now_jst = datetime.now(ZoneInfo("Asia/Tokyo"))
+    current_month = (now_jst.year, now_jst.month)
+    if now_jst.day != 1:
+        return False
+    if _LAST_HOST_RESET_MONTH == current_month:
+        return False
+    reset = archive_and_reset_host_month(
+        guild_id, season_label(*current_month), host_xp_mode
+    )
+    if reset:
+        reset_ordering(guild_id, HOST_MONTHLY)
+    _LAST_HOST_RESET_MONTH = current_month
+    return reset
+
+
+def season_label(year: int, month: int) -> str:
+    if month == 1:
+        return f"{year - 1:04d}-12"
+    return f"{year:04d}-{month - 1:02d}"
+
+
+def archive_and_reset_season(guild_id: int, season: str) -> bool:
+    with immediate_transaction():
+        if season_archive_exists(guild_id, season, SEASON):
+            return False
+        now = datetime.now(timezone.utc)
+        season_rows = rank_season_rows(
+            [row for row in fetch_rank_candidates(guild_id) if not row["optout"]],
+            now,
+            ARCHIVE_DEPTH,
+        )
+        lifetime_rows = rank_static_rows(
+            [row for row in fetch_lifetime_candidates(guild_id) if not row["optout"]],
+            "lifetime_xp",
+            ARCHIVE_DEPTH,
+        )
+        _insert_archive(guild_id, season, SEASON, season_rows, now)
+        _insert_archive(guild_id, season, LIFETIME, lifetime_rows, now)
+        reset_season_xp(guild_id, commit=False)
+    return True
+
+
+def archive_and_reset_host_month(
+    guild_id: int, season: str, host_xp_mode: str = HOST_XP_COUNTERS
+) -> bool:
+    with immediate_transaction():
+        if season_archive_exists(guild_id, season, HOST_MONTHLY):
+            return False
+        now = datetime.now(timezone.utc)
+        monthly_source, total_source = closed_month_rows(guild_id, host_xp_mode)
+        monthly_rows = rank_static_rows(monthly_source, "monthly_xp", ARCHIVE_DEPTH)
+        total_rows = rank_static_rows(total_source, "total_xp", ARCHIVE_DEPTH)
+        _insert_archive(guild_id, season, HOST_MONTHLY, monthly_rows, now)
+        _insert_archive(guild_id, season, HOST_TOTAL, total_rows, now)
+        reset_host_monthly(guild_id, commit=False)
+    return True
+
+
+async def render_pending_archives(bot: discord.Client, config: Config) -> int:
+    pending = fetch_unrendered_season_archives(config.guild_id)
+    if not pending:
+        return 0
+    guild = bot.get_guild(config.guild_id)
+    if guild is None:
+        return 0
+    boards = [
+        (row["season"], row["board"], _decode_rows(row["board"], row["payload"]))
+        for row in pending
+    ]
+    user_ids = list(
+        dict.fromkeys(row["user_id"] for _, _, rows in boards for row in rows)
+    )
+    resolved = await resolve_board_users(
+        guild,
+        user_ids,
+        bot.asset_session,
+        concurrency=config.board_resolve_concurrency,
+        timeout=config.board_lookup_timeout_seconds,
+    )
+    rendered = 0
+    for season, board, rows in boards:
+        spec = _SPECS[board]
+        path = archive_image_path(config, season, board)
+        title = f"{_format_season(season)} {spec.title} 最終結果"
+        try:
+            await asyncio.to_thread(
+                _write_archive_image, spec, spec.build(rows, resolved), title, path
+            )
+        except Exception:
+            _LOGGER.exception("season archive render failed: %s %s", season, board)
+            continue
+        await submit_db(set_season_archive_image, config.guild_id, season, board, path)
+        rendered += 1
+    _LOGGER.info("season archive images rendered: %s", rendered)
+    return rendered
+
+
+def load_archive_files(config: Config, season: str) -> tuple[list[str], bool]:
+    rows = {row["board"]: row for row in fetch_season_archives(config.guild_id, season)}
+    paths = [
+        rows[board]["image_path"]
+        for board in ARCHIVE_BOARDS
+        if board in rows and rows[board]["image_path"]
+    ]
+    pending = any(not row["image_path"] for row in rows.values())
+    return [path for path in paths if os.path.exists(path)], pending
+
+
+def archive_image_path(config: Config, season: str, board: str) -> str:
+    return os.path.join(config.data_dir, "archive", season, f"{board}.png")
+
+
+def _insert_archive(
+    guild_id: int, season: str, board: str, rows: list[dict], now: datetime
+) -> None:
+    xp_field = _SPECS[board].xp_field
+    payload = encode_snapshot((row["user_id"], row[xp_field]) for row in rows)
+    insert_season_archive(
+        guild_id, season, board, now.isoformat(), payload, commit=False
+    )
+
+
+def _decode_rows(board: str, payload: bytes) -> list[dict]:
+    xp_field = _SPECS[board].xp_field
+    return [
+        {"user_id": user_id, xp_field: xp}
+        for user_id, xp in decode_snapshot(payload)[:_IMAGE_ROWS]
+    ]
+
+
+def _write_archive_image(
+    spec: _ArchiveSpec, entries: list[dict], title: str, path: str
+) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(spec.render(entries, title))
+    os.replace(temp_path, path)
+
+
+def _format_season(season: str) -> str:
+    year, month = season.split("-")
+    return f"{int(year)}年{int(month)}月"
@@ -1,48 +1,250 @@
+from __future__ import annotations
+
+import asyncio
 import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 
 import discord
 
+from . import metrics, refresh_policy
+from .asset_store import prune_disk_cache
+from .background import IdleGate, load_monitor
 from .config import Config
-from .rankboard_publisher import update_rankboard
-from .host_rankboard_publisher import update_hostboard
-from .host_tracker import snapshot_host_sessions, tick_host_xp
-from .role_assigner import apply_lifetime_roles_for_levels
-from .xp_engine import maybe_host_monthly_reset, maybe_monthly_reset, tick_minute
-from .voice_tracker import snapshot_voice_state
+from .db import optimize_database, submit_db
+from .board_pipeline import prefetch_board_assets, run_board_pipeline
+from .rank_snapshots import capture_rank_snapshots, compact_snapshots
+from .host_tracker import (
+    HostTick,
+    capture_host_tick,
+    commit_host_tick,
+    persist_host_tick,
+    refresh_host_index,
+    requeue_host_tick,
+)
+from .season_archive import (
+    maybe_host_monthly_reset,
+    maybe_monthly_reset,
+    render_pending_archives,
+)
+from .xp_engine import tick_minute
+from .voice_tracker import capture_voice_users, persist_voice_snapshot
+
+if TYPE_CHECKING:
+    from .scheduler import JobRun
 
 _LOGGER = logging.getLogger(__name__)
 
+_MINUTE_DEADLINE_SECONDS = 30.0
+
+_inflight_tick: asyncio.Future | None = None
+
+
+@dataclass(frozen=True)
+class MinuteSnapshot:
+    guild_id: int
+    voice_user_ids: set[int]
+    host_tick: HostTick
+
 
-def run_minute_tasks(bot: discord.Client, config: Config) -> int:
+@dataclass
+class MinuteTickResult:
+    earned: list[int] = field(default_factory=list)
+    host_grants: dict[int, int] = field(default_factory=dict)
+    level_changes: dict[int, int] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+    host_persisted: bool = False
+
+
+class MinuteTickCancelled(Exception):
+    pass
+
+
+async def run_minute_tasks(
+    bot: discord.Client, config: Config, run: JobRun | None = None
+) -> int:
+    global _inflight_tick
     guild = bot.get_guild(config.guild_id)
     if guild is None:
         return 0
-    snapshot_voice_state(guild)
-    snapshot_host_sessions(guild)
-    updated, level_changes = tick_minute(config.guild_id)
-    if level_changes:
-        bot.loop.create_task(apply_lifetime_roles_for_levels(guild, level_changes))
-    host_updated = tick_host_xp(guild)
-    if updated:
-        _LOGGER.info("minute tick updated %s users", updated)
-    if host_updated:
-        _LOGGER.info("minute host tick updated %s channels", host_updated)
-    return updated
-
-
-async def run_hourly_tasks(bot: discord.Client, config: Config) -> None:
+    if _inflight_tick is not None and not _inflight_tick.done():
+        metrics.increment("minute_tick.skipped_inflight")
+        _LOGGER.warning("minute tick skipped: previous DB phase still running")
+        return 0
+
+    tick_started = capture_started = time.perf_counter()
+    snapshot = MinuteSnapshot(
+        guild_id=guild.id,
+        voice_user_ids=capture_voice_users(guild),
+        host_tick=capture_host_tick(guild, config.host_xp_mode),
+    )
+    capture_seconds = time.perf_counter() - capture_started
+    metrics.observe("minute_tick.phase.capture", capture_seconds)
+
+    deadline = run.remaining() if run is not None else _MINUTE_DEADLINE_SECONDS
+    cancel = threading.Event()
+    result = MinuteTickResult()
+    _inflight_tick = submit_db(_run_db_phases, snapshot, cancel, result)
+    _inflight_tick.add_done_callback(
+        lambda future: _finish_tick(bot, future, cancel, snapshot, result)
+    )
+    try:
+        await asyncio.wait_for(
+            asyncio.shield(_inflight_tick), timeout=max(0.0, deadline)
+        )
+    except asyncio.TimeoutError:
+        cancel.set()
+        load_monitor.record_tick(time.perf_counter() - tick_started)
+        metrics.increment("minute_tick.deadline_exceeded")
+        _LOGGER.warning(
+            "minute tick exceeded its deadline (%.2fs); cancelling remaining phases",
+            deadline,
+        )
+        return 0
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+    load_monitor.record_tick(time.perf_counter() - tick_started)
+
+    refresh_policy.observe_tick(result.earned, result.host_grants)
+    if result.earned:
+        _LOGGER.info("minute tick updated %s users", len(result.earned))
+    if result.host_grants:
+        _LOGGER.info("minute host tick updated %s hosts", len(result.host_grants))
+    _LOGGER.debug(
+        "minute tick phases: capture=%.3fs %s",
+        capture_seconds,
+        " ".join(f"{name}={value:.3f}s" for name, value in result.timings.items()),
+    )
+    return len(result.earned)
+
+
+def _finish_tick(
+    bot: discord.Client,
+    future: asyncio.Future,
+    cancel: threading.Event,
+    snapshot: MinuteSnapshot,
+    result: MinuteTickResult,
+) -> None:
+    if result.host_persisted:
+        commit_host_tick(snapshot.host_tick)
+    else:
+        requeue_host_tick(snapshot.host_tick)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        if result.level_changes:
+            bot.role_queue.wake()
+        return
+    if not cancel.is_set():
+        return
+    if isinstance(error, MinuteTickCancelled):
+        _LOGGER.info("minute tick stopped before phase %s", error)
+        return
+    _LOGGER.error("abandoned minute tick failed", exc_info=error)
+
+
+def _run_db_phases(
+    snapshot: MinuteSnapshot, cancel: threading.Event, result: MinuteTickResult
+) -> MinuteTickResult:
+    def _phase(name: str, func):
+        if cancel.is_set():
+            raise MinuteTickCancelled(name)
+        started = time.perf_counter()
+        try:
+            return func()
+        finally:
+            elapsed = time.perf_counter() - started
+            result.timings[name] = elapsed
+            metrics.observe(f"minute_tick.phase.{name}", elapsed)
+
+    _phase(
+        "voice_snapshot",
+        lambda: persist_voice_snapshot(snapshot.guild_id, snapshot.voice_user_ids),
+    )
+
+    def _host_tick() -> dict[int, int]:
+        persist_host_tick(snapshot.host_tick)
+        result.host_persisted = True
+        return refresh_host_index(snapshot.host_tick)
+
+    result.host_grants = _phase("host_tick", _host_tick)
+    result.earned, result.level_changes = _phase(
+        "xp_tick", lambda: tick_minute(snapshot.guild_id)
+    )
+    return result
+
+
+async def run_monthly_resets(bot: discord.Client, config: Config) -> None:
     guild = bot.get_guild(config.guild_id)
     if guild is None:
         return
-    reset = maybe_monthly_reset(config.guild_id)
+    reset = await submit_db(maybe_monthly_reset, config.guild_id)
     if reset:
         _LOGGER.info("monthly season reset applied")
-    host_reset = maybe_host_monthly_reset(config.guild_id)
+    host_reset = await submit_db(
+        maybe_host_monthly_reset, config.guild_id, config.host_xp_mode
+    )
     if host_reset:
         _LOGGER.info("monthly host reset applied")
-    updated = await update_rankboard(bot, config)
-    if updated:
+    await render_pending_archives(bot, config)
+
+
+async def run_board_prefetch(bot: discord.Client, config: Config) -> None:
+    await prefetch_board_assets(bot, config)
+
+
+async def run_board_refresh(
+    bot: discord.Client, config: Config, run: JobRun | None = None
+) -> None:
+    boundary = run.scheduled_at if run is not None else None
+    captured_at = int(boundary if boundary is not None else time.time()) // 3600 * 3600
+    try:
+        await submit_db(capture_rank_snapshots, config.guild_id, captured_at)
+    except Exception:
+        _LOGGER.exception("rank snapshot capture failed")
+    report = await run_board_pipeline(bot, config, boundary)
+    if report.rankboard_ok:
         _LOGGER.info("hourly rankboard updated")
-    host_updated = await update_hostboard(bot, config)
-    if host_updated:
+    if report.hostboard_ok:
         _LOGGER.info("hourly hostboard updated")
+
+
+async def run_adaptive_board_refresh(bot: discord.Client, config: Config) -> None:
+    groups = refresh_policy.candidate_groups(config)
+    if not groups:
+        return
+    report = await run_board_pipeline(bot, config, groups=tuple(groups), adaptive=True)
+    if report.rankboard_ok:
+        _LOGGER.info("adaptive rankboard refresh published")
+    if report.hostboard_ok:
+        _LOGGER.info("adaptive hostboard refresh published")
+
+
+def queue_maintenance(bot: discord.Client) -> None:
+    guild_id = bot.config.guild_id
+    bot.background.submit(
+        "snapshot_compaction",
+        lambda gate: _snapshot_compaction(gate, guild_id),
+        priority=15,
+    )
+    bot.background.submit("asset_prune", _asset_prune, priority=18)
+    bot.background.submit("sqlite_maintenance", _sqlite_maintenance, priority=20)
+
+
+async def _snapshot_compaction(gate: IdleGate, guild_id: int) -> None:
+    await gate.checkpoint()
+    await submit_db(compact_snapshots, guild_id)
+
+
+async def _asset_prune(gate: IdleGate) -> None:
+    await gate.checkpoint()
+    await submit_db(prune_disk_cache)
+
+
+async def _sqlite_maintenance(gate: IdleGate) -> None:
+    await gate.checkpoint()
+    await submit_db(optimize_database)
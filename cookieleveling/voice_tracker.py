@@ -5,27 +5,33 @@ from typing import Dict, Optional, Tuple
 
 import discord
 
-from .db import apply_voice_snapshot, reset_voice_states, upsert_voice_state
+from .db import apply_voice_snapshot, reset_voice_states, submit_db, upsert_voice_state
 
 _channel_map: Dict[Tuple[int, int], int] = {}
 
 
-def restore_voice_state(guild: discord.Guild) -> None:
+async def restore_voice_state(guild: discord.Guild) -> None:
     now = _utc_now()
-    reset_voice_states(guild.id)
     _channel_map_keys = [key for key in _channel_map if key[0] == guild.id]
     for key in _channel_map_keys:
         _channel_map.pop(key, None)
+    user_ids: list[int] = []
     for channel in guild.voice_channels:
         for member in channel.members:
             if member.bot:
                 continue
-            upsert_voice_state(guild.id, member.id, True, now)
+            user_ids.append(member.id)
             _channel_map[(guild.id, member.id)] = channel.id
+    await submit_db(_restore_voice_rows, guild.id, user_ids, now)
 
 
-def snapshot_voice_state(guild: discord.Guild) -> None:
-    now = _utc_now()
+def _restore_voice_rows(guild_id: int, user_ids: list[int], now: str) -> None:
+    reset_voice_states(guild_id)
+    for user_id in user_ids:
+        upsert_voice_state(guild_id, user_id, True, now)
+
+
+def capture_voice_users(guild: discord.Guild) -> set[int]:
     current_users: set[int] = set()
     for channel in guild.voice_channels:
         for member in channel.members:
@@ -36,10 +42,14 @@ def snapshot_voice_state(guild: discord.Guild) -> None:
     for (gid, uid) in list(_channel_map.keys()):
         if gid == guild.id and uid not in current_users:
             _channel_map.pop((gid, uid), None)
-    apply_voice_snapshot(guild.id, current_users, now)
+    return current_users
+
+
+def persist_voice_snapshot(guild_id: int, user_ids: set[int]) -> None:
+    apply_voice_snapshot(guild_id, user_ids, _utc_now())
 
 
-def handle_voice_state_update(
+async def handle_voice_state_update(
     guild_id: int,
     member: discord.Member,
     before: discord.VoiceState,
@@ -50,13 +60,13 @@ def handle_voice_state_update(
 
     if before.channel is None and after.channel is not None:
         now = _utc_now()
-        upsert_voice_state(guild_id, member.id, True, now)
         _channel_map[(guild_id, member.id)] = after.channel.id
+        await submit_db(upsert_voice_state, guild_id, member.id, True, now)
         return
 
     if before.channel is not None and after.channel is None:
-        upsert_voice_state(guild_id, member.id, False, None)
         _channel_map.pop((guild_id, member.id), None)
+        await submit_db(upsert_voice_state, guild_id, member.id, False, None)
         return
 
     if before.channel is not None and after.channel is not None:
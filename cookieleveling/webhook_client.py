@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Sequence
+
+import aiohttp
+import discord
+
+
+class WebhookClient:
+    def __init__(self, session: aiohttp.ClientSession, base_url: str) -> None:
+        self._session = session
+        self._base_url = base_url.rstrip("/")
+
+    async def execute(
+        self, webhook_id: int, token: str, *, files: Sequence[discord.File] = ()
+    ) -> int:
+        data = await self._request(
+            "POST",
+            f"/webhooks/{webhook_id}/{token}",
+            params={"wait": "true"},
+            payload={"content": ""},
+            files=files,
+        )
+        return int(data["id"])
+
+    async def edit_message(
+        self,
+        webhook_id: int,
+        token: str,
+        message_id: int,
+        *,
+        content: str = "",
+        embeds: list | None = None,
+        attachments: Sequence[discord.File] = (),
+    ) -> None:
+        await self._request(
+            "PATCH",
+            f"/webhooks/{webhook_id}/{token}/messages/{message_id}",
+            payload={"content": content, "embeds": embeds or []},
+            files=attachments,
+        )
+
+    async def delete_message(self, webhook_id: int, token: str, message_id: int) -> None:
+        await self._request(
+            "DELETE", f"/webhooks/{webhook_id}/{token}/messages/{message_id}"
+        )
+
+    async def delete_webhook(self, webhook_id: int, token: str) -> None:
+        await self._request("DELETE", f"/webhooks/{webhook_id}/{token}")
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict[str, str] | None = None,
+        payload: dict[str, Any] | None = None,
+        files: Sequence[discord.File] = (),
+    ) -> Any:
+        data: aiohttp.FormData | None = None
+        if payload is not None:
+            payload = {
+                **payload,
+                "attachments": [
+                    {"id": idx, "filename": file.filename}
+                    for idx, file in enumerate(files)
+                ],
+            }
+            data = aiohttp.FormData()
+            data.add_field(
+                "payload_json", json.dumps(payload), content_type="application/json"
+            )
+            for idx, file in enumerate(files):
+                data.add_field(
+                    f"files[{idx}]",
+                    file.fp,
+                    filename=file.filename,
+                    content_type="application/octet-stream",
+                )
+        async with self._session.request(
+            method, f"{self._base_url}{path}", params=params, data=data
+        ) as response:
+            if response.content_type == "application/json":
+                body = await response.json()
+            else:
+                body = await response.text()
+            if 200 <= response.status < 300:
+                return body
+            raise _http_error(response, body)
+
+
+def _http_error(response: aiohttp.ClientResponse, body: Any) -> discord.HTTPException:
+    if response.status == 403:
+        return discord.Forbidden(response, body)
+    if response.status == 404:
+        return discord.NotFound(response, body)
+    if response.status >= 500:
+        return discord.DiscordServerError(response, body)
+    return discord.HTTPException(response, body)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import json
+import logging
+import sys
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+from aiohttp import web
+
+from .board_messages import BoardWebhook, BoardWebhookLost, edit_board_message
+from .webhook_client import WebhookClient
+
+_LOGGER = logging.getLogger(__name__)
+
+_API_PATH = "/api/v10"
+_WEBHOOK_ID = 4242
+_WEBHOOK_TOKEN = "stand-in-token"
+
+
+class _StandInDiscord:
+    def __init__(self) -> None:
+        self.tokens = {_WEBHOOK_ID: _WEBHOOK_TOKEN}
+        self.messages: dict[int, dict] = {}
+        self.requests: list[tuple[str, str]] = []
+        self._ids = itertools.count(1000)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"{_API_PATH}/webhooks/{{webhook_id}}/{{token}}", self._execute)
+        app.router.add_delete(
+            f"{_API_PATH}/webhooks/{{webhook_id}}/{{token}}", self._delete_webhook
+        )
+        app.router.add_patch(
+            f"{_API_PATH}/webhooks/{{webhook_id}}/{{token}}/messages/{{message_id}}",
+            self._edit_message,
+        )
+        app.router.add_delete(
+            f"{_API_PATH}/webhooks/{{webhook_id}}/{{token}}/messages/{{message_id}}",
+            self._delete_message,
+        )
+        return app
+
+    async def _execute(self, request: web.Request) -> web.Response:
+        error = self._check(request)
+        if error is not None:
+            return error
+        payload, files = await _read_multipart(request)
+        message_id = next(self._ids)
+        self.messages[message_id] = {"content": payload.get("content"), "files": files}
+        return web.json_response({"id": str(message_id)})
+
+    async def _edit_message(self, request: web.Request) -> web.Response:
+        error = self._check(request)
+        if error is not None:
+            return error
+        message_id = int(request.match_info["message_id"])
+        if message_id not in self.messages:
+            return _error(404, 10008, "Unknown Message")
+        payload, files = await _read_multipart(request)
+        self.messages[message_id] = {"content": payload.get("content"), "files": files}
+        return web.json_response({"id": str(message_id)})
+
+    async def _delete_message(self, request: web.Request) -> web.Response:
+        error = self._check(request)
+        if error is not None:
+            return error
+        if self.messages.pop(int(request.match_info["message_id"]), None) is None:
+            return _error(404, 10008, "Unknown Message")
+        return web.Response(status=204)
+
+    async def _delete_webhook(self, request: web.Request) -> web.Response:
+        error = self._check(request)
+        if error is not None:
+            return error
+        self.tokens.pop(int(request.match_info["webhook_id"]))
+        return web.Response(status=204)
+
+    def _check(self, request: web.Request) -> web.Response | None:
+        self.requests.append((request.method, request.path))
+        token = self.tokens.get(int(request.match_info["webhook_id"]))
+        if token is None:
+            return _error(404, 10015, "Unknown Webhook")
+        if token != request.match_info["token"]:
+            return _error(401, 50027, "Invalid Webhook Token")
+        return None
+
+
+async def _read_multipart(request: web.Request) -> tuple[dict, list[str]]:
+    payload: dict = {}
+    files: list[str] = []
+    reader = await request.multipart()
+    async for part in reader:
+        if part.name == "payload_json":
+            payload = json.loads(await part.text())
+        else:
+            await part.read()
+            files.append(part.filename)
+    return payload, files
+
+
+def _error(status: int, code: int, message: str) -> web.Response:
+    return web.json_response({"code": code, "message": message}, status=status)
+
+
+def _file(name: str) -> discord.File:
+    return discord.File(io.BytesIO(b"\x89PNG stand-in"), filename=name)
+
+
+async def _expect_lost(
+    bot: SimpleNamespace, webhook: BoardWebhook, message_id: int
+) -> None:
+    try:
+        await edit_board_message(
+            bot, None, message_id, webhook=webhook, attachments=[_file("board.png")]
+        )
+    except BoardWebhookLost:
+        return
+    raise AssertionError("webhook edit did not report BoardWebhookLost")
+
+
+async def run_harness() -> None:
+    server = _StandInDiscord()
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    base_url = f"http://127.0.0.1:{port}{_API_PATH}"
+    _LOGGER.info("stand-in Discord API listening: DISCORD_API_BASE_URL=%s", base_url)
+    try:
+        async with aiohttp.ClientSession() as session:
+            bot = SimpleNamespace(webhooks=WebhookClient(session, base_url))
+            webhook = BoardWebhook(_WEBHOOK_ID, _WEBHOOK_TOKEN)
+
+            message_id = await bot.webhooks.execute(
+                _WEBHOOK_ID, _WEBHOOK_TOKEN, files=[_file("lifetime.png")]
+            )
+            assert server.messages[message_id]["files"] == ["lifetime.png"]
+
+            await edit_board_message(
+                bot,
+                None,
+                message_id,
+                webhook=webhook,
+                content="",
+                embeds=[],
+                attachments=[_file("season.png")],
+            )
+            assert server.messages[message_id]["files"] == ["season.png"]
+            assert all(method != "GET" for method, _ in server.requests)
+
+            await _expect_lost(bot, BoardWebhook(_WEBHOOK_ID, "wrong-token"), message_id)
+            try:
+                await edit_board_message(
+                    bot, None, message_id + 1, webhook=webhook, attachments=[_file("board.png")]
+                )
+            except BoardWebhookLost:
+                raise AssertionError("unknown message edit reported BoardWebhookLost")
+            except discord.NotFound as exc:
+                assert exc.code == 10008
+            else:
+                raise AssertionError("unknown message edit did not raise NotFound")
+
+            try:
+                await bot.webhooks.delete_message(_WEBHOOK_ID, _WEBHOOK_TOKEN, message_id + 1)
+            except discord.NotFound:
+                pass
+            else:
+                raise AssertionError("missing message delete did not raise NotFound")
+            await bot.webhooks.delete_message(_WEBHOOK_ID, _WEBHOOK_TOKEN, message_id)
+            assert message_id not in server.messages
+
+            await bot.webhooks.delete_webhook(_WEBHOOK_ID, _WEBHOOK_TOKEN)
+            await _expect_lost(bot, webhook, message_id)
+    finally:
+        await runner.cleanup()
+    _LOGGER.info("webhook harness passed: %s requests", len(server.requests))
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    try:
+        asyncio.run(run_harness())
+    except AssertionError:
+        _LOGGER.exception("webhook harness failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+import discord
+
+from . import metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_INTERACTION = 0
+PRIORITY_ROLE = 10
+PRIORITY_BOARD = 20
+
+_MAX_IN_FLIGHT = 4
+_ROUTE_BUDGETS = {
+    "interaction": (50, 1.0),
+    "role": (10, 10.0),
+    "board": (5, 5.0),
+    "webhook": (5, 2.0),
+}
+_DEFAULT_BUDGET = (5, 5.0)
+_RATE_LIMIT_FALLBACK_SECONDS = 5.0
+
+WriteCall = Callable[[], Awaitable[Any]]
+
+
+@dataclass(order=True)
+class _QueuedWrite:
+    priority: int
+    seq: int
+    route: str = field(compare=False)
+    key: Hashable | None = field(compare=False)
+    call: WriteCall = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    futures: list[asyncio.Future] = field(compare=False, default_factory=list)
+
+
+class _RouteBudget:
+    def __init__(self, limit: int, window: float) -> None:
+        self._limit = limit
+        self._window = window
+        self._sent: deque[float] = deque()
+        self._paused_until = 0.0
+
+    def ready_at(self, now: float) -> float:
+        while self._sent and now - self._sent[0] >= self._window:
+            self._sent.popleft()
+        ready = self._paused_until
+        if len(self._sent) >= self._limit:
+            ready = max(ready, self._sent[0] + self._window)
+        return ready
+
+    def record(self, now: float) -> None:
+        self._sent.append(now)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class WriteScheduler:
+    def __init__(self) -> None:
+        self._queue: list[_QueuedWrite] = []
+        self._pending: dict[Hashable, _QueuedWrite] = {}
+        self._active_keys: set[Hashable] = set()
+        self._in_flight: set[asyncio.Task] = set()
+        self._budgets: dict[str, _RouteBudget] = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def submit(
+        self,
+        route: str,
+        call: WriteCall,
+        *,
+        priority: int,
+        key: Hashable | None = None,
+    ) -> Any:
+        if self._task is None:
+            return await call()
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(key) if key is not None else None
+        if pending is not None:
+            pending.call = call
+            pending.futures.append(future)
+            metrics.increment("writes.coalesced")
+        else:
+            queued = _QueuedWrite(
+                priority, next(self._seq), route, key, call, time.monotonic(), [future]
+            )
+            heapq.heappush(self._queue, queued)
+            if key is not None:
+                self._pending[key] = queued
+            metrics.set_gauge("writes.queue_depth", len(self._queue))
+        self._wake.set()
+        return await asyncio.shield(future)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        for queued in self._queue:
+            for future in queued.futures:
+                future.cancel()
+        self._queue.clear()
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            timeout = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> float | None:
+        now = time.monotonic()
+        wait: float | None = None
+        for queued in sorted(self._queue):
+            if len(self._in_flight) >= _MAX_IN_FLIGHT:
+                break
+            if queued.key is not None and queued.key in self._active_keys:
+                continue
+            budget = self._budget(queued.route)
+            ready_at = budget.ready_at(now)
+            if ready_at > now:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            self._queue.remove(queued)
+            if queued.key is not None:
+                self._pending.pop(queued.key, None)
+                self._active_keys.add(queued.key)
+            budget.record(now)
+            self._in_flight.add(asyncio.create_task(self._execute(queued)))
+        heapq.heapify(self._queue)
+        metrics.set_gauge("writes.queue_depth", len(self._queue))
+        return wait
+
+    async def _execute(self, queued: _QueuedWrite) -> None:
+        started = time.monotonic()
+        metrics.observe(f"writes.wait.{queued.route}", started - queued.enqueued_at)
+        try:
+            result = await queued.call()
+        except Exception as exc:
+            delay = retry_after(exc, _RATE_LIMIT_FALLBACK_SECONDS)
+            if delay is not None:
+                self._budget(queued.route).pause(delay)
+                metrics.increment(f"writes.rate_limited.{queued.route}")
+                _LOGGER.warning(
+                    "write route %s rate limited for %.1fs", queued.route, delay
+                )
+            metrics.increment(f"writes.failed.{queued.route}")
+            _resolve(queued.futures, exception=exc)
+        else:
+            _resolve(queued.futures, result=result)
+        finally:
+            metrics.observe(
+                f"writes.latency.{queued.route}", time.monotonic() - started
+            )
+            if queued.key is not None:
+                self._active_keys.discard(queued.key)
+            self._in_flight.discard(asyncio.current_task())
+            self._wake.set()
+
+    def _budget(self, route: str) -> _RouteBudget:
+        family = route.split(".", 1)[0]
+        budget = self._budgets.get(family)
+        if budget is None:
+            budget = _RouteBudget(*_ROUTE_BUDGETS.get(family, _DEFAULT_BUDGET))
+            self._budgets[family] = budget
+        return budget
+
+
+def retry_after(exc: BaseException, default: float) -> float | None:
+    if not isinstance(exc, discord.HTTPException) or exc.status != 429:
+        return None
+    headers = getattr(exc.response, "headers", None) or {}
+    for name in ("X-RateLimit-Reset-After", "Retry-After"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return default
+
+
+def _resolve(
+    futures: list[asyncio.Future],
+    *,
+    result: Any = None,
+    exception: BaseException | None = None,
+) -> None:
+    for future in futures:
+        if future.done():
+            continue
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+outbound_writes = WriteScheduler()